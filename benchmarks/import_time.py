@@ -0,0 +1,39 @@
+# Время импорта модулей в свежем процессе (python -X importtime), лучшее из нескольких запусков.
+# Запуск: python benchmarks/import_time.py [число запусков]
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('core', 'main', 'gui')
+
+
+def import_time_us(module):
+    # Последняя строка отчёта importtime - сам модуль; второй столбец - накопленное время (мкс)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    lines = [line for line in result.stderr.splitlines() if line.startswith("import time:")]
+    return int(lines[-1].split("|")[1])
+
+
+def script_compile_ms(filename):
+    # Запускаемый скрипт не кэшируется в .pyc и компилируется при каждом старте
+    with open(os.path.join(ROOT, filename), "r", encoding="utf-8") as f:
+        source = f.read()
+    start = time.perf_counter()
+    compile(source, filename, "exec")
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for module in MODULES:
+        best = min(import_time_us(module) for _ in range(runs))
+        print(f"import {module:6} {best / 1000:8.1f} мс")
+    best = min(script_compile_ms("main.py") for _ in range(runs))
+    print(f"компиляция main.py {best:6.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Сравнение памяти на одну расу: словари из json.load против моделей Race/Skill/Option.
+# Запуск: python benchmarks/model_memory.py [races.json] [количество рас]
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import Race, RaceCatalog
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else os.path.join("dist", "races.json")
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    with open(filename, "r", encoding="utf-8") as f:
+        base = [race.to_dict() for race in RaceCatalog.from_document(json.load(f)).races()]
+
+    # Один документ JSON: как при загрузке races.json, у каждой расы свои копии строк значений
+    text = json.dumps([base[number % len(base)] for number in range(count)], ensure_ascii=False)
+    dicts, dict_bytes = measure(lambda: json.loads(text))
+    models, model_bytes = measure(lambda: [Race.from_dict(race) for race in json.loads(text)])
+    assert models == dicts
+
+    print(f"Рас: {count}")
+    print(f"Словари: {dict_bytes / count:.0f} байт на расу")
+    print(f"Модели:  {model_bytes / count:.0f} байт на расу")
+    print(f"Экономия: {(dict_bytes - model_bytes) / count:.0f} байт на расу "
+          f"({100 * (dict_bytes - model_bytes) / dict_bytes:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
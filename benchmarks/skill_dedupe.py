@@ -0,0 +1,87 @@
+# Дедупликация навыков общей библиотекой: сколько записей навыков приходится на один
+# уникальный навык, размер races.json, память и время записи снимка.
+# Запуск: python benchmarks/skill_dedupe.py [races.json] [количество рас]
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import Race, RaceCatalog, SkillLibrary, format_race_json
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current
+
+
+def dump_list(races, f):
+    # Прежний формат: список рас, навыки записаны целиком в каждой расе
+    f.write(b"[\n    ")
+    f.write(b",\n    ".join(format_race_json(race).encode("utf-8") for race in races))
+    f.write(b"\n]")
+
+
+def timed(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(title, text):
+    print(title)
+    models, model_bytes = measure(lambda: [Race.from_dict(race) for race in json.loads(text)])
+    library = SkillLibrary()
+    shared, shared_bytes = measure(lambda: [library.race(race) for race in json.loads(text)])
+    entries = sum(len(race.get('Навыки', ())) for race in models)
+    unique = len(library)
+    print(f"  Рас: {len(models)}, записей навыков: {entries}, уникальных навыков: {unique}")
+    if unique:
+        print(f"  Дедупликация: {entries / unique:.2f}x ({100 * (1 - unique / entries):.1f}% записей - повторы)")
+
+    catalog = RaceCatalog.from_races(models)
+    old_file = io.BytesIO()
+    dump_list(catalog.races(), old_file)
+    new_file = io.BytesIO()
+    catalog.dump(new_file)
+    old_size = len(old_file.getvalue())
+    new_size = len(new_file.getvalue())
+    print(f"  Файл: {old_size} -> {new_size} байт ({100 * (old_size - new_size) / old_size:.1f}% меньше)")
+    print(f"  Память: {model_bytes / len(models):.0f} -> {shared_bytes / len(models):.0f} байт на расу")
+    old_time = timed(lambda: dump_list(catalog.races(), io.BytesIO()))
+    new_time = timed(lambda: catalog.dump(io.BytesIO()))
+    print(f"  Запись снимка: {old_time * 1000:.1f} -> {new_time * 1000:.1f} мс")
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else os.path.join("dist", "races.json")
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    with open(filename, "r", encoding="utf-8") as f:
+        text = f.read()
+    base = list(RaceCatalog.from_document(json.loads(text)).races())
+    report(filename, json.dumps([race.to_dict() for race in base], ensure_ascii=False))
+
+    # Синтетический каталог: варианты рас из файла с теми же навыками, как у подрас
+    races = []
+    for number in range(count):
+        race = base[number % len(base)].to_dict()
+        race['Ид'] = number + 1
+        race['Имя'] = f"{race['Имя']} {number}"
+        races.append(race)
+    report(f"Синтетические данные ({count} рас)", json.dumps(races, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# Набор замеров на синтетических races.json: загрузка, сохранение, поиск на каждое
+# нажатие клавиши (с числом вызовов Tk для обычного списка), нечёткий поиск, текст карточки,
+# удаление и полураса, плюс пиковая память.
+# Работает без дисплея: окно не создаётся, поиск идёт через RaceApp.update_race_list
+# с заглушкой вместо виджета списка. Результаты пишутся в JSON; --compare сравнивает
+# их с прошлым запуском и завершается с кодом 1 при замедлении.
+# Запуск: python benchmarks/suite.py [--sizes 1000 10000 100000 1000000] [-o results.json]
+#         [--compare baseline.json] [--tolerance 0.2]
+import argparse
+import datetime
+import gc
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import (SORT_COLUMNS, RaceJournal, RaceSearchIndex, RaceSortIndex, TrigramIndex, format_race_details,
+                  generate_half_race, read_races, split_text_chunks)
+from synthetic import generate_races, write_races
+
+try:
+    # Нужен только модуль tkinter, окно не создаётся
+    import gui
+except ImportError:
+    gui = None
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+QUERY = "гал ор"
+SAMPLES = 200
+SEED = 0
+# Допустимое замедление относительно прошлого запуска (доля)
+TOLERANCE = 0.2
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def percentiles(times):
+    times = sorted(times)
+    return {
+        'p50_ms': round(statistics.median(times) * 1000, 3),
+        'p99_ms': round(times[min(len(times) - 1, int(len(times) * 0.99))] * 1000, 3),
+        'max_ms': round(times[-1] * 1000, 3),
+    }
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def remove_caches(filename):
+    for path in glob.glob(filename + ".*"):
+        os.remove(path)
+
+
+class StubRaceList:
+    # Заглушка виртуального списка: update_race_list передаёт ему готовый порядок Ид
+    def show(self, ids):
+        self.ids = ids
+
+
+class StubTree:
+    # Заглушка Treeview: вызовы Tk не выполняются, их число считает сам TreeRaceList.show
+    def detach(self, *items):
+        pass
+
+    def move(self, item, parent, index):
+        pass
+
+    def insert(self, parent, index, iid=None, values=()):
+        pass
+
+
+def stub_tree_race_list():
+    # Настоящий TreeRaceList без окна: после show() в last_tk_calls - число вызовов Tk
+    race_list = gui.TreeRaceList.__new__(gui.TreeRaceList)
+    race_list.tree = StubTree()
+    race_list.values = lambda race_id: ()
+    race_list.created = set()
+    race_list.ids = []
+    race_list.last_tk_calls = 0
+    return race_list
+
+
+def bench_keystrokes(races, search_index, fuzzy_index, sort_index, sort_column):
+    # Ввод запроса по одной букве, как в поле поиска; каждое нажатие - полное обновление списка.
+    # Для каталога, который окно показывает обычным списком, ещё и число вызовов Tk за нажатие
+    # (tk_calls_p50, tk_calls_max); первое заполнение списка в замер не входит.
+    if gui is None:
+        return None
+    tree_list = len(races) < gui.VIRTUAL_LIST_THRESHOLD and races.filename is None
+    app = types.SimpleNamespace(search_var=types.SimpleNamespace(get=None), search_index=search_index,
+                                fuzzy_index=fuzzy_index, sort_index=sort_index, sort_column=sort_column,
+                                sort_reverse=False, race_list=stub_tree_race_list() if tree_list else StubRaceList(),
+                                _search_after_id=None, _shown_query=None, _shown_set=set())
+    app.search_var.get = lambda: ""
+    gui.RaceApp.update_race_list(app)
+    times = []
+    tk_calls = []
+    for _ in range(5):
+        app._shown_query = None
+        for length in range(len(QUERY) + 1):
+            app.search_var.get = lambda text=QUERY[:length]: text
+            _, elapsed = timed(gui.RaceApp.update_race_list, app)
+            times.append(elapsed)
+            if tree_list:
+                tk_calls.append(app.race_list.last_tk_calls)
+    result = percentiles(times)
+    if tk_calls:
+        result['tk_calls_p50'] = statistics.median(tk_calls)
+        result['tk_calls_max'] = max(tk_calls)
+    return result
+
+
+def bench_size(count, directory, measure_memory):
+    filename = os.path.join(directory, f"races_{count}.json")
+    result = {'races': count}
+    with open(filename, "w", encoding="utf-8") as f:
+        _, result['generate_s'] = timed(write_races, f, generate_races(count, SEED))
+    result['file_mb'] = round(os.path.getsize(filename) / 2 ** 20, 2)
+
+    # Загрузка: без кэша (разбор JSON) и с кэшем снимка или смещений
+    remove_caches(filename)
+    _, result['load_cold_s'] = timed(read_races, filename, RaceJournal(filename))
+    journal = RaceJournal(filename)
+    (races, messages), result['load_warm_s'] = timed(read_races, filename, journal)
+    if messages:
+        raise RuntimeError(messages)
+    result['lazy'] = races.filename is not None
+    if measure_memory:
+        remove_caches(filename)
+        gc.collect()
+        tracemalloc.start()
+        read_races(filename, RaceJournal(filename))
+        result['load_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+
+    # Индексы, которые окно строит после загрузки
+    def build_indexes():
+        search_index = RaceSearchIndex()
+        fuzzy_index = TrigramIndex()
+        for race_id in races:
+            race = races.summary(race_id)
+            search_index.add(race_id, race)
+            fuzzy_index.add(race_id, race)
+        sort_index = RaceSortIndex(races)
+        sort_index.build(SORT_COLUMNS)
+        return search_index, fuzzy_index, sort_index
+
+    (search_index, fuzzy_index, sort_index), result['index_build_s'] = timed(build_indexes)
+    result['keystroke'] = bench_keystrokes(races, search_index, fuzzy_index, sort_index, None)
+    result['keystroke_sorted'] = bench_keystrokes(races, search_index, fuzzy_index, sort_index, 'Имя')
+
+    rng = random.Random(SEED)
+    race_ids = races.ids()
+    times = []
+    for race_id in rng.sample(race_ids, min(SAMPLES, len(race_ids))):
+        # Имя с опечаткой: пропущена одна буква, как в "Аасимар" -> "Асимар"
+        name = races.name(race_id)
+        position = rng.randrange(len(name))
+        _, elapsed = timed(fuzzy_index.search_keys, name[:position] + name[position + 1:])
+        times.append(elapsed)
+    result['fuzzy_search'] = percentiles(times)
+    chunk_chars = gui.DETAILS_CHUNK_CHARS if gui else 16 * 1024
+    times = []
+    for race_id in rng.sample(race_ids, min(SAMPLES, len(race_ids))):
+        # Первый кусок карточки - то, что окно показывает сразу после выбора расы
+        _, elapsed = timed(lambda: split_text_chunks(format_race_details(races.get(race_id)), chunk_chars)[0])
+        times.append(elapsed)
+    result['details_render'] = percentiles(times)
+
+    times = []
+    for _ in range(SAMPLES):
+        race1, race2 = rng.sample(race_ids, 2)
+        _, elapsed = timed(generate_half_race, races.get(race1), races.get(race2), rng)
+        times.append(elapsed)
+    result['half_race'] = percentiles(times)
+
+    # Удаление: каталог, журнал и все индексы, как в RaceApp.remove_race
+    times = []
+    for race_id in rng.sample(race_ids, min(SAMPLES, len(race_ids) - 2)):
+        start = time.perf_counter()
+        races.remove(race_id)
+        journal.delete_race(race_id)
+        search_index.remove(race_id)
+        fuzzy_index.remove(race_id)
+        sort_index.remove(race_id)
+        times.append(time.perf_counter() - start)
+    result['delete'] = percentiles(times)
+
+    # Сохранение: сжатие журнала в новый снимок
+    def save():
+        journal.compact(journal.begin_compaction(races))
+
+    _, result['save_s'] = timed(save)
+    journal.close()
+    for key, value in result.items():
+        if key.endswith('_s'):
+            result[key] = round(value, 4)
+    return result
+
+
+def regressions(baseline, current, tolerance):
+    # Сравниваются одинаковые размеры: секунды и p50 операций
+    found = []
+    for size, old in baseline.get('results', {}).items():
+        new = current['results'].get(size)
+        if new is None:
+            continue
+        for key, old_value in old.items():
+            new_value = new.get(key)
+            if isinstance(old_value, dict):
+                old_value = old_value.get('p50_ms')
+                new_value = (new_value or {}).get('p50_ms')
+            elif not key.endswith('_s'):
+                continue
+            if old_value and new_value and new_value > old_value * (1 + tolerance):
+                found.append(f"{size} рас, {key}: {old_value} -> {new_value}")
+    return found
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетических данных.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('-o', '--output', help="файл результатов JSON (по умолчанию stdout)")
+    parser.add_argument('--compare', help="результаты прошлого запуска для поиска замедлений")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="допустимое замедление (доля)")
+    parser.add_argument('--no-memory', action='store_true', help="без замера пиковой памяти (tracemalloc)")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.sizes:
+            print(f"{count} рас...", file=sys.stderr)
+            report['results'][str(count)] = bench_size(count, directory, not args.no_memory)
+    if resource is not None:
+        # ru_maxrss в Linux - в килобайтах
+        report['meta']['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    text = json.dumps(report, ensure_ascii=False, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            found = regressions(json.load(f), report, args.tolerance)
+        for line in found:
+            print(f"Замедление: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
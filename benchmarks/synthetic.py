@@ -0,0 +1,112 @@
+# Генератор синтетических races.json в настоящей схеме (Навыки, Опции, Дополнительно)
+# с русским текстом. Навыки берутся из общего пула, как у рас с одинаковыми чертами.
+# Запуск: python benchmarks/synthetic.py КОЛИЧЕСТВО ФАЙЛ [--seed N] [--list]
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import DOCUMENT_RACES_KEY, DOCUMENT_SKILLS_KEY, format_race_json, skill_digest
+
+SYLLABLES = ('ар', 'бел', 'вир', 'гал', 'дор', 'ель', 'жин', 'зар', 'ил', 'кор', 'лин', 'мор', 'нар', 'ор',
+             'пир', 'рил', 'сар', 'тал', 'ур', 'фен', 'хар', 'цил', 'чер', 'шан', 'эл', 'юр', 'яр')
+WORDS = ('вы', 'можете', 'использовать', 'действие', 'бонусное', 'урон', 'заклинание', 'отдых', 'короткого',
+         'длинного', 'проверку', 'спасбросок', 'темноте', 'свету', 'футов', 'мастерство', 'владение', 'оружием',
+         'доспехами', 'сопротивление', 'огню', 'яду', 'холоду', 'магии', 'зрение', 'скорость', 'существо',
+         'противника', 'союзника', 'преимущество', 'помеху', 'кубик', 'хитов', 'уровне', 'раз', 'после',
+         'окончания', 'в', 'на', 'и', 'до', 'от', 'с', 'по', 'своего', 'который', 'находится', 'пределах')
+RACE_SUFFIXES = ('', '', '', ' горный', ' лесной', ' подземный', ' морской', ' высший')
+SIZES = ('Маленький', 'Средний', 'Средний', 'Средний', 'Большой')
+SPEEDS = ('25', '30', '30', '30', '35', '40')
+DARK_VISION = ('Нет', '60 фт', '60 фт', '120 фт')
+# Доля рас с собственным навыком, которого нет у других рас
+UNIQUE_SKILL_RATE = 0.2
+
+
+def make_name(rng, parts):
+    return "".join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+
+
+def make_text(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+
+def make_skill(rng):
+    skill = {
+        "Название": f"{make_name(rng, 2)} {rng.choice(WORDS)}",
+        "Описание": make_text(rng, 20, 80),
+        "Важный": rng.choice(("Да", "Нет", "Нет")),
+    }
+    if rng.random() < 0.3:
+        skill["Опции"] = [{"Название": make_name(rng, 2), "Описание": make_text(rng, 5, 20)}
+                          for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.4:
+        skill["Дополнительно"] = make_text(rng, 5, 30)
+    return skill
+
+
+def generate_races(count, seed=0, pool_size=None):
+    # Записи выдаются по одной, поэтому файл любого размера пишется без хранения всех рас
+    rng = random.Random(seed)
+    pool = [make_skill(rng) for _ in range(pool_size or max(50, count // 50))]
+    for number in range(count):
+        skills = rng.sample(pool, rng.randint(1, 5))
+        if rng.random() < UNIQUE_SKILL_RATE:
+            skills.append(make_skill(rng))
+        yield {
+            "Ид": number + 1,
+            "Имя": make_name(rng, rng.randint(2, 3)) + rng.choice(RACE_SUFFIXES),
+            "Скорость": rng.choice(SPEEDS),
+            "Размер": rng.choice(SIZES),
+            "Темное зрение": rng.choice(DARK_VISION),
+            "Навыки": skills,
+        }
+
+
+def write_races(f, races, shared=True):
+    # Тот же вид, что у RaceCatalog.dump: расы со ссылками на навыки и таблица навыков;
+    # shared=False - прежний формат, список рас с навыками целиком
+    table = {}
+    digests = {}
+    f.write(f'{{"{DOCUMENT_RACES_KEY}": [' if shared else "[")
+    separator = "\n    "
+    count = 0
+    for race in races:
+        if shared:
+            refs = []
+            for skill in race["Навыки"]:
+                digest = digests.get(id(skill))
+                if digest is None:
+                    digest = digests[id(skill)] = skill_digest(skill)
+                    table.setdefault(digest, skill)
+                refs.append(digest)
+            race = dict(race, Навыки=refs)
+        f.write(separator + format_race_json(race))
+        separator = ",\n    "
+        count += 1
+    f.write("]" if not count else "\n]")
+    if shared:
+        f.write(f',\n"{DOCUMENT_SKILLS_KEY}": {{')
+        separator = "\n"
+        for digest, skill in table.items():
+            f.write(f'{separator}    "{digest}": {format_race_json(skill)}')
+            separator = ",\n"
+        f.write("}}" if separator == "\n" else "\n}}")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетический races.json.")
+    parser.add_argument('count', type=int)
+    parser.add_argument('output')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--list', action='store_true', help="прежний формат без общей таблицы навыков")
+    args = parser.parse_args()
+    with open(args.output, "w", encoding="utf-8") as f:
+        write_races(f, generate_races(args.count, args.seed), shared=not args.list)
+
+
+if __name__ == "__main__":
+    main()
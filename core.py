@@ -0,0 +1,2317 @@
+import bisect
+import codecs
+import collections
+import collections.abc
+import functools
+import gc
+import hashlib
+import itertools
+import json
+import operator
+import os
+import pickle
+import queue
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+
+# Веса полей при ранжировании результатов поиска
+FIELD_WEIGHTS = {
+    'имя': 10,
+    'навык': 5,
+    'опция': 3,
+    'описание': 2,
+    'дополнительно': 1,
+    'размер': 1,
+}
+
+# Префиксы фильтров в строке поиска (например, "навык:сопротивление")
+FIELD_ALIASES = {
+    'имя': 'имя',
+    'навык': 'навык',
+    'опция': 'опция',
+    'описание': 'описание',
+    'доп': 'дополнительно',
+    'дополнительно': 'дополнительно',
+    'размер': 'размер',
+}
+
+# Числовые фильтры (например, "скорость:>30") и поля расы, из которых берётся число
+NUMERIC_FIELDS = {
+    'скорость': 'Скорость',
+    'зрение': 'Темное зрение',
+}
+
+# Окончания, отбрасываемые простым стеммером; основа остаётся не короче четырёх букв,
+# а из подходящих окончаний выбирается самое длинное
+RUSSIAN_ENDINGS = (
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'ий', 'ый', 'ой', 'ая', 'яя', 'ое', 'ее', 'ие', 'ые', 'ов', 'ев', 'ей',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'ью',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+)
+STEM_RE = re.compile(r'(\w{4,}?)(?:%s)$' % '|'.join(sorted(RUSSIAN_ENDINGS, key=len, reverse=True)))
+
+TOKEN_RE = re.compile(r'\w+')
+NUMERIC_FILTER_RE = re.compile(r'(>=|<=|>|<|=)?(\d+)$')
+NUMBER_RE = re.compile(r'\d+')
+
+
+def normalize_text(text):
+    return str(text).lower().replace('ё', 'е')
+
+
+@functools.lru_cache(maxsize=65536)
+def stem_word(word):
+    match = STEM_RE.fullmatch(word)
+    return match.group(1) if match else word
+
+
+def tokenize(text):
+    return [stem_word(token) for token in TOKEN_RE.findall(normalize_text(text))]
+
+
+def parse_number(value):
+    match = NUMBER_RE.search(str(value))
+    return int(match.group()) if match else None
+
+
+def iter_race_fields(race):
+    yield 'имя', race.get('Имя', '')
+    yield 'размер', race.get('Размер', '')
+    for skill in race.get('Навыки', []):
+        yield 'навык', skill.get('Название', '')
+        yield 'описание', skill.get('Описание', '')
+        for option in skill.get('Опции', []):
+            yield 'опция', option.get('Название', '')
+            yield 'опция', option.get('Описание', '')
+        yield 'дополнительно', skill.get('Дополнительно', '')
+
+
+class RaceSearchIndex:
+    # Инвертированный индекс: основа слова -> {ключ расы: {поле: число вхождений}}.
+    # Словарь основ хранится отсортированным, чтобы искать по префиксу через bisect.
+    def __init__(self):
+        self._postings = {}
+        self._vocabulary = []
+        self._doc_terms = {}
+        self._doc_numbers = {}
+        self._doc_order = {}
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, key, race):
+        if key in self._doc_terms:
+            self.remove(key)
+        terms = {}
+        for field, text in iter_race_fields(race):
+            for term in tokenize(text):
+                fields = terms.setdefault(term, {})
+                fields[field] = fields.get(field, 0) + 1
+        for term, fields in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._vocabulary, term)
+            postings[key] = fields
+        self._doc_terms[key] = list(terms)
+        self._doc_numbers[key] = {name: parse_number(race.get(field, ''))
+                                  for name, field in NUMERIC_FIELDS.items()}
+        if key not in self._doc_order:
+            self._doc_order[key] = self._next_order
+            self._next_order += 1
+
+    def update(self, key, race):
+        order = self._doc_order.get(key)
+        self.add(key, race)
+        if order is not None:
+            self._doc_order[key] = order
+
+    def remove(self, key):
+        for term in self._doc_terms.pop(key, ()):
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._vocabulary, term)
+                del self._vocabulary[position]
+        self._doc_numbers.pop(key, None)
+        self._doc_order.pop(key, None)
+
+    def parse_query(self, query):
+        # Возвращает (текстовые условия, числовые фильтры).
+        # Текстовое условие - (поле или None, основа слова).
+        terms = []
+        filters = []
+        for part in normalize_text(query).split():
+            field, sep, value = part.partition(':')
+            if sep and field in NUMERIC_FIELDS:
+                match = NUMERIC_FILTER_RE.match(value)
+                if match:
+                    filters.append((field, match.group(1) or '=', int(match.group(2))))
+                continue
+            if sep and field in FIELD_ALIASES:
+                terms.extend((FIELD_ALIASES[field], term) for term in tokenize(value))
+            else:
+                terms.extend((None, term) for term in tokenize(part))
+        return terms, filters
+
+    def is_refinement(self, old_query, new_query):
+        # Новый запрос сужает старый, если фильтры совпадают, а каждое старое
+        # условие продолжено новым (основа старого - префикс основы нового)
+        old_terms, old_filters = self.parse_query(old_query)
+        new_terms, new_filters = self.parse_query(new_query)
+        if old_filters != new_filters or len(new_terms) < len(old_terms):
+            return False
+        return all(old_field == new_field and new_term.startswith(old_term)
+                   for (old_field, old_term), (new_field, new_term) in zip(old_terms, new_terms))
+
+    def _expand_prefix(self, prefix):
+        position = bisect.bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            yield self._vocabulary[position]
+            position += 1
+
+    def _match_term(self, field, prefix, within):
+        scores = {}
+        for term in self._expand_prefix(prefix):
+            for key, fields in self._postings[term].items():
+                if within is not None and key not in within:
+                    continue
+                if field is None:
+                    score = sum(FIELD_WEIGHTS[name] * count for name, count in fields.items())
+                else:
+                    score = FIELD_WEIGHTS[field] * fields.get(field, 0)
+                if score:
+                    scores[key] = scores.get(key, 0) + score
+        return scores
+
+    def _passes_filters(self, key, filters):
+        numbers = self._doc_numbers[key]
+        for name, op, number in filters:
+            value = numbers.get(name)
+            if value is None:
+                return False
+            if op == '>' and not value > number:
+                return False
+            if op == '<' and not value < number:
+                return False
+            if op == '>=' and not value >= number:
+                return False
+            if op == '<=' and not value <= number:
+                return False
+            if op == '=' and value != number:
+                return False
+        return True
+
+    def search(self, query, within=None):
+        # Возвращает ключи рас, отсортированные по убыванию релевантности.
+        # within - необязательное множество ключей, которым ограничивается поиск.
+        terms, filters = self.parse_query(query)
+        if not terms and not filters:
+            keys = self._doc_order if within is None else [key for key in self._doc_order if key in within]
+            return sorted(keys, key=self._doc_order.__getitem__)
+        scores = None
+        for field, term in terms:
+            term_scores = self._match_term(field, term, within)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+            if not scores:
+                return []
+        if scores is None:
+            candidates = self._doc_order if within is None else [key for key in within if key in self._doc_order]
+            scores = dict.fromkeys(candidates, 0)
+        keys = [key for key in scores if self._passes_filters(key, filters)]
+        keys.sort(key=lambda key: (-scores[key], self._doc_order[key]))
+        return keys
+
+
+# Типизированная модель данных: Race/Skill/Option со __slots__ вместо словарей.
+# Объекты ведут себя как неизменяемые Mapping с русскими ключами JSON, поэтому
+# код, читающий race.get('Имя'), работает с ними без изменений.
+_MISSING = object()
+
+
+class RecordModel(collections.abc.Mapping):
+    __slots__ = ('extra',)
+    # Пары (ключ JSON, атрибут) в порядке записи в файл
+    FIELDS = ()
+    # Атрибуты с немногими различными значениями ("Да"/"Нет", размеры) интернируются
+    INTERNED = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.ATTRIBUTES = dict(cls.FIELDS)
+        cls.SLOTS = tuple(slot for klass in reversed(cls.__mro__) for slot in klass.__dict__.get('__slots__', ()))
+
+    @classmethod
+    def from_dict(cls, data):
+        if type(data) is cls:
+            return data
+        record = cls.__new__(cls)
+        record.extra = None
+        for key, value in data.items():
+            attribute = cls.ATTRIBUTES.get(key)
+            if attribute is None:
+                if record.extra is None:
+                    record.extra = {}
+                record.extra[sys.intern(key)] = value
+            else:
+                record._set_field(attribute, value)
+        return record
+
+    def _set_field(self, attribute, value):
+        if attribute in self.INTERNED and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, attribute, value)
+
+    def _get_field(self, attribute):
+        # AttributeError означает, что ключа в исходной записи не было
+        return getattr(self, attribute)
+
+    def __getitem__(self, key):
+        attribute = self.ATTRIBUTES.get(key)
+        if attribute is None:
+            if self.extra and key in self.extra:
+                return self.extra[key]
+            raise KeyError(key)
+        try:
+            return self._get_field(attribute)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        for key, attribute in self.FIELDS:
+            if hasattr(self, attribute):
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __eq__(self, other):
+        # Однотипные модели сравниваются по атрибутам без сборки пар ключ-значение
+        # (при перезагрузке файла так сравниваются все расы); со словарями - как Mapping
+        if type(other) is not type(self):
+            return super().__eq__(other)
+        return all(getattr(self, attribute, _MISSING) == getattr(other, attribute, _MISSING)
+                   for attribute in self.SLOTS)
+
+    __hash__ = None
+
+    def to_dict(self):
+        return {key: to_plain(value) for key, value in self.items()}
+
+
+def to_plain(value):
+    if isinstance(value, RecordModel):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
+
+
+def json_default(value):
+    # Для json.dump: модели записываются как обычные словари
+    if isinstance(value, RecordModel):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Option(RecordModel):
+    __slots__ = ('name', 'description')
+    FIELDS = (('Название', 'name'), ('Описание', 'description'))
+
+
+class Skill(RecordModel):
+    __slots__ = ('name', 'description', 'important', 'options', 'additional')
+    FIELDS = (('Название', 'name'), ('Описание', 'description'), ('Важный', 'important'),
+              ('Опции', 'options'), ('Дополнительно', 'additional'))
+    INTERNED = ('important',)
+
+    def _set_field(self, attribute, value):
+        if attribute == 'options' and isinstance(value, list):
+            value = [Option.from_dict(option) if type(option) is dict else option for option in value]
+        super()._set_field(attribute, value)
+
+
+class Race(RecordModel):
+    # Скорость хранится числом; speed_raw заполняется, только если исходное значение
+    # не восстанавливается как str(speed) (например, "30 фт"), чтобы не терять данные
+    __slots__ = ('id', 'name', 'speed', 'speed_raw', 'size', 'dark_vision', 'skills')
+    FIELDS = (('Ид', 'id'), ('Имя', 'name'), ('Скорость', 'speed'), ('Размер', 'size'),
+              ('Темное зрение', 'dark_vision'), ('Навыки', 'skills'))
+    INTERNED = ('size', 'dark_vision')
+
+    def _set_field(self, attribute, value):
+        if attribute == 'speed':
+            if isinstance(value, str) and value.isascii() and value.isdigit() and str(int(value)) == value:
+                self.speed = int(value)
+            else:
+                self.speed = parse_number(value) if value is not None else None
+                self.speed_raw = value
+            return
+        if attribute == 'skills' and isinstance(value, list):
+            value = [Skill.from_dict(skill) if type(skill) is dict else skill for skill in value]
+        super()._set_field(attribute, value)
+
+    def with_id(self, race_id):
+        data = dict(self)
+        data['Ид'] = race_id
+        return Race.from_dict(data)
+
+    def _get_field(self, attribute):
+        if attribute == 'speed':
+            try:
+                return self.speed_raw
+            except AttributeError:
+                return str(self.speed)
+        return super()._get_field(attribute)
+
+
+# Общая библиотека навыков: одинаковые навыки разных рас хранятся одним объектом
+# под хешем содержимого. В races.json навыки рас записываются ссылками на таблицу
+# "Навыки" (см. RaceCatalog.dump); старый формат - просто список рас.
+SKILL_DIGEST_LENGTH = 16
+DOCUMENT_RACES_KEY = "Расы"
+DOCUMENT_SKILLS_KEY = "Навыки"
+
+
+def skill_digest(skill):
+    # Порядок ключей сохраняется, чтобы запись по ссылке совпадала с исходной байт в байт
+    text = json.dumps(skill, ensure_ascii=False, separators=(',', ':'), default=json_default)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:SKILL_DIGEST_LENGTH]
+
+
+class SkillLibrary:
+    # Навыки не изменяются на месте: правка даёт новый навык с новым хешем (копия
+    # при записи), а "изменить во всех расах" - замена ссылки в каждой расе.
+    # Записи не удаляются, поэтому фоновая запись снимка может читать библиотеку
+    # одновременно с правками в потоке окна.
+    def __init__(self):
+        self.skills = {}
+        # id навыка -> (навык, хеш). Навык хранится вместе с хешем: пока запись есть,
+        # объект жив и его id не может достаться другому навыку, даже если в skills
+        # под этим хешем уже лежит другой объект
+        self.digests = {}
+
+    def __len__(self):
+        return len(self.skills)
+
+    def load(self, table):
+        # Таблица из файла: ссылки в записях рас указывают на её ключи как есть
+        for digest, skill in table.items():
+            skill = Skill.from_dict(skill) if isinstance(skill, dict) else skill
+            self.skills[digest] = skill
+            self.digests[id(skill)] = (skill, digest)
+
+    def digest(self, skill):
+        entry = self.digests.get(id(skill))
+        return entry[1] if entry is not None and entry[0] is skill else skill_digest(skill)
+
+    def intern(self, skill, digest=None):
+        # Общий объект для навыка с тем же содержимым; навыки из библиотеки
+        # узнаются по id без пересчёта хеша. digest можно посчитать заранее (в пуле процессов).
+        entry = self.digests.get(id(skill))
+        if entry is not None and entry[0] is skill:
+            return skill
+        if digest is None:
+            digest = skill_digest(skill)
+        shared = self.skills.get(digest)
+        if shared is None:
+            shared = Skill.from_dict(skill) if isinstance(skill, dict) else skill
+            self.skills[digest] = shared
+            self.digests[id(shared)] = (shared, digest)
+        return shared
+
+    def race(self, data, refs=False, digests=None):
+        # Race с общими навыками. refs - строки в списке навыков являются ссылками
+        # на таблицу (формат с библиотекой), иначе это обычные значения; digests -
+        # заранее посчитанные хеши навыков словаря data.
+        # Список навыков готовой Race заменяется целиком, содержимое расы не меняется.
+        if type(data) is dict and isinstance(data.get('Навыки'), list):
+            # Хеш обычного словаря считается быстрее, чем хеш модели Skill
+            data = dict(data)
+            data['Навыки'] = self._share(data['Навыки'], refs, digests)
+        race = Race.from_dict(data)
+        skills = getattr(race, 'skills', None)
+        if not isinstance(skills, list):
+            return race
+        shared = self._share(skills, refs)
+        if any(new is not old for new, old in zip(shared, skills)):
+            race.skills = shared
+        return race
+
+    def _share(self, skills, refs, digests=None):
+        if digests is not None:
+            return [self.intern(skill, digest) for skill, digest in zip(skills, digests)]
+        return [self.skills[skill] if refs and isinstance(skill, str) else self.intern(skill) for skill in skills]
+
+    def replace_skill(self, race, old, new):
+        # Копия расы, где навык old заменён на new (правка "во всех расах")
+        digest = self.digest(old)
+        new = self.intern(new)
+        data = dict(race)
+        data['Навыки'] = [new if self.digest(skill) == digest else skill for skill in race['Навыки']]
+        return Race.from_dict(data)
+
+    def record(self, race):
+        # Запись расы для файла: навыки заменены ссылками
+        skills = race.get('Навыки')
+        if not isinstance(skills, list):
+            return race
+        record = dict(race)
+        record['Навыки'] = [self.digest(skill) for skill in skills]
+        return record
+
+
+def format_race_details(race):
+    # Текст карточки расы собирается из частей одним join
+    parts = [
+        f"Имя: {race.get('Имя', '')}\n",
+        f"Скорость: {race.get('Скорость', '')}\n",
+        f"Размер: {race.get('Размер', '')}\n",
+        f"Темное зрение: {race.get('Темное зрение', '')}\n",
+        "\nНавыки:\n",
+    ]
+    for skill in race.get("Навыки", []):
+        parts.append(f"- {skill.get('Название', '')}\n")
+        parts.append(f"  Важный: {skill.get('Важный', 'Нет')}\n")
+        parts.append(f"  Описание: {skill.get('Описание', '')}\n")
+        if "Опции" in skill:
+            parts.append("  Опции:\n")
+            for option in skill["Опции"]:
+                parts.append(f"    • {option.get('Название', '')}: {option.get('Описание', '')}\n")
+        if "Дополнительно" in skill:
+            parts.append(f"  Дополнительно: {skill.get('Дополнительно', '')}\n")
+        parts.append("\n")
+    return "".join(parts)
+
+
+def split_text_chunks(text, size):
+    # Куски примерно по size символов, по возможности на границе строки
+    chunks = []
+    start = 0
+    while len(text) - start > size:
+        end = text.find("\n", start + size)
+        if end == -1 or end - start > 2 * size:
+            end = start + size
+        else:
+            end += 1
+        chunks.append(text[start:end])
+        start = end
+    chunks.append(text[start:])
+    return chunks
+
+
+# Замеры длительности операций (включаются в окне или флагом --debug). Пока сбор
+# выключен, обёртка стоит одной проверки флага на вызов.
+SPAN_HISTORY = 1000
+
+
+class SpanRecorder:
+    # Последние SPAN_HISTORY длительностей каждой операции в секундах. Операции,
+    # которые заканчиваются в другом вызове (фоновая загрузка), отмечаются парой
+    # start()/stop(); синхронные - декоратором timed().
+    def __init__(self, history=SPAN_HISTORY):
+        self.enabled = False
+        self.history = history
+        self.samples = {}
+
+    def record(self, name, seconds):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, collections.deque(maxlen=self.history))
+        samples.append(seconds)
+
+    def start(self, name):
+        return (name, time.perf_counter()) if self.enabled else None
+
+    def stop(self, token):
+        if token is not None:
+            name, start = token
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def stats(self):
+        # {операция: (число замеров, p50, p99, максимум в мс)}
+        result = {}
+        for name, samples in list(self.samples.items()):
+            times = sorted(samples)
+            if times:
+                result[name] = (len(times), times[len(times) // 2] * 1000,
+                                times[min(len(times) - 1, len(times) * 99 // 100)] * 1000, times[-1] * 1000)
+        return result
+
+    def reset(self):
+        self.samples.clear()
+
+
+spans = SpanRecorder()
+
+
+# Проверки записей - те же, что выполняют формы редактирования. Возвращают текст
+# первой ошибки или None.
+def validate_option(option):
+    if not isinstance(option, collections.abc.Mapping):
+        return "Опция должна быть объектом."
+    if not str(option.get('Название') or '').strip():
+        return "Введите название опции."
+    return None
+
+
+def validate_skill(skill):
+    if not isinstance(skill, collections.abc.Mapping):
+        return "Навык должен быть объектом."
+    if not str(skill.get('Название') or '').strip():
+        return "Введите название навыка."
+    if not isinstance(skill.get('Опции') or [], list):
+        return "Опции навыка должны быть списком."
+    for option in skill.get('Опции') or ():
+        error = validate_option(option)
+        if error:
+            return error
+    return None
+
+
+def validate_race(race):
+    if not isinstance(race, collections.abc.Mapping):
+        return "Раса должна быть объектом."
+    race_id = race.get('Ид')
+    if race_id is not None and (not isinstance(race_id, int) or isinstance(race_id, bool)):
+        return "Ид должен быть целым числом."
+    if not str(race.get('Имя') or '').strip():
+        return "Введите имя расы."
+    # Скорость 0 из JSON - число, а не пустое значение
+    speed = race.get('Скорость')
+    if not str('' if speed is None else speed).strip().isdigit():
+        return "Скорость должна быть числом."
+    if not isinstance(race.get('Навыки') or [], list):
+        return "Навыки должны быть списком."
+    for skill in race.get('Навыки') or ():
+        error = validate_skill(skill)
+        if error:
+            return error
+    return None
+
+
+def half_race_parent(race):
+    # Всё, что нужно от расы для скрещивания, включая таблицу навыков без повторов
+    # по названию: она строится один раз на расу, а не заново для каждой пары
+    skills = race.get("Навыки", [])
+    return (race['Имя'], race.get("Скорость", "0"), race.get("Размер", ""), race.get("Темное зрение", "Нет"),
+            len(skills), {skill['Название']: skill for skill in skills})
+
+
+def combine_half_race(parent1, parent2, rng=random):
+    name1, speed1, size1, dark_vision1, num_skills1, skills1 = parent1
+    name2, speed2, size2, dark_vision2, num_skills2, skills2 = parent2
+    half_race = {}
+    half_race["Имя"] = f"Полураса: {name1}/{name2}"
+
+    # Случайный выбор скорости, размера и темного зрения
+    half_race["Скорость"] = rng.choice([speed1, speed2])
+    half_race["Размер"] = rng.choice([size1, size2])
+    half_race["Темное зрение"] = rng.choice([dark_vision1, dark_vision2])
+
+    # Определение максимального количества навыков
+    max_skills = int((num_skills1 + num_skills2) / 2)
+
+    # Случайный выбор навыков. Слияние таблиц даёт тот же порядок и те же значения,
+    # что и словарь по объединённому списку навыков обеих рас.
+    if max_skills > 0:
+        unique_skills = dict(skills1)
+        unique_skills.update(skills2)
+        skill_list = list(unique_skills.values())
+        selected_skills = rng.sample(skill_list, min(max_skills, len(skill_list)))
+    else:
+        selected_skills = []
+
+    half_race["Навыки"] = selected_skills
+
+    return half_race
+
+
+@spans.timed('generate_half_race')
+def generate_half_race(race1, race2, rng=random):
+    # rng можно заменить генератором с заданным зерном для воспроизводимого результата
+    return combine_half_race(half_race_parent(race1), half_race_parent(race2), rng)
+
+
+# Массовая генерация полурас: пары делятся на куски, куски обрабатываются
+# в пуле процессов, а результат выдаётся строками NDJSON в порядке пар
+HALF_RACE_CHUNK_SIZE = 256
+
+_half_race_parents = None
+_half_race_skill_json = None
+
+
+def half_race_rng(seed, race1_id, race2_id, sample=0):
+    # Генератор зависит только от зерна, пары и номера образца, поэтому результат
+    # не зависит от числа процессов и размера кусков
+    return random.Random(f"{seed}:{race1_id}:{race2_id}:{sample}")
+
+
+def all_race_pairs(race_ids):
+    # Все упорядоченные пары разных рас: A/B и B/A различаются именем и порядком навыков
+    return ((race1_id, race2_id) for race1_id in race_ids for race2_id in race_ids if race1_id != race2_id)
+
+
+def _init_half_race_worker(parents):
+    # Навыки кодируются в JSON один раз на процесс; строка полурасы собирается из готовых кусков.
+    # Одинаковые навыки разных рас - общий объект библиотеки, он кодируется один раз.
+    global _half_race_parents, _half_race_skill_json
+    _half_race_parents = parents
+    _half_race_skill_json = {}
+    for parent in parents.values():
+        for skill in parent[-1].values():
+            if id(skill) not in _half_race_skill_json:
+                _half_race_skill_json[id(skill)] = json.dumps(skill, ensure_ascii=False, default=json_default)
+
+
+def _half_race_chunk(task):
+    pairs, samples, seed = task
+    lines = []
+    for race1_id, race2_id in pairs:
+        parent1 = _half_race_parents[race1_id]
+        parent2 = _half_race_parents[race2_id]
+        for sample in range(samples):
+            record = {"Родители": [race1_id, race2_id], "Образец": sample}
+            record.update(combine_half_race(parent1, parent2, half_race_rng(seed, race1_id, race2_id, sample)))
+            skills = ", ".join(_half_race_skill_json[id(skill)] for skill in record.pop("Навыки"))
+            lines.append(f'{json.dumps(record, ensure_ascii=False)[:-1]}, "Навыки": [{skills}]}}')
+    return "".join(line + "\n" for line in lines)
+
+
+def generate_half_races(races, pairs=None, samples=1, seed=0, processes=None, chunk_size=HALF_RACE_CHUNK_SIZE):
+    # Выдаёт куски текста NDJSON. pairs - список пар Ид (по умолчанию все пары всех рас),
+    # processes=1 - без пула процессов, None - по числу ядер
+    if pairs is None:
+        race_ids = list(races)
+        pairs = all_race_pairs(race_ids)
+    else:
+        race_ids = {race_id for pair in pairs for race_id in pair}
+    parents = {race_id: half_race_parent(races.get(race_id)) for race_id in race_ids}
+    pairs = iter(pairs)
+    tasks = iter(lambda: (list(itertools.islice(pairs, chunk_size)), samples, seed), ([], samples, seed))
+    if processes == 1:
+        _init_half_race_worker(parents)
+        for task in tasks:
+            yield _half_race_chunk(task)
+        return
+    processes = processes or os.cpu_count() or 1
+    with process_pool(processes, _init_half_race_worker, (parents,)) as pool:
+        # Как в validate_records: не больше двух кусков на процесс, иначе при медленном
+        # потребителе готовый вывод копится в памяти без предела
+        limit = 2 * processes
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_half_race_chunk, (task,)))
+            if len(pending) >= limit:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+# Порог сходства (коэффициент Дайса по триграммам) для нечёткого поиска
+FUZZY_MIN_SCORE = 0.3
+FUZZY_LIMIT = 20
+# Триграммы, встречающиеся в большем числе записей, не дают новых кандидатов, когда limit рас
+# уже найдено (см. TrigramIndex._best): их перебор занимал почти всё время поиска в большом каталоге
+FUZZY_POSTINGS_CAP = 300
+
+
+def trigrams(text):
+    padded = f" {normalize_text(text).strip()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    # Триграммный индекс по именам рас и названиям навыков для поиска с опечатками.
+    # Запись - отдельное название (поле и текст) со всеми расами, где оно встречается,
+    # поэтому общий навык индексируется один раз; триграмма -> множество номеров записей.
+    def __init__(self):
+        self._postings = {}
+        self._entries = {}
+        self._texts = {}
+        self._sizes = {}
+        # Число записей каждого размера (в триграммах): наименьший уточняет границу в search
+        self._size_counts = collections.Counter()
+        self._fields = {}
+        self._key_entries = {}
+        self._next_entry = 0
+
+    def add(self, key, race):
+        if key in self._key_entries:
+            self.remove(key)
+        texts = [('имя', race.get('Имя', ''))]
+        texts.extend(('навык', skill.get('Название', '')) for skill in race.get('Навыки', []))
+        entry_ids = []
+        for field, text in texts:
+            if not text:
+                continue
+            entry_id = self._texts.get((field, text))
+            if entry_id is None:
+                grams = trigrams(text)
+                if not grams:
+                    continue
+                entry_id = self._next_entry
+                self._next_entry += 1
+                # Ключи рас - dict, чтобы порядок выдачи не зависел от хешей
+                self._entries[entry_id] = (field, text, {})
+                self._texts[(field, text)] = entry_id
+                self._sizes[entry_id] = len(grams)
+                self._size_counts[len(grams)] += 1
+                self._fields.setdefault(field, set()).add(entry_id)
+                for gram in grams:
+                    self._postings.setdefault(gram, set()).add(entry_id)
+            self._entries[entry_id][2][key] = None
+            entry_ids.append(entry_id)
+        self._key_entries[key] = list(dict.fromkeys(entry_ids))
+
+    def update(self, key, race):
+        self.add(key, race)
+
+    def remove(self, key):
+        for entry_id in self._key_entries.pop(key, ()):
+            field, text, keys = self._entries[entry_id]
+            del keys[key]
+            if keys:
+                continue
+            del self._entries[entry_id]
+            del self._texts[(field, text)]
+            size = self._sizes.pop(entry_id)
+            self._size_counts[size] -= 1
+            if not self._size_counts[size]:
+                del self._size_counts[size]
+            self._fields[field].discard(entry_id)
+            for gram in trigrams(text):
+                postings = self._postings[gram]
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def _scored(self, candidates, postings, query_size, threshold):
+        # Пары (-сходство, запись) кандидатов со сходством не ниже threshold: обычная
+        # сортировка пар ставит лучшие и раньше добавленные записи первыми. Общие триграммы
+        # считаются пересечением множеств, а порог проверяется через map, поэтому цикл
+        # Python проходит только по прошедшим его записям.
+        counts = collections.Counter(itertools.chain.from_iterable(map(candidates.intersection, postings)))
+        entry_ids = list(counts)
+        sizes = map(query_size.__add__, map(self._sizes.__getitem__, entry_ids))
+        halves = map(operator.truediv, counts.values(), sizes)
+        passed = itertools.compress(entry_ids, map((threshold / 2).__le__, halves))
+        return [(-2.0 * counts[entry_id] / (query_size + self._sizes[entry_id]), entry_id) for entry_id in passed]
+
+    def _best(self, query, limit, field, min_score, distinct):
+        # Лучшие записи (-сходство, запись), на которые приходится limit рас (distinct -
+        # разных рас, иначе пар раса-запись). Триграммы запроса перебираются от редких
+        # к частым, кандидатами становятся записи очередной триграммы, и их сходство
+        # сразу считается точно. Порог - сходство, при котором найденные записи набирают
+        # limit рас. Запись, не встретившаяся в первых триграммах, делит с запросом не
+        # больше r оставшихся, и её сходство не выше 2r/(q + max(r, наименьший размер
+        # записи)): когда эта граница ниже порога, перебор заканчивается. Он заканчивается
+        # и на триграмме длиннее FUZZY_POSTINGS_CAP, если limit рас уже набрано, - тогда
+        # результат приближённый: запись, у которой с запросом только частые триграммы,
+        # не попадёт в выдачу.
+        grams = trigrams(query)
+        query_size = len(grams)
+        postings = sorted(filter(None, map(self._postings.get, grams)), key=len)
+        allowed = None if field is None else self._fields.get(field, set())
+        smallest = min(self._size_counts, default=0)
+        threshold = min_score
+        results = []
+        seen = set()
+        for used, entries in enumerate(postings):
+            rest = len(postings) - used
+            if 2.0 * rest / (query_size + max(rest, smallest)) < threshold:
+                break
+            if used and threshold > min_score and len(entries) > FUZZY_POSTINGS_CAP:
+                # limit рас уже набрано: частые триграммы новых кандидатов не дают
+                break
+            # Новые кандидаты не встречаются в предыдущих триграммах: их сходство
+            # не выше 2r/(q + размер), что отсекает слишком длинные записи
+            candidates = entries.difference(seen)
+            seen.update(candidates)
+            if allowed is not None:
+                candidates &= allowed
+            if threshold > 0:
+                largest = 2.0 * rest / threshold - query_size
+                candidate_ids = list(candidates)
+                candidates = set(itertools.compress(candidate_ids, map(largest.__ge__,
+                                                                       map(self._sizes.__getitem__, candidate_ids))))
+            results.extend(self._scored(candidates, postings[used:], query_size, threshold))
+            results.sort()
+            counted = set()
+            found = 0
+            for position, (score, entry_id) in enumerate(results):
+                keys = self._entries[entry_id][2]
+                if distinct:
+                    # Первых limit ключей записи достаточно, чтобы понять, набрано ли limit рас
+                    counted.update(itertools.islice(keys, limit))
+                    found = len(counted)
+                else:
+                    found += len(keys)
+                if found >= limit:
+                    threshold = max(threshold, -score)
+                    del results[position + 1:]
+                    break
+        return results
+
+    def search(self, query, limit=FUZZY_LIMIT, field=None, min_score=FUZZY_MIN_SCORE):
+        # Возвращает до limit записей (сходство, ключ, поле, текст) по убыванию сходства
+        found = []
+        for score, entry_id in self._best(query, limit, field, min_score, False):
+            entry_field, text, keys = self._entries[entry_id]
+            for key in keys:
+                found.append((-score, key, entry_field, text))
+                if len(found) == limit:
+                    return found
+        return found
+
+    def search_keys(self, query, limit=FUZZY_LIMIT, field=None):
+        # Ключи limit рас с лучшим совпадением, без повторов
+        keys = {}
+        for score, entry_id in self._best(query, limit, field, FUZZY_MIN_SCORE, True):
+            for key in self._entries[entry_id][2]:
+                keys.setdefault(key)
+                if len(keys) == limit:
+                    return list(keys)
+        return list(keys)
+
+
+# Столбцы таблицы рас, по которым можно сортировать; "Навыки" - число навыков
+SORT_COLUMNS = ('Имя', 'Скорость', 'Размер', 'Темное зрение', 'Навыки')
+# Начала слов размеров от меньшего к большему
+SIZE_ORDER = ('крошечн', 'маленьк', 'средн', 'большо', 'огромн', 'громадн')
+# Если отфильтрованных рас меньше этой доли каталога, они сортируются напрямую по ключам,
+# иначе берутся из готовой перестановки
+SORT_SUBSET_RATIO = 8
+
+
+def race_sort_key(column, race):
+    # Типизированный ключ: числа из строк вроде "60 фт" разбираются здесь один раз
+    if column == 'Имя':
+        return str(race.get('Имя') or '').casefold()
+    if column == 'Навыки':
+        return len(race.get('Навыки') or ())
+    return value_sort_key(column, race.get(column))
+
+
+@functools.lru_cache(maxsize=4096)
+def value_sort_key(column, value):
+    # Значений скорости, размера и зрения немного, поэтому ключи для них кэшируются
+    text = '' if value is None else str(value)
+    if column == 'Размер':
+        lowered = text.casefold()
+        # Ранг по первому упомянутому размеру: "Средний / маленький" - средний
+        found = [(lowered.find(stem), rank) for rank, stem in enumerate(SIZE_ORDER) if stem in lowered]
+        return (min(found)[1] if found else len(SIZE_ORDER), lowered)
+    number = parse_number(text)
+    if column == 'Темное зрение':
+        # "Нет" - нулевая дальность
+        return (number or 0, text.casefold())
+    # Скорость: без числа - в конце
+    return (number is None, number or 0, text.casefold())
+
+
+class RaceSortIndex:
+    # Ключи сортировки считаются один раз на расу, а для каждого столбца хранится
+    # отсортированная перестановка пар (ключ, Ид). Добавление и удаление расы правят
+    # её через bisect, без пересортировки. Столбец строится при первой сортировке
+    # по нему; ключи берутся из RaceCatalog.summary, поэтому файл в ленивом режиме не разбирается.
+    def __init__(self, races):
+        self.races = races
+        self.keys = {}
+        self.orders = {}
+
+    def _build(self, column):
+        keys = {race_id: race_sort_key(column, self.races.summary(race_id)) for race_id in self.races}
+        self.keys[column] = keys
+        self.orders[column] = sorted((key, race_id) for race_id, key in keys.items())
+
+    def build(self, columns=SORT_COLUMNS):
+        # Заранее, например в фоне сразу после загрузки
+        for column in columns:
+            if column not in self.keys:
+                self._build(column)
+
+    def add(self, race_id, race):
+        for column, keys in self.keys.items():
+            key = race_sort_key(column, race)
+            keys[race_id] = key
+            bisect.insort(self.orders[column], (key, race_id))
+
+    def remove(self, race_id):
+        for column, keys in self.keys.items():
+            order = self.orders[column]
+            del order[bisect.bisect_left(order, (keys.pop(race_id), race_id))]
+
+    def update(self, race_id, race):
+        self.remove(race_id)
+        self.add(race_id, race)
+
+    def sorted_ids(self, column, ids=None, reverse=False):
+        # ids - отфильтрованные Ид (None - весь каталог)
+        if column not in self.keys:
+            self._build(column)
+        order = self.orders[column]
+        if ids is None:
+            result = [race_id for key, race_id in order]
+        elif len(ids) * SORT_SUBSET_RATIO < len(order):
+            keys = self.keys[column]
+            result = sorted(ids, key=lambda race_id: (keys[race_id], race_id))
+        else:
+            wanted = ids if isinstance(ids, (set, frozenset)) else set(ids)
+            result = [race_id for key, race_id in order if race_id in wanted]
+        if reverse:
+            result.reverse()
+        return result
+
+
+# Файлы с этими расширениями открываются через SQLite вместо JSON
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+SQLITE_PAGE_SIZE = 500
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS races (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name,
+    speed,
+    size,
+    dark_vision,
+    has_skills INTEGER NOT NULL DEFAULT 1,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS skills (
+    id INTEGER PRIMARY KEY,
+    race_id INTEGER NOT NULL REFERENCES races(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title,
+    description,
+    important,
+    additional,
+    has_options INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS options (
+    id INTEGER PRIMARY KEY,
+    skill_id INTEGER NOT NULL REFERENCES skills(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title,
+    description,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS races_position ON races(position);
+CREATE INDEX IF NOT EXISTS races_name ON races(name);
+CREATE INDEX IF NOT EXISTS skills_race ON skills(race_id, position);
+CREATE INDEX IF NOT EXISTS skills_title ON skills(title);
+CREATE INDEX IF NOT EXISTS options_skill ON options(skill_id, position);
+"""
+
+# Соответствие ключей JSON и столбцов таблиц; остальные ключи хранятся в столбце extra.
+# Столбцы значений объявлены без типа, чтобы SQLite не менял тип (число остаётся числом).
+RACE_COLUMNS = (('Имя', 'name'), ('Скорость', 'speed'), ('Размер', 'size'), ('Темное зрение', 'dark_vision'))
+SKILL_COLUMNS = (('Название', 'title'), ('Описание', 'description'), ('Важный', 'important'),
+                 ('Дополнительно', 'additional'))
+OPTION_COLUMNS = (('Название', 'title'), ('Описание', 'description'))
+
+
+def is_sqlite_file(filename):
+    return filename.lower().endswith(SQLITE_EXTENSIONS)
+
+
+def split_record(record, columns, skip=()):
+    # Значения известных ключей (None - ключа нет) и JSON с остальными ключами;
+    # ключи из skip хранятся отдельно (вложенные списки, Ид)
+    values = [record.get(key) for key, _ in columns]
+    known = {key for key, _ in columns}
+    known.update(skip)
+    extra = {key: value for key, value in record.items() if key not in known}
+    return values, json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+def join_record(row, columns, extra):
+    record = {key: value for (key, _), value in zip(columns, row) if value is not None}
+    if extra:
+        record.update(json.loads(extra))
+    return record
+
+
+class SqliteRaceStorage:
+    # Хранилище рас в SQLite: каждая правка - отдельная транзакция, чтение постраничное.
+    # Каталог приложения читает базу через RaceCatalog.open_sqlite: в памяти остаются
+    # заглушки с полями для индексов, а полные записи читаются по Ид (get_races).
+    # check_same_thread=False - соединение используется из разных потоков под внешней блокировкой.
+    def __init__(self, filename, check_same_thread=True):
+        import sqlite3
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, check_same_thread=check_same_thread)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SQLITE_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def iter_races(self, page_size=SQLITE_PAGE_SIZE):
+        # Постраничное чтение по позиции: в памяти одновременно не больше одной страницы
+        last_position = -1
+        while True:
+            rows = self.connection.execute(
+                "SELECT id, position, name, speed, size, dark_vision, has_skills, extra FROM races "
+                "WHERE position > ? ORDER BY position LIMIT ?", (last_position, page_size)).fetchall()
+            if not rows:
+                return
+            yield from self._assemble(rows)
+            last_position = rows[-1][1]
+
+    def get_races(self, race_ids):
+        # Записи рас по Ид (не больше страницы за раз): Ид -> запись
+        rows = self.connection.execute(
+            f"SELECT id, position, name, speed, size, dark_vision, has_skills, extra FROM races "
+            f"WHERE id IN ({','.join('?' * len(race_ids))})", race_ids).fetchall()
+        return {race['Ид']: race for race in self._assemble(rows)}
+
+    def _assemble(self, race_rows):
+        if not race_rows:
+            return []
+        race_ids = [row[0] for row in race_rows]
+        placeholders = ','.join('?' * len(race_ids))
+        skills_by_race = collections.defaultdict(list)
+        skill_rows = self.connection.execute(
+            f"SELECT id, race_id, title, description, important, additional, has_options, extra FROM skills "
+            f"WHERE race_id IN ({placeholders}) ORDER BY race_id, position", race_ids).fetchall()
+        options_by_skill = collections.defaultdict(list)
+        skill_ids = [row[0] for row in skill_rows]
+        for start in range(0, len(skill_ids), SQLITE_PAGE_SIZE):
+            chunk = skill_ids[start:start + SQLITE_PAGE_SIZE]
+            option_rows = self.connection.execute(
+                f"SELECT skill_id, title, description, extra FROM options "
+                f"WHERE skill_id IN ({','.join('?' * len(chunk))}) ORDER BY skill_id, position", chunk)
+            for skill_id, title, description, extra in option_rows:
+                options_by_skill[skill_id].append(join_record((title, description), OPTION_COLUMNS, extra))
+        for skill_id, race_id, title, description, important, additional, has_options, extra in skill_rows:
+            # Порядок ключей как в диалоге навыка: опции идут перед дополнительной информацией
+            skill = join_record((title, description, important), SKILL_COLUMNS[:3], None)
+            if has_options:
+                skill['Опции'] = options_by_skill[skill_id]
+            if additional is not None:
+                skill['Дополнительно'] = additional
+            if extra:
+                skill.update(json.loads(extra))
+            skills_by_race[race_id].append(skill)
+
+        races = []
+        for race_id, _, name, speed, size, dark_vision, has_skills, extra in race_rows:
+            race = {'Ид': race_id}
+            race.update(join_record((name, speed, size, dark_vision), RACE_COLUMNS, None))
+            if has_skills:
+                race['Навыки'] = skills_by_race[race_id]
+            if extra:
+                race.update(json.loads(extra))
+            races.append(race)
+        return races
+
+    def _write_race(self, position, race):
+        # Ид расы служит первичным ключом таблицы races
+        race_id = race['Ид']
+        values, extra = split_record(race, RACE_COLUMNS, ('Ид', 'Навыки'))
+        self.connection.execute(
+            "INSERT INTO races (id, position, name, speed, size, dark_vision, has_skills, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (race_id, position, *values, 'Навыки' in race, extra))
+        for skill_position, skill in enumerate(race.get('Навыки', [])):
+            values, extra = split_record(skill, SKILL_COLUMNS, ('Опции',))
+            cursor = self.connection.execute(
+                "INSERT INTO skills (race_id, position, title, description, important, additional, "
+                "has_options, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (race_id, skill_position, *values, 'Опции' in skill, extra))
+            skill_id = cursor.lastrowid
+            option_rows = []
+            for option_position, option in enumerate(skill.get('Опции', [])):
+                values, extra = split_record(option, OPTION_COLUMNS)
+                option_rows.append((skill_id, option_position, *values, extra))
+            self.connection.executemany(
+                "INSERT INTO options (skill_id, position, title, description, extra) VALUES (?, ?, ?, ?, ?)",
+                option_rows)
+
+    def _put_race(self, race):
+        # Новая раса встаёт в конец списка, изменённая сохраняет своё место;
+        # позиции остальных рас не меняются (в них допустимы пропуски)
+        row = self.connection.execute("SELECT position FROM races WHERE id = ?", (race['Ид'],)).fetchone()
+        if row:
+            position = row[0]
+            self.connection.execute("DELETE FROM races WHERE id = ?", (race['Ид'],))
+        else:
+            position = self.connection.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM races").fetchone()[0]
+        self._write_race(position, race)
+
+    def put_race(self, race):
+        with self.connection:
+            self._put_race(race)
+
+    def put_races(self, races):
+        # Пакет рас одной транзакцией (массовый импорт)
+        with self.connection:
+            for race in races:
+                self._put_race(race)
+
+    def delete_race(self, race_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM races WHERE id = ?", (race_id,))
+
+    def replace_all(self, races):
+        with self.connection:
+            self.connection.execute("DELETE FROM races")
+            for position, race in enumerate(races):
+                self._write_race(position, race)
+
+    def import_json(self, filename):
+        # Расам без Ид (или с повторяющимся Ид) номера назначаются так же, как при загрузке JSON
+        with open(filename, "r", encoding="utf-8") as f:
+            catalog = RaceCatalog.from_document(json.load(f))
+        self.replace_all(catalog.races())
+        return len(catalog)
+
+    def export_json(self, filename):
+        # Формат совпадает с races.json, записи пишутся по одной странице за раз
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("[")
+            separator = "\n    "
+            for race in self.iter_races():
+                f.write(separator)
+                f.write(format_race_json(race))
+                separator = ",\n    "
+            f.write("]" if separator == "\n    " else "\n]")
+
+
+# Ленивая загрузка: при большом races.json в памяти держатся только имена и
+# смещения записей в файле, а полные записи разбираются по требованию
+LAZY_LOAD_THRESHOLD = 50 * 1024 * 1024
+LAZY_CACHE_SIZE = 256
+LAZY_CHUNK_SIZE = 1 << 20
+OFFSETS_SUFFIX = ".offsets"
+
+
+def record_digest(data):
+    # Хеш байтов записи расы в файле: по нему перечитанный файл сравнивается
+    # с заглушками без разбора записей
+    return hashlib.sha256(data).hexdigest()[:SKILL_DIGEST_LENGTH]
+
+
+# Имя расы с номером для различения одноимённых рас: "Гном [#12]"
+DISPLAY_ID_RE = re.compile(r' \[#(\d+)\]$')
+
+
+class RaceStub:
+    # Нематериализованная раса: Ид, имя и границы записи в байтах внутри races.json.
+    # id_in_file - записан ли Ид в самом файле (иначе он назначен при загрузке).
+    # skills - ссылки записи на общие навыки или None, если навыки записаны целиком.
+    # digest - хеш байтов записи (record_digest).
+    # fields - значения SUMMARY_FIELDS, skill_digests - хеши всех навыков записи в
+    # библиотеке каталога: по ним строятся индексы (RaceCatalog.summary).
+    __slots__ = ('id', 'name', 'start', 'end', 'id_in_file', 'skills', 'digest', 'fields', 'skill_digests')
+
+    def __init__(self, race_id, name, start, end, id_in_file=True, skills=None, digest=None, fields=None,
+                 skill_digests=()):
+        self.id = race_id
+        self.name = name
+        self.start = start
+        self.end = end
+        self.id_in_file = id_in_file
+        self.skills = skills
+        self.digest = digest
+        self.fields = fields
+        self.skill_digests = skill_digests
+
+
+# Поля записи, которые заглушка хранит для индексов и строк списка, кроме имени и навыков
+SUMMARY_FIELDS = ('Скорость', 'Размер', 'Темное зрение')
+
+
+def summary_fields(race):
+    # Значений немного ("30 фт", "Средний"), поэтому строки интернируются
+    return tuple(sys.intern(value) if isinstance(value, str) else value
+                 for value in (race.get(field, '') for field in SUMMARY_FIELDS))
+
+
+def scan_race_offsets(filename, digest=None, library=None):
+    # Один проход по файлу кусками: каждая запись разбирается и сразу отбрасывается,
+    # остаются только Ид, имя, поля для индексов и смещения, поэтому память не растёт
+    # с размером файла. Навыки, записанные целиком, добавляются в library (общие
+    # объекты), а заглушка хранит их хеши.
+    # Возвращает заглушки и таблицу общих навыков (None для файла в виде списка рас).
+    library = library if library is not None else SkillLibrary()
+
+
+    decoder = json.JSONDecoder()
+    stubs = []
+    table = None
+    text = ""
+    position = 0
+    byte_position = 0
+    # None - начало файла, 'object' - ключи документа с библиотекой, 'races' - список рас
+    state = None
+    key = None
+    shared = False
+    with open(filename, "rb") as f:
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        eof = False
+        while True:
+            while position < len(text) and text[position] in " \t\r\n,:":
+                byte_position += 1
+                position += 1
+            if position < len(text):
+                char = text[position]
+                if state is None or (state == 'object' and key == DOCUMENT_RACES_KEY and char == "["):
+                    if char == "{" and state is None:
+                        state = 'object'
+                        shared = True
+                    elif char == "[":
+                        state = 'races'
+                        key = None
+                    else:
+                        raise json.JSONDecodeError("Ожидался список рас", text, position)
+                    byte_position += 1
+                    position += 1
+                    continue
+                if (state == 'races' and char == "]") or (state == 'object' and char == "}"):
+                    byte_position += 1
+                    position += 1
+                    if state == 'races' and shared:
+                        state = 'object'
+                        continue
+                    if digest is not None:
+                        for chunk in iter(lambda: f.read(LAZY_CHUNK_SIZE), b""):
+                            digest.update(chunk)
+                    return stubs, table
+                try:
+                    value, end = decoder.raw_decode(text, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                if end is not None:
+                    data = text[position:end].encode("utf-8")
+                    length = len(data)
+                    if state == 'races':
+                        if not isinstance(value, dict):
+                            raise json.JSONDecodeError("Ожидался объект расы", text, position)
+                        skills = value.get('Навыки')
+                        skills = skills if isinstance(skills, list) else ()
+                        skill_digests = tuple(sys.intern(skill) if isinstance(skill, str)
+                                              else library.digest(library.intern(skill))
+                                              for skill in skills if isinstance(skill, (str, dict)))
+                        refs = None
+                        if shared:
+                            refs = tuple(sys.intern(skill) for skill in skills if isinstance(skill, str))
+                            if refs == skill_digests:
+                                # Обычно все навыки записи - ссылки: кортеж хранится один
+                                refs = skill_digests
+                        stubs.append(RaceStub(value.get('Ид'), value.get('Имя', 'Безымянная раса'),
+                                              byte_position, byte_position + length, skills=refs,
+                                              digest=record_digest(data), fields=summary_fields(value),
+                                              skill_digests=skill_digests))
+                    elif key is None:
+                        key = value
+                    else:
+                        if key == DOCUMENT_SKILLS_KEY:
+                            table = value
+                        key = None
+                    byte_position += length
+                    position = end
+                    continue
+            if eof:
+                raise json.JSONDecodeError("Неожиданный конец файла", text, position)
+            chunk = f.read(LAZY_CHUNK_SIZE)
+            if digest is not None:
+                digest.update(chunk)
+            eof = not chunk
+            text = text[position:] + utf8.decode(chunk, final=eof)
+            position = 0
+
+
+def is_valid_race_id(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def format_race_json(race):
+    # Запись расы в том же виде, что и элемент списка в races.json с indent=4
+    return json.dumps(race, ensure_ascii=False, indent=4, default=json_default).replace("\n", "\n    ")
+
+
+class RaceCatalog:
+    # Расы по стабильному Ид в порядке списка (dict сохраняет порядок вставки):
+    # добавление, замена, удаление и поиск по Ид или по имени - O(1).
+    # Элемент - Race либо RaceStub, если файл загружен лениво; разобранные
+    # записи заглушек хранятся в ограниченном LRU.
+    def __init__(self, filename=None, lock=None):
+        self.slots = {}
+        self.ids_by_name = {}
+        self.next_id = 1
+        self.filename = filename
+        self.lock = lock or threading.Lock()
+        self.library = SkillLibrary()
+        self._cache = collections.OrderedDict()
+        # (время изменения, размер, sha256) races.json, из которого прочитан каталог
+        self.source = None
+        # Есть расы, чей Ид выдан при загрузке, а не записан в файле (см. write_race_ids)
+        self.assigned_ids = False
+        # База SQLite, из которой читаются записи заглушек (open_sqlite)
+        self.storage = None
+
+    @classmethod
+    def from_races(cls, races):
+        catalog = cls()
+        catalog._fill(races)
+        return catalog
+
+    @classmethod
+    def from_document(cls, document):
+        # Разобранный races.json: список рас либо объект со списком рас и таблицей навыков
+        catalog = cls()
+        if isinstance(document, dict):
+            catalog.library.load(document.get(DOCUMENT_SKILLS_KEY, {}))
+            catalog._fill(document.get(DOCUMENT_RACES_KEY, []), refs=True)
+        else:
+            catalog._fill(document)
+        return catalog
+
+    @classmethod
+    def from_snapshot_cache(cls, cached):
+        # Каталог из кэша снимка (snapshot_cache) восстанавливается как есть: навыки рас -
+        # те же объекты, что в таблице (pickle сохраняет общие ссылки), поэтому записи
+        # не проходят через библиотеку и навыки не хешируются заново
+        slots, ids_by_name, table, next_id, assigned_ids = cached
+        catalog = cls()
+        catalog.library.load(table)
+        catalog.slots = slots
+        catalog.ids_by_name = ids_by_name
+        catalog.next_id = next_id
+        catalog.assigned_ids = assigned_ids
+        return catalog
+
+    @classmethod
+    def open_lazy(cls, filename):
+        # Индекс смещений сохраняется рядом с файлом и проверяется так же, как кэш снимка
+        catalog = cls(filename)
+        cached = read_snapshot_cache(filename, OFFSETS_SUFFIX)
+        if cached is not None:
+            catalog.source, (table, entries) = cached
+            catalog.library.load(table)
+            catalog._fill(RaceStub(*entry) for entry in entries)
+            return catalog
+        stat = os.stat(filename)
+        digest = hashlib.sha256()
+        stubs, table = scan_race_offsets(filename, digest, catalog.library)
+        catalog.library.load(table or {})
+        catalog._fill(stubs)
+        catalog.source = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        if os.stat(filename).st_mtime_ns == stat.st_mtime_ns:
+            write_snapshot_cache(filename, catalog.offsets_cache(), digest.hexdigest(), stat, OFFSETS_SUFFIX)
+        return catalog
+
+    @classmethod
+    def open_sqlite(cls, filename):
+        # Расы читаются из базы страницами и сразу сводятся к заглушкам с полями для
+        # индексов; навыки становятся общими объектами библиотеки
+        catalog = cls()
+        catalog.storage = SqliteRaceStorage(filename, check_same_thread=False)
+        library = catalog.library
+        catalog._fill(RaceStub(race['Ид'], race.get('Имя', 'Безымянная раса'), None, None, fields=summary_fields(race),
+                               skill_digests=tuple(library.digest(library.intern(skill))
+                                                   for skill in race.get('Навыки', ())))
+                      for race in catalog.storage.iter_races())
+        return catalog
+
+    def _fill(self, items, refs=False):
+        # Ид из файла сохраняются; отсутствующие и повторяющиеся назначаются по порядку
+        # после наибольшего, поэтому один и тот же файл всегда даёт одни и те же Ид.
+        # Одинаковые навыки рас заменяются общими объектами библиотеки.
+        items = [item if isinstance(item, RaceStub) else self.library.race(item, refs) for item in items]
+        known_ids = [self._item_id(item) for item in items]
+        self.next_id = max((race_id for race_id in known_ids if is_valid_race_id(race_id)), default=0) + 1
+        for item, race_id in zip(items, known_ids):
+            if not is_valid_race_id(race_id) or race_id in self.slots:
+                race_id = self._new_id()
+                item = self._with_id(item, race_id)
+                self.assigned_ids = True
+            elif isinstance(item, RaceStub) and not item.id_in_file:
+                # Заглушка из кэша смещений с Ид, выданным при прошлой загрузке
+                self.assigned_ids = True
+            self._store(race_id, item)
+
+    def _new_id(self):
+        race_id = self.next_id
+        self.next_id += 1
+        return race_id
+
+    def _item_id(self, item):
+        return item.id if isinstance(item, RaceStub) else item.get('Ид')
+
+    def _item_name(self, item):
+        return item.name if isinstance(item, RaceStub) else item.get('Имя', 'Безымянная раса')
+
+    def _with_id(self, item, race_id):
+        if isinstance(item, RaceStub):
+            item.id = race_id
+            item.id_in_file = False
+            return item
+        return Race.from_dict(item).with_id(race_id)
+
+    def _store(self, race_id, item):
+        self.slots[race_id] = item
+        self.ids_by_name.setdefault(self._item_name(item), []).append(race_id)
+
+    def _unstore_name(self, race_id, item):
+        name = self._item_name(item)
+        ids = self.ids_by_name[name]
+        ids.remove(race_id)
+        if not ids:
+            del self.ids_by_name[name]
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, race_id):
+        return race_id in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def ids(self):
+        return list(self.slots)
+
+    def races(self):
+        race_ids = list(self.slots)
+        if self.storage is None:
+            for race_id in race_ids:
+                yield self.get(race_id)
+            return
+        # Записи заглушек из базы читаются страницами, мимо LRU разобранных записей
+        for start in range(0, len(race_ids), SQLITE_PAGE_SIZE):
+            page = race_ids[start:start + SQLITE_PAGE_SIZE]
+            with self.lock:
+                records = self.storage.get_races([race_id for race_id in page
+                                                  if isinstance(self.slots.get(race_id), RaceStub)])
+            for race_id in page:
+                record = records.get(race_id)
+                yield self.get(race_id) if record is None else self.library.race(record)
+
+    def get(self, race_id):
+        item = self.slots.get(race_id)
+        if isinstance(item, RaceStub):
+            return self._materialize(item)
+        return item
+
+    def name(self, race_id):
+        return self._item_name(self.slots[race_id])
+
+    def summary(self, race_id):
+        # Запись для индексов и строки списка без разбора полной записи из файла:
+        # у заглушки - имя, SUMMARY_FIELDS и общие навыки из библиотеки
+        item = self.slots[race_id]
+        if not isinstance(item, RaceStub):
+            return item
+        summary = {'Имя': item.name}
+        if item.fields is not None:
+            summary.update(zip(SUMMARY_FIELDS, item.fields))
+            skills = self.library.skills
+            summary['Навыки'] = [skills[digest] for digest in item.skill_digests if digest in skills]
+        return summary
+
+    def find(self, name):
+        return list(self.ids_by_name.get(name, ()))
+
+    def display_name(self, race_id):
+        name = self.name(race_id)
+        if len(self.ids_by_name.get(name, ())) > 1:
+            return f"{name} [#{race_id}]"
+        return name
+
+    def resolve(self, text):
+        # Ид рас, подходящих под имя из списка выбора (с номером или без)
+        match = DISPLAY_ID_RE.search(text)
+        if match and int(match.group(1)) in self.slots:
+            return [int(match.group(1))]
+        return self.find(text)
+
+    def add(self, race, digests=None):
+        # Ид сохраняется, если он свободен (воспроизведение журнала), иначе выдаётся новый.
+        # digests - хеши навыков, если они уже посчитаны (массовый импорт).
+        race_id = race.get('Ид')
+        if not is_valid_race_id(race_id) or race_id in self.slots:
+            race_id = self._new_id()
+            if type(race) is dict:
+                # Ид ставится до создания модели, чтобы не собирать Race дважды
+                race = dict(race)
+                race['Ид'] = race_id
+            else:
+                race = Race.from_dict(race).with_id(race_id)
+        race = self.library.race(race, digests=digests)
+        self.next_id = max(self.next_id, race_id + 1)
+        self._store(race_id, race)
+        return race
+
+    def replace(self, race, digests=None):
+        # Запись по существующему ключу dict остаётся на своём месте в списке
+        race = self.library.race(race, digests=digests)
+        race_id = race['Ид']
+        old = self.slots[race_id]
+        self._unstore_name(race_id, old)
+        if isinstance(old, RaceStub):
+            self._cache.pop(old, None)
+        self.slots[race_id] = race
+        self.ids_by_name.setdefault(self._item_name(race), []).append(race_id)
+        return race
+
+    def put(self, race, digests=None):
+        race_id = race.get('Ид')
+        if race_id in self.slots:
+            return self.replace(race, digests)
+        return self.add(race, digests)
+
+    def remove(self, race_id):
+        item = self.slots.pop(race_id)
+        self._unstore_name(race_id, item)
+        if isinstance(item, RaceStub):
+            self._cache.pop(item, None)
+        return item
+
+    def copy(self):
+        # Копия для записи снимка: делит с оригиналом заглушки и блокировку,
+        # чтобы сжатие журнала могло обновить смещения у обоих
+        clone = RaceCatalog(self.filename, self.lock)
+        clone.slots = dict(self.slots)
+        clone.next_id = self.next_id
+        clone.library = self.library
+        clone.source = self.source
+        clone.assigned_ids = self.assigned_ids
+        clone.storage = self.storage
+        return clone
+
+    def skill_users(self, skill):
+        # Ид рас с этим навыком. У заглушек проверяются хеши навыков, записи не разбираются.
+        digest = self.library.digest(skill)
+        users = []
+        for race_id, item in self.slots.items():
+            if isinstance(item, RaceStub) and item.fields is not None:
+                if digest in item.skill_digests:
+                    users.append(race_id)
+                continue
+            skills = self.get(race_id).get('Навыки')
+            if isinstance(skills, list) and any(self.library.digest(other) == digest for other in skills):
+                users.append(race_id)
+        return users
+
+    def _materialize(self, stub):
+        race = self._cache.get(stub)
+        if race is not None:
+            self._cache.move_to_end(stub)
+            return race
+        if self.storage is not None:
+            with self.lock:
+                record = self.storage.get_races([stub.id])[stub.id]
+        else:
+            with self.lock:
+                with open(self.filename, "rb") as f:
+                    f.seek(stub.start)
+                    data = f.read(stub.end - stub.start)
+            record = json.loads(data)
+        race = self.library.race(record, refs=stub.skills is not None)
+        if not stub.id_in_file:
+            race = race.with_id(stub.id)
+        self._cache[stub] = race
+        if len(self._cache) > LAZY_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return race
+
+    def dump(self, f):
+        # Пишет races.json в двоичный файл: список рас со ссылками на навыки, затем
+        # таблицу навыков - каждый навык один раз. Заглушки с Ид и ссылками в файле
+        # копируются байтами без разбора. Возвращает новые смещения, ссылки и хеши всех записей.
+        offsets = []
+        table = {}
+        f.write(f'{{"{DOCUMENT_RACES_KEY}": ['.encode("utf-8"))
+        separator = b"\n"
+        source = open(self.filename, "rb") if self.filename else None
+        try:
+            for item in self.slots.values():
+                f.write(separator)
+                separator = b",\n"
+                f.write(b"    ")
+                start = f.tell()
+                if isinstance(item, RaceStub) and item.id_in_file and item.skills is not None:
+                    with self.lock:
+                        source.seek(item.start)
+                        f.write(source.read(item.end - item.start))
+                    refs = item.skills
+                    digest = item.digest
+                    for ref in refs:
+                        if ref not in table:
+                            table[ref] = self.library.skills[ref]
+                else:
+                    race = self._materialize(item) if isinstance(item, RaceStub) else item
+                    record = self.library.record(race)
+                    data = format_race_json(record).encode("utf-8")
+                    f.write(data)
+                    digest = record_digest(data)
+                    refs = ()
+                    if record is not race:
+                        refs = tuple(record['Навыки'])
+                        for ref, skill in zip(refs, race['Навыки']):
+                            table.setdefault(ref, skill)
+                offsets.append((item, start, f.tell(), refs, digest))
+        finally:
+            if source:
+                source.close()
+        f.write(b"]" if separator == b"\n" else b"\n]")
+        f.write(f',\n"{DOCUMENT_SKILLS_KEY}": {{'.encode("utf-8"))
+        separator = "\n"
+        for digest, skill in table.items():
+            # Навык с тем же отступом, что и запись расы
+            f.write(f'{separator}    "{digest}": {format_race_json(skill)}'.encode("utf-8"))
+            separator = ",\n"
+        f.write(b"}}" if separator == "\n" else b"\n}}")
+        return offsets
+
+    def relocate(self, offsets):
+        # Вызывается под self.lock сразу после замены файла новым снимком
+        for item, start, end, refs, digest in offsets:
+            if isinstance(item, RaceStub):
+                item.start = start
+                item.end = end
+                item.id_in_file = True
+                item.skills = refs
+                item.digest = digest
+
+    def snapshot_cache(self):
+        # Содержимое кэша снимка для каталога без заглушек: расы по Ид, Ид по имени,
+        # таблица навыков рас и следующий Ид. Строится и по копии каталога (в фоне),
+        # у которой нет своего словаря имён.
+        ids_by_name = {}
+        table = {}
+        for race_id, race in self.slots.items():
+            ids_by_name.setdefault(self._item_name(race), []).append(race_id)
+            skills = race.get('Навыки')
+            if isinstance(skills, list):
+                for skill in skills:
+                    table.setdefault(self.library.digest(skill), skill)
+        return self.slots, ids_by_name, table, self.next_id, self.assigned_ids
+
+    def offsets_cache(self, offsets=None):
+        # Содержимое кэша смещений: таблица навыков записей и заглушки
+        if offsets is None:
+            offsets = [(item, item.start, item.end, item.skills, item.digest) for item in self.slots.values()]
+        entries = []
+        table = {}
+        for item, start, end, refs, digest in offsets:
+            if isinstance(item, RaceStub):
+                id_in_file = item.id_in_file
+                fields = item.fields
+                skill_digests = item.skill_digests
+            else:
+                id_in_file = True
+                fields = summary_fields(item)
+                skills = item.get('Навыки')
+                skills = skills if isinstance(skills, list) else ()
+                skill_digests = tuple(self.library.digest(self.library.intern(skill)) for skill in skills)
+            entries.append((self._item_id(item), self._item_name(item), start, end, id_in_file, refs, digest,
+                            fields, skill_digests))
+            for ref in itertools.chain(refs or (), skill_digests):
+                if ref not in table and ref in self.library.skills:
+                    table[ref] = self.library.skills[ref]
+        return table, entries
+
+
+def diff_races(old, new):
+    # Ид добавленных, изменённых и удалённых рас каталога new относительно old.
+    # Заглушки сравниваются по хешу байтов записи: файл, на который указывают
+    # смещения старых заглушек, уже заменён, поэтому разобрать их нельзя, и раса,
+    # бывшая заглушкой, а теперь записанная целиком, считается изменённой.
+    added = [race_id for race_id in new.slots if race_id not in old.slots]
+    removed = [race_id for race_id in old.slots if race_id not in new.slots]
+    changed = []
+    for race_id, item in new.slots.items():
+        old_item = old.slots.get(race_id)
+        if old_item is None:
+            continue
+        if isinstance(old_item, RaceStub):
+            if not isinstance(item, RaceStub) or item.digest is None or item.digest != old_item.digest:
+                changed.append(race_id)
+        elif isinstance(item, RaceStub):
+            if new.get(race_id) != old_item:
+                changed.append(race_id)
+        elif item != old_item:
+            changed.append(race_id)
+    return added, changed, removed
+
+
+# Журнал правок рядом с races.json: fsync после стольких записей (и по таймеру),
+# сжатие в снимок после стольких записей
+JOURNAL_SYNC_EVERY = 20
+JOURNAL_SYNC_MS = 1000
+JOURNAL_COMPACT_EVERY = 500
+
+
+# Двоичный кэш снимка рядом с races.json (pickle, протокол 5). Кэш действителен,
+# только если совпадают время изменения, размер и хеш содержимого races.json.
+CACHE_SUFFIX = ".cache"
+CACHE_FORMAT = 7
+
+
+def read_snapshot_cache(filename, suffix=CACHE_SUFFIX):
+    # Возвращает состояние races.json (время изменения, размер, sha256) и содержимое кэша
+    try:
+        with open(filename + suffix, "rb") as f:
+            header = pickle.load(f)
+            stat = os.stat(filename)
+            if header[:3] != (CACHE_FORMAT, stat.st_mtime_ns, stat.st_size):
+                return None
+            if header[3] != file_sha256(filename):
+                return None
+            state = header[1:4]
+            # Сборщик мусора заметно замедляет создание миллионов объектов подряд
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return state, pickle.load(f)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, IndexError,
+            AttributeError, ImportError):
+        return None
+
+
+def write_snapshot_cache(filename, races, digest, stat, suffix=CACHE_SUFFIX):
+    # stat и digest должны описывать именно тот races.json, из которого получен races
+    temp_filename = filename + suffix + ".tmp"
+    try:
+        with open(temp_filename, "wb") as f:
+            pickle.dump((CACHE_FORMAT, stat.st_mtime_ns, stat.st_size, digest), f, protocol=5)
+            pickle.dump(races, f, protocol=5)
+        os.replace(temp_filename, filename + suffix)
+    except OSError:
+        # Кэш лишь ускоряет запуск; без него данные всё равно читаются из JSON
+        pass
+
+
+def apply_journal_record(races, record):
+    # Записи ссылаются на расы по Ид, поэтому не зависят от порядка в списке
+    op = record['op']
+    if op == 'put':
+        races.put(Race.from_dict(record['race']))
+    elif op == 'delete':
+        if record['id'] in races:
+            races.remove(record['id'])
+
+
+def file_sha256(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SnapshotChangedError(OSError):
+    # races.json изменён другой программой после чтения: сжатие журнала затёрло бы
+    # эту правку, а при ленивой загрузке скопировало бы байты по устаревшим смещениям
+    pass
+
+
+class RaceJournal:
+    # Журнал в формате JSON lines: каждая правка дописывает одну запись.
+    # При загрузке журнал применяется поверх снимка (races.json), а сжатие
+    # записывает новый снимок через атомарное переименование.
+    def __init__(self, snapshot_filename):
+        self.snapshot_filename = snapshot_filename
+        self.filename = snapshot_filename + ".journal"
+        self.compacting_filename = snapshot_filename + ".journal.compacting"
+        self.lock = threading.Lock()
+        self.file = None
+        self.records = 0
+        self.unsynced = 0
+        self.compacting = False
+        # Состояние снимка, поверх которого применён журнал (см. RaceCatalog.source);
+        # None - снимка не было
+        self.snapshot_state = None
+
+    def _compacting_is_done(self, records):
+        # Журнал, уже свёрнутый в снимок, заканчивается отметкой с хешем этого снимка
+        return (records and records[-1]['op'] == 'compacted'
+                and os.path.exists(self.snapshot_filename)
+                and records[-1]['sha256'] == file_sha256(self.snapshot_filename))
+
+    def replay(self, races):
+        applied = 0
+        if os.path.exists(self.compacting_filename):
+            records = self._read(self.compacting_filename)
+            if not self._compacting_is_done(records):
+                for record in records:
+                    apply_journal_record(races, record)
+                applied += len(records)
+        if os.path.exists(self.filename):
+            records = self._read(self.filename)
+            for record in records:
+                apply_journal_record(races, record)
+            applied += len(records)
+        self.records = applied
+        return applied
+
+    def _read(self, filename):
+        records = []
+        with open(filename, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Недописанная последняя строка после сбоя
+                    break
+        return records
+
+    def _append(self, *records):
+        # Несколько записей пишутся одним write и одним flush
+        lines = "".join(json.dumps(record, ensure_ascii=False, default=json_default) + "\n" for record in records)
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.filename, "a", encoding="utf-8")
+            self.file.write(lines)
+            self.file.flush()
+            self.records += len(records)
+            self.unsynced += len(records)
+            if self.unsynced >= JOURNAL_SYNC_EVERY:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def sync(self):
+        with self.lock:
+            self._sync_locked()
+
+    def put_race(self, race):
+        self._append({'op': 'put', 'race': race})
+
+    def put_races(self, races):
+        # Пакет рас (массовый импорт)
+        self._append(*({'op': 'put', 'race': race} for race in races))
+
+    def delete_race(self, race_id):
+        self._append({'op': 'delete', 'id': race_id})
+
+    def needs_compaction(self):
+        return self.records >= JOURNAL_COMPACT_EVERY
+
+    def is_compacting(self):
+        return self.compacting
+
+    def check_snapshot(self, full=True):
+        # Ошибка, если races.json отличается от прочитанного. full - сверка по хешу:
+        # ловит правку без смены размера и пропускает простое обновление времени изменения
+        try:
+            stat = os.stat(self.snapshot_filename)
+        except FileNotFoundError:
+            stat = None
+        state = self.snapshot_state
+        if stat is None or state is None:
+            if stat is not None or state is not None:
+                raise SnapshotChangedError(f"Файл {self.snapshot_filename} изменён другой программой")
+            return
+        if not full and (stat.st_mtime_ns, stat.st_size) == state[:2]:
+            return
+        if stat.st_size != state[1] or file_sha256(self.snapshot_filename) != state[2]:
+            raise SnapshotChangedError(f"Файл {self.snapshot_filename} изменён другой программой")
+        self.snapshot_state = (stat.st_mtime_ns, stat.st_size, state[2])
+
+    def begin_compaction(self, races):
+        # Текущий журнал откладывается в сторону, новые правки идут в свежий файл.
+        # Возвращает копию каталога, которую compact() запишет в снимок (обычно в
+        # фоновом потоке), или None, если сжатие уже идёт.
+        if self.compacting:
+            return None
+        with self.lock:
+            self._sync_locked()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if (os.path.exists(self.compacting_filename)
+                    and self._compacting_is_done(self._read(self.compacting_filename))):
+                os.remove(self.compacting_filename)
+            if os.path.exists(self.filename):
+                if os.path.exists(self.compacting_filename):
+                    # Предыдущее сжатие не завершилось - дописываем его записи в начало
+                    with open(self.compacting_filename, "a", encoding="utf-8") as dst, \
+                            open(self.filename, "r", encoding="utf-8") as src:
+                        shutil.copyfileobj(src, dst)
+                    os.remove(self.filename)
+                else:
+                    os.replace(self.filename, self.compacting_filename)
+            self.records = 0
+            self.compacting = True
+        return races.copy()
+
+    def compact(self, races):
+        # Правки из отложенного журнала остаются в нём, если races.json изменён извне:
+        # после перечитывания файла они применяются к новому снимку
+        temp_filename = self.snapshot_filename + ".tmp"
+        lazy = races.filename is not None
+        try:
+            self.check_snapshot()
+            with open(temp_filename, "wb") as f:
+                offsets = races.dump(f)
+                f.flush()
+                os.fsync(f.fileno())
+            digest = file_sha256(temp_filename)
+            # Повторная проверка по времени изменения и размеру: файл мог смениться во время записи
+            try:
+                self.check_snapshot(full=False)
+            except SnapshotChangedError:
+                os.remove(temp_filename)
+                raise
+            if os.path.exists(self.compacting_filename):
+                with open(self.compacting_filename, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({'op': 'compacted', 'sha256': digest}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            # При ленивой загрузке файл читается по смещениям - заменяем его
+            # и обновляем смещения атомарно относительно чтения
+            with races.lock:
+                os.replace(temp_filename, self.snapshot_filename)
+                races.relocate(offsets)
+            if os.path.exists(self.compacting_filename):
+                os.remove(self.compacting_filename)
+            stat = os.stat(self.snapshot_filename)
+            self.snapshot_state = (stat.st_mtime_ns, stat.st_size, digest)
+            if lazy:
+                write_snapshot_cache(self.snapshot_filename, races.offsets_cache(offsets), digest, stat,
+                                     OFFSETS_SUFFIX)
+            else:
+                write_snapshot_cache(self.snapshot_filename, races.snapshot_cache(), digest, stat)
+            # Состояние нового снимка: по нему отличается собственная запись от внешней правки
+            return stat
+        finally:
+            self.compacting = False
+
+    def close(self):
+        with self.lock:
+            self._sync_locked()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def write_race_ids(races, journal):
+    # Расам без Ид (файл старого формата) номера выдаются по положению в списке.
+    # Журнал ссылается на расы по Ид, поэтому, пока номера не записаны в файл, вставка
+    # или перестановка рас другой программой сдвинула бы их, и правки из журнала легли
+    # бы не на те расы. Сразу после загрузки номера записываются в races.json сжатием
+    # журнала. Возвращает stat нового файла или None, если записывать нечего.
+    if not races.assigned_ids:
+        return None
+    stat = journal.compact(journal.begin_compaction(races))
+    races.source = journal.snapshot_state
+    races.assigned_ids = False
+    return stat
+
+
+# Фоновый ввод-вывод: файлы читаются и пишутся в отдельном потоке,
+# а результаты забирает поток, которому они нужны (в GUI - поток Tk)
+class IoWorker:
+    # Один поток для файловых операций. Задачи выполняются по очереди; задача,
+    # поставленная повторно до своего начала, не дублируется - выполнится один раз
+    # с последними аргументами. Результаты складываются в потокобезопасную очередь,
+    # которую поток Tk разбирает методом poll().
+    def __init__(self):
+        self.tasks = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.results = queue.SimpleQueue()
+        self.running = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, function, *args, callback=None):
+        with self.condition:
+            merged = kind in self.tasks
+            self.tasks[kind] = (function, args, callback)
+            self.condition.notify_all()
+        return not merged
+
+    def is_busy(self, kind=None):
+        with self.condition:
+            if kind is None:
+                return bool(self.tasks) or self.running is not None
+            return kind in self.tasks or self.running == kind
+
+    def wait_idle(self):
+        with self.condition:
+            while self.tasks or self.running is not None:
+                self.condition.wait()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.tasks:
+                    self.condition.wait()
+                kind, (function, args, callback) = self.tasks.popitem(last=False)
+                self.running = kind
+            # Ошибка передаётся в поток Tk вместе с результатом: там её покажут
+            # пользователю или поднимут заново
+            try:
+                result, error = function(*args), None
+            except Exception as e:
+                result, error = None, e
+            self.results.put((kind, callback, result, error))
+            with self.condition:
+                self.running = None
+                self.condition.notify_all()
+
+    def poll(self):
+        done = []
+        while True:
+            try:
+                done.append(self.results.get_nowait())
+            except queue.Empty:
+                return done
+
+
+def read_races(filename, journal=None):
+    # Загрузка без обращения к Tk, чтобы её можно было выполнить в фоновом потоке.
+    # Возвращает каталог и список сообщений (вид, текст) для показа пользователю.
+    messages = []
+    if journal is None:
+        import sqlite3
+        # У каталога своё соединение с базой: записи заглушек читаются по нему и из потока окна
+        try:
+            return RaceCatalog.open_sqlite(filename), messages
+        except sqlite3.Error as e:
+            return RaceCatalog(), [('error', f"Ошибка чтения базы данных: {e}")]
+    try:
+        if os.path.getsize(filename) >= LAZY_LOAD_THRESHOLD:
+            # Большой файл: держим в памяти только имена и смещения записей
+            races = RaceCatalog.open_lazy(filename)
+        else:
+            cached = read_snapshot_cache(filename)
+            races = None
+            if cached is not None:
+                state, cached = cached
+                races = RaceCatalog.from_snapshot_cache(cached)
+                races.source = state
+        if races is None:
+            # Кэша нет или он устарел: разбираем JSON и создаём кэш заново
+            with open(filename, "rb") as f:
+                data = f.read()
+                stat = os.fstat(f.fileno())
+            # Расам без Ид номера выдаются детерминированно, поэтому кэш и журнал с ними согласованы
+            races = RaceCatalog.from_document(json.loads(data))
+            races.source = (stat.st_mtime_ns, stat.st_size, hashlib.sha256(data).hexdigest())
+            write_snapshot_cache(filename, races.snapshot_cache(), races.source[2], stat)
+    except FileNotFoundError:
+        if not os.path.exists(journal.filename):
+            messages.append(('warning', "Файл не найден. Будет создан новый при сохранении."))
+        races = RaceCatalog()
+    except (ValueError, LookupError, TypeError, AttributeError):
+        # Не JSON (ValueError) либо JSON другой структуры: не список рас, ссылка на
+        # отсутствующий навык и т. п.
+        return RaceCatalog(), [('error', "Ошибка чтения данных из файла. Начинаем с пустого списка.")]
+    # Применяем правки, сделанные после последнего сохранения
+    journal.snapshot_state = races.source
+    try:
+        journal.replay(races)
+    except (OSError, LookupError) as e:
+        messages.append(('error', f"Ошибка чтения журнала изменений: {e}"))
+    return races, messages
+
+
+# Потоковый импорт и экспорт NDJSON (одна раса на строку) и CSV (навыки - JSON
+# в своей колонке). Записи читаются кусками, проверяются в пуле процессов теми же
+# правилами, что и формы, и добавляются в хранилище пакетами.
+RECORD_FORMATS = ('ndjson', 'csv')
+IMPORT_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+CSV_COLUMNS = ('Ид', 'Имя', 'Скорость', 'Размер', 'Темное зрение', 'Навыки')
+# Прочие ключи расы в CSV записываются одним объектом JSON
+CSV_EXTRA_COLUMN = 'Прочее'
+
+
+def record_format(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'ndjson'
+
+
+def iter_record_lines(f, format):
+    # (номер строки, сырая запись): строка NDJSON или строка CSV в виде dict
+    if format == 'csv':
+        import csv
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            yield number, line
+
+
+def parse_csv_record(row):
+    record = {}
+    for key, value in row.items():
+        if key is None:
+            raise ValueError("Лишние значения в строке CSV.")
+        if value is None or (value == "" and key in ('Ид', 'Навыки', CSV_EXTRA_COLUMN)):
+            continue
+        if key == 'Ид':
+            if not value.isdigit():
+                raise ValueError("Ид должен быть числом.")
+            record['Ид'] = int(value)
+        elif key in ('Навыки', CSV_EXTRA_COLUMN):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Колонка '{key}': ошибка JSON: {e}") from None
+            if key == 'Навыки':
+                record['Навыки'] = value
+            elif isinstance(value, dict):
+                record.update(value)
+            else:
+                raise ValueError(f"Колонка '{key}' должна содержать объект JSON.")
+        else:
+            record[key] = value
+    return record
+
+
+def _validate_record_chunk(task):
+    # Выполняется в процессе пула: разбор, проверка и хеши навыков для библиотеки
+    format, items = task
+    results = []
+    for number, raw in items:
+        try:
+            record = parse_csv_record(raw) if format == 'csv' else json.loads(raw)
+        except json.JSONDecodeError as e:
+            results.append((number, None, None, f"Ошибка JSON: {e}"))
+            continue
+        except ValueError as e:
+            results.append((number, None, None, str(e)))
+            continue
+        error = validate_race(record)
+        if error:
+            results.append((number, None, None, error))
+        else:
+            results.append((number, record, [skill_digest(skill) for skill in record.get('Навыки') or ()], None))
+    return results
+
+
+def process_pool(processes, initializer=None, initargs=()):
+    # Пулы создаются из фонового потока окна, когда загружен Tk, а fork такого процесса
+    # небезопасен, поэтому процессы всегда запускаются заново (spawn). multiprocessing
+    # импортируется здесь: он заметно замедляет import core, а нужен лишь массовым операциям.
+    import multiprocessing
+    return multiprocessing.get_context('spawn').Pool(processes, initializer, initargs)
+
+
+def validate_records(f, format, processes=None, chunk_size=IMPORT_CHUNK_SIZE):
+    # Выдаёт (номер строки, запись, хеши её навыков, ошибка) в порядке файла;
+    # у ошибочной записи запись и хеши - None.
+    # В пуле одновременно не больше двух кусков на процесс, поэтому файл
+    # любого размера читается по мере обработки, а не целиком.
+    items = iter_record_lines(f, format)
+    tasks = iter(lambda: (format, list(itertools.islice(items, chunk_size))), (format, []))
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for task in tasks:
+            yield from _validate_record_chunk(task)
+        return
+    with process_pool(processes) as pool:
+        limit = 2 * processes
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_validate_record_chunk, (task,)))
+            if len(pending) >= limit:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def merge_races(races, writer, records):
+    # Пакет пар (запись, хеши навыков): раса с существующим Ид заменяется, остальные добавляются
+    merged = [races.put(record, digests) for record, digests in records]
+    writer.put_races(merged)
+    return merged
+
+
+def import_races(races, writer, f, format, report=None, processes=None, batch_size=IMPORT_BATCH_SIZE):
+    # report - текстовый файл для отчёта об ошибках в NDJSON: {"Строка": n, "Ошибка": текст}.
+    # Возвращает (число импортированных, число ошибочных) записей.
+    imported = 0
+    failed = 0
+    batch = []
+    for number, record, digests, error in validate_records(f, format, processes):
+        if error is not None:
+            failed += 1
+            if report is not None:
+                report.write(json.dumps({'Строка': number, 'Ошибка': error}, ensure_ascii=False) + "\n")
+            continue
+        batch.append((record, digests))
+        if len(batch) >= batch_size:
+            imported += len(merge_races(races, writer, batch))
+            batch = []
+    if batch:
+        imported += len(merge_races(races, writer, batch))
+    return imported, failed
+
+
+def csv_record(race):
+    row = {}
+    extra = {}
+    for key, value in race.items():
+        if key == 'Навыки':
+            row[key] = json.dumps(value, ensure_ascii=False, default=json_default)
+        elif key in CSV_COLUMNS:
+            row[key] = value
+        else:
+            extra[key] = value
+    if extra:
+        row[CSV_EXTRA_COLUMN] = json.dumps(extra, ensure_ascii=False, default=json_default)
+    return row
+
+
+def export_races(races, f, format):
+    # Расы пишутся по одной по мере перебора races, весь вывод в памяти не собирается
+    count = 0
+    if format == 'csv':
+        import csv
+        writer = csv.DictWriter(f, CSV_COLUMNS + (CSV_EXTRA_COLUMN,))
+        writer.writeheader()
+        for race in races:
+            writer.writerow(csv_record(race))
+            count += 1
+        return count
+    for race in races:
+        f.write(json.dumps(race, ensure_ascii=False, default=json_default) + "\n")
+        count += 1
+    return count
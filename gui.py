@@ -0,0 +1,1655 @@
+import bisect
+import collections
+import cProfile
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox, simpledialog
+from tkinter import ttk
+
+from core import (FUZZY_LIMIT, IMPORT_BATCH_SIZE, JOURNAL_SYNC_MS, SORT_COLUMNS, IoWorker, Race, RaceCatalog,
+                  RaceJournal, RaceSearchIndex, RaceSortIndex, SnapshotChangedError, SqliteRaceStorage, TrigramIndex,
+                  diff_races, export_races, format_race_details, generate_half_race, is_sqlite_file, merge_races,
+                  read_races, record_format, spans, split_text_chunks, validate_option, validate_race, validate_records,
+                  validate_skill, write_race_ids)
+
+# Задержка перед обновлением списка после ввода в поиске (мс)
+SEARCH_DEBOUNCE_MS = 150
+
+# Результаты фонового ввода-вывода забираются в потоке Tk через after()
+IO_POLL_MS = 50
+# Сколько проверенных пакетов импорта может ждать добавления в каталог
+IMPORT_PENDING_BATCHES = 4
+AUTOSAVE_INTERVAL_MS = 5 * 60 * 1000
+
+# Карточка расы выводится кусками: следующий дописывается, когда видимая область
+# подходит к концу уже выведенного текста
+DETAILS_CHUNK_CHARS = 16 * 1024
+DETAILS_PRELOAD = 0.8
+DETAILS_CACHE_SIZE = 256
+
+# С этого размера каталога список рас становится виртуальным: строки Treeview
+# создаются только для видимого окна и небольшого запаса
+VIRTUAL_LIST_THRESHOLD = 10000
+VIRTUAL_LIST_BUFFER = 5
+VIRTUAL_LIST_ROW_HEIGHT = 20
+VIRTUAL_LIST_WHEEL_ROWS = 3
+# Столбцы списка рас и их ширина (пикселей); по щелчку на заголовке список сортируется
+RACE_LIST_COLUMNS = SORT_COLUMNS
+RACE_LIST_WIDTHS = {'Имя': 180, 'Размер': 140}
+RACE_LIST_DEFAULT_WIDTH = 80
+
+# Сколько имён показывает выпадающий список выбора расы без введённого текста
+RACE_PICKER_PAGE = 50
+
+# Период опроса races.json на внешние правки (мс)
+WATCH_INTERVAL_MS = 1000
+
+# Отладка: период проверки задержки цикла событий, обновление окна замеров (мс)
+# и длительность профилирования по запросу (с)
+LAG_MONITOR_MS = 100
+DEBUG_REFRESH_MS = 1000
+PROFILE_SECONDS = 10
+
+
+def file_state(filename):
+    # Время изменения и размер: по ним опрос замечает правку файла
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def build_race_indexes(races):
+    # Выполняется в фоновом потоке: индексы поиска и ключи сортировки по каталогу.
+    # Ключ расы в индексах - её Ид. В ленивом режиме записи файла не разбираются:
+    # индексы строятся по полям и навыкам, сохранённым в заглушках.
+    search_index = RaceSearchIndex()
+    fuzzy_index = TrigramIndex()
+    for race_id in races:
+        race = races.summary(race_id)
+        search_index.add(race_id, race)
+        fuzzy_index.add(race_id, race)
+    sort_index = RaceSortIndex(races)
+    sort_index.build(SORT_COLUMNS)
+    return search_index, fuzzy_index, sort_index
+
+
+def load_races_task(filename, journal):
+    # Выполняется в фоновом потоке: вместе с каталогом строятся и его индексы.
+    # Состояние файла берётся до чтения: правка во время чтения будет замечена опросом.
+    state = file_state(filename)
+    races, messages = read_races(filename, journal)
+    if not any(kind == 'error' for kind, text in messages):
+        try:
+            stat = write_race_ids(races, journal)
+        except OSError as e:
+            messages.append(('warning', f"Не удалось записать Ид рас в файл: {e}"))
+        else:
+            if stat is not None:
+                # Файл переписан самим окном - это не внешняя правка
+                state = (stat.st_mtime_ns, stat.st_size)
+    return races, messages, build_race_indexes(races), state
+
+
+def reload_races_task(filename, old):
+    # Выполняется в фоновом потоке после внешней правки файла: новый каталог
+    # (с правками из журнала поверх) и его разница со старым. Журнал читается
+    # отдельным объектом, открытый журнал окна не затрагивается.
+    # Файл, который не удалось прочитать, даёт (None, состояние, None): его правка
+    # запоминается, и повторное чтение будет только после следующей.
+    state = file_state(filename)
+    try:
+        races, messages = read_races(filename, RaceJournal(filename))
+        if state is None or any(kind == 'error' for kind, text in messages):
+            return None, state, None
+        return races, state, diff_races(old, races)
+    except (ValueError, LookupError, TypeError, AttributeError):
+        # Запись ленивой заглушки, разобранная при сравнении, оказалась неверной
+        return None, state, None
+
+
+class RaceListView:
+    # Общая часть обоих видов списка: Treeview со столбцами и сортировкой по заголовкам
+    def __init__(self, parent, columns, values, on_heading):
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', selectmode='browse')
+        self.columns = columns
+        for column in columns:
+            self.tree.heading(column, text=column, command=lambda column=column: on_heading(column))
+            self.tree.column(column, width=RACE_LIST_WIDTHS.get(column, RACE_LIST_DEFAULT_WIDTH))
+        self.values = values
+
+    def set_sort_indicator(self, sort_column, reverse):
+        for column in self.columns:
+            mark = (" ▼" if reverse else " ▲") if column == sort_column else ""
+            self.tree.heading(column, text=column + mark)
+
+
+def reorder_moves(kept, ids):
+    # Как переставить строки kept (сейчас показаны в этом порядке) и добавить новые,
+    # чтобы получился порядок ids: список (Ид, индекс) для move/insert по очереди.
+    # Наибольшая возрастающая подпоследовательность оставшихся строк стоит на месте,
+    # остальные строки и новые двигаются по одному разу - это минимум перестановок.
+    old_index = {race_id: index for index, race_id in enumerate(kept)}
+    positions = [old_index[race_id] for race_id in ids if race_id in old_index]
+    # Терпеливая сортировка: tails[k] - наименьший конец возрастающей цепочки длины k + 1
+    tails = []
+    tail_ids = []
+    previous = {}
+    for position in positions:
+        k = bisect.bisect_left(tails, position)
+        previous[position] = tail_ids[k - 1] if k else None
+        if k == len(tails):
+            tails.append(position)
+            tail_ids.append(position)
+        else:
+            tails[k] = position
+            tail_ids[k] = position
+    stable = set()
+    position = tail_ids[-1] if tail_ids else None
+    while position is not None:
+        stable.add(kept[position])
+        position = previous[position]
+    # Индекс move считается среди текущих детей без самой строки: перед местом
+    # строки стоят все уже расставленные строки из ids и ещё не сдвинутые строки,
+    # показанные раньше ближайшей следующей неподвижной строки. Последние
+    # считаются деревом Фенвика по старым позициям.
+    counts = [0] * (len(kept) + 1)
+
+    def add(index, delta):
+        index += 1
+        while index <= len(kept):
+            counts[index] += delta
+            index += index & -index
+
+    def count_before(index):
+        total = 0
+        while index > 0:
+            total += counts[index]
+            index -= index & -index
+        return total
+
+    for race_id in kept:
+        if race_id not in stable:
+            add(old_index[race_id], 1)
+    anchors = [None] * len(ids)
+    anchor = None
+    for position in range(len(ids) - 1, -1, -1):
+        anchors[position] = anchor
+        if ids[position] in stable:
+            anchor = old_index[ids[position]]
+    moves = []
+    for position, race_id in enumerate(ids):
+        if race_id in stable:
+            continue
+        if race_id in old_index:
+            add(old_index[race_id], -1)
+        anchor = anchors[position]
+        moves.append((race_id, 'end' if anchor is None else position + count_before(anchor)))
+    return moves
+
+
+class TreeRaceList(RaceListView):
+    # Обычный список рас: по строке Treeview на каждую показанную расу, iid строки - Ид.
+    # Строки создаются один раз, а при смене результата только отсоединяются и
+    # переставляются.
+    def __init__(self, parent, columns, values, on_heading):
+        super().__init__(parent, columns, values, on_heading)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.created = set()
+        self.ids = []
+        self.last_tk_calls = 0
+
+    def bind_select(self, callback):
+        self.tree.bind('<<TreeviewSelect>>', callback)
+
+    def reset(self):
+        self.tree.delete(*self.tree.get_children())
+        self.created = set()
+        self.ids = []
+
+    def show(self, ids):
+        # Одно detach на все удалённые строки и по одному move/insert на строку из
+        # reorder_moves - меньше вызовов Tk перестановка не обходится
+        tk_calls = 0
+        new_set = set(ids)
+        removed = [race_id for race_id in self.ids if race_id not in new_set]
+        if removed:
+            self.tree.detach(*removed)
+            tk_calls += 1
+        for race_id, index in reorder_moves([race_id for race_id in self.ids if race_id in new_set], ids):
+            if race_id in self.created:
+                self.tree.move(race_id, '', index)
+            else:
+                self.tree.insert('', index, iid=race_id, values=self.values(race_id))
+                self.created.add(race_id)
+            tk_calls += 1
+        self.ids = ids
+        self.last_tk_calls = tk_calls
+
+    def append(self, race_id):
+        self.tree.insert('', 'end', iid=race_id, values=self.values(race_id))
+        self.created.add(race_id)
+        self.ids.append(race_id)
+
+    def remove(self, race_id):
+        if race_id in self.created:
+            self.tree.delete(race_id)
+            self.created.discard(race_id)
+        if race_id in self.ids:
+            self.ids.remove(race_id)
+
+    def refresh(self, race_id):
+        if race_id in self.created:
+            self.tree.item(race_id, values=self.values(race_id))
+
+    def selected(self):
+        selected_item = self.tree.focus()
+        return int(selected_item) if selected_item else None
+
+
+class VirtualRaceList(RaceListView):
+    # Виртуальный список для больших каталогов: строк Treeview столько, сколько
+    # помещается в окне, плюс небольшой запас. Прокрутка не создаёт строк, а меняет
+    # их текст; положение ползунка отображается на индекс в массиве результатов.
+    # Выделение и клавиши навигации работают по этому массиву, а не по строкам.
+    def __init__(self, parent, columns, values, on_heading):
+        super().__init__(parent, columns, values, on_heading)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.ids = []
+        self.top = 0
+        self.visible = 1
+        # Ид расы в каждой строке Treeview; None - строка отсоединена
+        self.slots = []
+        self.selected_id = None
+        self.callback = None
+
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<<TreeviewSelect>>', self.on_tree_select)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequence, self.on_wheel)
+        self.tree.bind('<Up>', lambda event: self.move_selection(-1))
+        self.tree.bind('<Down>', lambda event: self.move_selection(1))
+        self.tree.bind('<Prior>', lambda event: self.move_selection(-self.visible))
+        self.tree.bind('<Next>', lambda event: self.move_selection(self.visible))
+        self.tree.bind('<Home>', lambda event: self.move_selection(-len(self.ids)))
+        self.tree.bind('<End>', lambda event: self.move_selection(len(self.ids)))
+
+    def bind_select(self, callback):
+        self.callback = callback
+
+    def reset(self):
+        self.ids = []
+        self.top = 0
+        self.selected_id = None
+        self.render()
+
+    def show(self, ids):
+        self.ids = ids
+        self.scroll_to(self.top, force=True)
+
+    def append(self, race_id):
+        self.ids.append(race_id)
+        self.render()
+
+    def remove(self, race_id):
+        if race_id in self.ids:
+            self.ids.remove(race_id)
+        if self.selected_id == race_id:
+            self.selected_id = None
+        self.scroll_to(self.top, force=True)
+
+    def refresh(self, race_id):
+        if race_id in self.slots:
+            self.tree.item(str(self.slots.index(race_id)), values=self.values(race_id))
+
+    def selected(self):
+        return self.selected_id
+
+    def on_resize(self, event):
+        row_height = VIRTUAL_LIST_ROW_HEIGHT
+        try:
+            row_height = int(ttk.Style(self.tree).lookup('Treeview', 'rowheight')) or row_height
+        except (ValueError, tk.TclError):
+            pass
+        # Одна строка уходит на заголовок
+        self.visible = max(1, event.height // row_height - 1)
+        while len(self.slots) < self.visible + VIRTUAL_LIST_BUFFER:
+            slot = len(self.slots)
+            self.tree.insert('', 'end', iid=str(slot))
+            self.tree.detach(str(slot))
+            self.slots.append(None)
+        self.scroll_to(self.top, force=True)
+
+    def scroll_to(self, top, force=False):
+        top = max(0, min(top, len(self.ids) - self.visible))
+        if top != self.top or force:
+            self.top = top
+            self.render()
+
+    def render(self):
+        for slot, shown_id in enumerate(self.slots):
+            index = self.top + slot
+            race_id = self.ids[index] if index < len(self.ids) else None
+            if race_id == shown_id:
+                continue
+            if race_id is None:
+                self.tree.detach(str(slot))
+            else:
+                if shown_id is None:
+                    # Отсоединёнными бывают только последние строки, поэтому
+                    # возвращаем строку ровно на её номер
+                    self.tree.move(str(slot), '', slot)
+                self.tree.item(str(slot), values=self.values(race_id))
+            self.slots[slot] = race_id
+        if self.selected_id in self.slots:
+            self.tree.selection_set(str(self.slots.index(self.selected_id)))
+        elif self.tree.selection():
+            self.tree.selection_set(())
+        if self.ids:
+            self.scrollbar.set(self.top / len(self.ids), min(1.0, (self.top + self.visible) / len(self.ids)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.ids)))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            self.scroll_to(self.top + (amount * self.visible if args[2] == 'pages' else amount))
+
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - VIRTUAL_LIST_WHEEL_ROWS)
+        else:
+            self.scroll_to(self.top + VIRTUAL_LIST_WHEEL_ROWS)
+        return 'break'
+
+    def on_tree_select(self, event):
+        # Срабатывает и на выделение, выставленное render(); тогда Ид не меняется
+        selection = self.tree.selection()
+        if not selection:
+            return
+        race_id = self.slots[int(selection[0])]
+        if race_id is None or race_id == self.selected_id:
+            return
+        self.selected_id = race_id
+        if self.callback:
+            self.callback(event)
+
+    def position(self):
+        if self.selected_id in self.slots:
+            return self.top + self.slots.index(self.selected_id)
+        try:
+            return self.ids.index(self.selected_id)
+        except ValueError:
+            return None
+
+    def move_selection(self, step):
+        if self.ids:
+            index = self.position()
+            index = self.top if index is None else min(max(index + step, 0), len(self.ids) - 1)
+            self.selected_id = self.ids[index]
+            if index < self.top:
+                self.scroll_to(index, force=True)
+            elif index >= self.top + self.visible:
+                self.scroll_to(index - self.visible + 1, force=True)
+            else:
+                self.render()
+            if self.callback:
+                self.callback(None)
+        return 'break'
+
+
+class RaceApp(tk.Tk):
+    def __init__(self, filename="races.json", autosave_ms=None, debug=False):
+        super().__init__()
+        self.title("Менеджер Рас")
+        self.geometry("900x600")
+        self.filename = filename
+        self.storage = SqliteRaceStorage(filename) if is_sqlite_file(filename) else None
+        self.journal = None if self.storage else RaceJournal(filename)
+        # Пока идёт фоновая загрузка, окно показывает пустой список
+        self.races = RaceCatalog()
+        self.search_index, self.fuzzy_index, self.sort_index = build_race_indexes(self.races)
+        self.io = IoWorker()
+        self.io_status = {}
+        self.loading = False
+        self.dirty = False
+        # Очередь пакетов идущего импорта, флаг его отмены и итог проверки файла
+        self.import_batches = self.import_cancelled = self.import_result = None
+        # Запрошенное во время записи сохранение: None или флаг "без сообщения"
+        self.save_requested = None
+        self.autosave_ms = autosave_ms or AUTOSAVE_INTERVAL_MS
+        self.autosave_var = tk.BooleanVar(value=autosave_ms is not None)
+        # Замеры времени операций, окно с ними и профилирование по запросу
+        spans.enabled = debug
+        self.instrument_var = tk.BooleanVar(value=debug)
+        self.debug_window = None
+        self._lag_after_id = None
+        self._load_span = None
+        self._save_span = None
+        self._profiler = None
+        # Опрос races.json: состояние файла после последнего чтения или своей записи
+        # и счётчик правок в окне, по которому устаревший результат перечитывания отбрасывается
+        self.file_state = None
+        self.reloading = False
+        self.edit_count = 0
+
+        # Устанавливаем тему
+        self.style = ttk.Style(self)
+        self.style.theme_use('clam')  # Вы можете выбрать 'default', 'clam', 'alt', 'classic'
+
+        self.configure_styles()
+        self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.load_races()
+        self.after(IO_POLL_MS, self.poll_io)
+        self.after(self.autosave_ms, self.autosave)
+        if self.journal:
+            self.after(JOURNAL_SYNC_MS, self.sync_journal)
+            self.after(WATCH_INTERVAL_MS, self.watch_file)
+        if debug:
+            self.monitor_lag()
+
+    def configure_styles(self):
+        self.style.configure('TButton', font=('Helvetica', 10))
+        self.style.configure('TLabel', font=('Helvetica', 10))
+        self.style.configure('Treeview', font=('Helvetica', 10))
+        self.style.configure('Treeview.Heading', font=('Helvetica', 11, 'bold'))
+        self.style.configure('TEntry', font=('Helvetica', 10))
+        self.style.configure('TNotebook', font=('Helvetica', 10))
+        self.style.configure('TNotebook.Tab', font=('Helvetica', 10))
+
+    def create_widgets(self):
+        self.create_menu()
+        self.create_status_bar()
+
+        main_frame = ttk.Frame(self)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.create_race_list(main_frame)
+        self.create_details_area(main_frame)
+
+    def create_menu(self):
+        menubar = tk.Menu(self)
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Загрузить", command=self.load_races)
+        file_menu.add_command(label="Сохранить", command=self.save_races)
+        if self.storage:
+            file_menu.add_command(label="Импорт из JSON...", command=self.import_json)
+            file_menu.add_command(label="Экспорт в JSON...", command=self.export_json)
+        file_menu.add_command(label="Импорт записей (NDJSON, CSV)...", command=self.import_records)
+        file_menu.add_command(label="Экспорт записей (NDJSON, CSV)...", command=self.export_records)
+        file_menu.add_checkbutton(label="Автосохранение", variable=self.autosave_var)
+        file_menu.add_separator()
+        file_menu.add_command(label="Выход", command=self.close)
+        menubar.add_cascade(label="Файл", menu=file_menu)
+        debug_menu = tk.Menu(menubar, tearoff=0)
+        debug_menu.add_checkbutton(label="Замеры времени", variable=self.instrument_var,
+                                   command=self.toggle_instrumentation)
+        debug_menu.add_command(label="Окно замеров...", command=self.show_debug_window)
+        debug_menu.add_command(label=f"Профилировать {PROFILE_SECONDS} с", command=self.start_profile)
+        menubar.add_cascade(label="Отладка", menu=debug_menu)
+        self.config(menu=menubar)
+
+    def toggle_instrumentation(self):
+        spans.enabled = self.instrument_var.get()
+        if spans.enabled and self._lag_after_id is None:
+            self.monitor_lag()
+
+    def monitor_lag(self, expected=None):
+        # Насколько позже назначенного сработал after() - столько цикл событий был
+        # занят и окно не отвечало. После выключения замеров проверка останавливается.
+        now = time.perf_counter()
+        if expected is not None:
+            spans.record('event_loop_lag', max(0.0, now - expected))
+        if spans.enabled:
+            self._lag_after_id = self.after(LAG_MONITOR_MS, self.monitor_lag, now + LAG_MONITOR_MS / 1000)
+        else:
+            self._lag_after_id = None
+
+    def show_debug_window(self):
+        if self.debug_window is not None and self.debug_window.winfo_exists():
+            self.debug_window.lift()
+            return
+        window = tk.Toplevel(self)
+        window.title("Замеры")
+        window.geometry("520x300")
+        self.debug_window = window
+        columns = ('count', 'p50', 'p99', 'max')
+        tree = ttk.Treeview(window, columns=columns)
+        tree.heading('#0', text="Операция")
+        for column, text in zip(columns, ("Число", "p50, мс", "p99, мс", "Макс., мс")):
+            tree.heading(column, text=text)
+            tree.column(column, width=80, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True)
+        buttons = ttk.Frame(window)
+        buttons.pack(fill=tk.X, pady=5)
+        ttk.Checkbutton(buttons, text="Замеры времени", variable=self.instrument_var,
+                        command=self.toggle_instrumentation).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Сбросить", command=spans.reset).pack(side=tk.RIGHT, padx=5)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for name, (count, p50, p99, peak) in sorted(spans.stats().items()):
+                tree.insert('', tk.END, text=name, values=(count, f"{p50:.1f}", f"{p99:.1f}", f"{peak:.1f}"))
+            window.after(DEBUG_REFRESH_MS, refresh)
+
+        refresh()
+
+    def start_profile(self):
+        # Профилируется поток Tk - именно в нём выполняется всё, от чего окно "замирает"
+        if self._profiler is not None:
+            messagebox.showwarning("Предупреждение", "Профилирование уже идёт.")
+            return
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        self.set_busy('profile', f"Профилирование ({PROFILE_SECONDS} с)...")
+        self.after(PROFILE_SECONDS * 1000, self.finish_profile)
+
+    def finish_profile(self):
+        profiler, self._profiler = self._profiler, None
+        profiler.disable()
+        self.clear_busy('profile')
+        filename = os.path.join(os.path.dirname(os.path.abspath(self.filename)),
+                                time.strftime("profile-%Y%m%d-%H%M%S.prof"))
+        try:
+            profiler.dump_stats(filename)
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Ошибка записи профиля: {e}")
+            return
+        messagebox.showinfo("Профилирование", f"Профиль записан в {filename}.\n"
+                                              f"Просмотр: python -m pstats {filename}")
+
+    def create_status_bar(self):
+        # Строка состояния с индикатором фоновой загрузки или сохранения
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_label = ttk.Label(status_frame, text="")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=150)
+
+    def set_busy(self, kind, text):
+        if not self.io_status:
+            self.progress.pack(side=tk.RIGHT, padx=5, pady=2)
+            self.progress.start()
+        self.io_status[kind] = text
+        self.status_label.configure(text=text)
+
+    def clear_busy(self, kind):
+        self.io_status.pop(kind, None)
+        if self.io_status:
+            self.status_label.configure(text=next(reversed(self.io_status.values())))
+        else:
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.status_label.configure(text="")
+
+    def create_race_list(self, parent):
+        left_frame = ttk.Frame(parent)
+        left_frame.pack(side=tk.LEFT, fill=tk.Y)
+
+        # Добавляем поиск
+        search_frame = ttk.Frame(left_frame)
+        search_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(search_frame, text="Поиск:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.search_var.trace_add('write', self.on_search_changed)
+        self._search_after_id = None
+
+        # Список рас; его вид (обычный или виртуальный) выбирается по размеру каталога
+        self.race_list_frame = ttk.Frame(left_frame)
+        self.race_list_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5)
+        self.race_list = None
+        self.sort_column = None
+        self.sort_reverse = False
+
+        self.rebuild_race_list()
+
+        self.create_buttons(left_frame)
+
+    def on_search_changed(self, *args):
+        # Откладываем обновление, чтобы серия нажатий дала одно обновление списка
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.update_race_list)
+
+    def rebuild_race_list(self):
+        # Полная перестройка: нужна только после загрузки нового набора рас
+        # Лениво загруженный каталог (большой races.json или база SQLite) всегда показывается
+        # виртуальным списком: значения строк запрашиваются только для видимого окна
+        lazy = self.races.filename is not None or self.races.storage is not None
+        virtual = len(self.races) >= VIRTUAL_LIST_THRESHOLD or lazy
+        view_class = VirtualRaceList if virtual else TreeRaceList
+        if type(self.race_list) is view_class:
+            self.race_list.reset()
+        else:
+            if self.race_list is not None:
+                self.race_list.frame.destroy()
+            self.race_list = view_class(self.race_list_frame, RACE_LIST_COLUMNS, self.race_list_values,
+                                        self.on_sort_column)
+            self.race_list.frame.pack(fill=tk.BOTH, expand=True)
+            self.race_list.bind_select(self.on_race_select)
+        self.race_list.set_sort_indicator(self.sort_column, self.sort_reverse)
+        self._shown_set = set()
+        self._shown_query = None
+        self.update_race_list()
+
+    def race_list_values(self, race_id):
+        # Строка списка не разбирает запись из файла в ленивом режиме
+        race = self.races.summary(race_id)
+        return (race.get('Имя', ''), race.get('Скорость', ''), race.get('Размер', ''),
+                race.get('Темное зрение', ''), len(race.get('Навыки') or ()))
+
+    def on_sort_column(self, column):
+        # Повторный щелчок по тому же столбцу меняет направление сортировки
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self.race_list.set_sort_indicator(self.sort_column, self.sort_reverse)
+        self.update_race_list()
+
+    @spans.timed('update_race_list')
+    def update_race_list(self, *args):
+        # Результат поиска передаётся списку целиком; обычный список переставляет
+        # только изменившиеся строки, виртуальный перерисовывает видимое окно
+        self._search_after_id = None
+        search_text = self.search_var.get()
+        within = None
+        if self._shown_query is not None and self.search_index.is_refinement(self._shown_query, search_text):
+            # Новый запрос уточняет старый - достаточно сузить прежний результат
+            within = self._shown_set
+        new_ids = self.search_index.search(search_text, within)
+        if not new_ids and ':' not in search_text and search_text.strip():
+            # Точных совпадений нет - показываем похожие названия (опечатки)
+            new_ids = self.fuzzy_index.search_keys(search_text)
+        new_set = set(new_ids)
+        if self.sort_column is not None:
+            # Без запроса берётся готовая перестановка всего каталога
+            subset = new_set if search_text.strip() else None
+            new_ids = self.sort_index.sorted_ids(self.sort_column, subset, self.sort_reverse)
+
+        self.race_list.show(new_ids)
+        self._shown_set = new_set
+        self._shown_query = search_text
+
+    def selected_race_id(self):
+        return self.race_list.selected()
+
+    def on_race_select(self, event):
+        race_id = self.selected_race_id()
+        if race_id is not None:
+            self.show_race_details(self.races.get(race_id), race_id)
+
+    @spans.timed('show_race_details')
+    def show_race_details(self, race, race_id=None):
+        # Текст карточки кэшируется по Ид расы, в виджет сразу попадает только первый кусок
+        if race_id is not None and race_id == self._details_race_id:
+            return
+        chunks = self._details_cache.get(race_id) if race_id is not None else None
+        if chunks is None:
+            chunks = split_text_chunks(format_race_details(race), DETAILS_CHUNK_CHARS)
+            if race_id is not None:
+                self._details_cache[race_id] = chunks
+                if len(self._details_cache) > DETAILS_CACHE_SIZE:
+                    self._details_cache.popitem(last=False)
+        else:
+            self._details_cache.move_to_end(race_id)
+        self._details_race_id = race_id
+        self._details_chunks = chunks
+        self._details_next = 1
+        self.details_text.configure(state='normal')
+        self.details_text.delete(1.0, tk.END)
+        self.details_text.insert(tk.END, chunks[0])
+        if len(chunks) > 1:
+            # Невыведенный остаток обозначен строкой с тегом; новые куски вставляются
+            # по метке перед ней
+            self.details_text.insert(tk.END, "…", 'details_pending')
+            self.details_text.mark_set('details_more', 'details_pending.first')
+        self.details_text.configure(state='disabled')
+        self.details_text.yview_moveto(0)
+
+    def on_details_scroll(self, first, last):
+        self.details_scrollbar.set(first, last)
+        if self._details_next < len(self._details_chunks) and float(last) >= DETAILS_PRELOAD:
+            if self._details_after_id is None:
+                self._details_after_id = self.after_idle(self.render_more_details)
+
+    def render_more_details(self):
+        self._details_after_id = None
+        if self._details_next >= len(self._details_chunks):
+            return
+        self.details_text.configure(state='normal')
+        self.details_text.insert('details_more', self._details_chunks[self._details_next])
+        self._details_next += 1
+        if self._details_next == len(self._details_chunks):
+            self.details_text.delete('details_pending.first', 'details_pending.last')
+        self.details_text.configure(state='disabled')
+
+    def clear_race_details(self):
+        self._details_race_id = None
+        self._details_chunks = ()
+        self._details_next = 0
+        self.details_text.configure(state='normal')
+        self.details_text.delete(1.0, tk.END)
+        self.details_text.configure(state='disabled')
+
+    def invalidate_race_details(self, race_id):
+        # Вызывается при каждой правке или удалении расы
+        self._details_cache.pop(race_id, None)
+        if self._details_race_id == race_id:
+            self._details_race_id = None
+
+    def create_buttons(self, parent):
+        button_frame = ttk.Frame(parent)
+        button_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
+
+        add_button = ttk.Button(button_frame, text="Добавить расу", command=self.add_race)
+        add_button.pack(side=tk.LEFT, padx=5)
+
+        edit_button = ttk.Button(button_frame, text="Редактировать расу", command=self.edit_race)
+        edit_button.pack(side=tk.LEFT, padx=5)
+
+        delete_button = ttk.Button(button_frame, text="Удалить расу", command=self.delete_race)
+        delete_button.pack(side=tk.LEFT, padx=5)
+
+        half_race_button = ttk.Button(button_frame, text="Отобразить полурасу", command=self.display_half_race)
+        half_race_button.pack(side=tk.LEFT, padx=5)
+
+        # На время загрузки правки запрещены: загруженный каталог заменит текущий
+        self.action_buttons = (add_button, edit_button, delete_button, half_race_button)
+
+    def create_details_area(self, parent):
+        right_frame = ttk.Frame(parent)
+        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+
+        notebook = ttk.Notebook(right_frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+
+        # Вкладка с деталями расы
+        details_frame = ttk.Frame(notebook)
+        notebook.add(details_frame, text='Детали')
+
+        self.details_scrollbar = ttk.Scrollbar(details_frame, orient=tk.VERTICAL)
+        self.details_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+        self.details_text = tk.Text(details_frame, wrap=tk.WORD, state='disabled',
+                                    yscrollcommand=self.on_details_scroll)
+        self.details_text.pack(fill=tk.BOTH, expand=True, padx=(10, 0), pady=10)
+        self.details_text.tag_configure('details_pending', foreground='gray')
+        self.details_scrollbar.configure(command=self.details_text.yview)
+        self._details_cache = collections.OrderedDict()
+        self._details_after_id = None
+        self._details_race_id = None
+        self._details_chunks = ()
+        self._details_next = 0
+
+    def edit_race(self):
+        race_id = self.selected_race_id()
+        if race_id is not None:
+            self.add_race(race_id)
+        else:
+            messagebox.showwarning("Предупреждение", "Сначала выберите расу для редактирования.")
+
+    def add_race(self, race_id=None):
+        # Создаем новое окно для добавления расы (или редактирования существующей)
+        original = self.races.get(race_id) if race_id is not None else None
+        add_race_window = tk.Toplevel(self)
+        add_race_window.title("Добавить расу" if original is None else "Редактировать расу")
+        add_race_window.geometry("400x500")
+
+        # Поля для ввода основных характеристик
+        ttk.Label(add_race_window, text="Имя расы:").pack(pady=5)
+        name_entry = ttk.Entry(add_race_window)
+        name_entry.pack(pady=5)
+
+        ttk.Label(add_race_window, text="Скорость:").pack(pady=5)
+        speed_entry = ttk.Entry(add_race_window)
+        speed_entry.pack(pady=5)
+
+        ttk.Label(add_race_window, text="Размер:").pack(pady=5)
+        size_entry = ttk.Entry(add_race_window)
+        size_entry.pack(pady=5)
+
+        ttk.Label(add_race_window, text="Темное зрение:").pack(pady=5)
+        dark_vision_entry = ttk.Entry(add_race_window)
+        dark_vision_entry.pack(pady=5)
+
+        # Секция для навыков
+        ttk.Label(add_race_window, text="Навыки:").pack(pady=5)
+        skills_frame = ttk.Frame(add_race_window)
+        skills_frame.pack(pady=5, fill=tk.BOTH, expand=True)
+
+        skills_listbox = tk.Listbox(skills_frame)
+        skills_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        skills_scrollbar = ttk.Scrollbar(skills_frame, orient="vertical", command=skills_listbox.yview)
+        skills_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        skills_listbox.config(yscrollcommand=skills_scrollbar.set)
+
+        # Кнопки управления навыками
+        skill_buttons_frame = ttk.Frame(add_race_window)
+        skill_buttons_frame.pack(pady=5)
+
+        def add_skill():
+            skill_data = self.get_skill_data_dialog()
+            if skill_data:
+                skills_listbox.insert(tk.END, skill_data['Название'])
+                skills_listbox.skills.append(skill_data)
+
+        # Навыки, изменённые "во всех расах": id нового навыка -> прежний общий навык
+        shared_edits = {}
+
+        def edit_skill():
+            selected_index = skills_listbox.curselection()
+            if selected_index:
+                index = selected_index[0]
+                skill_data = skills_listbox.skills[index]
+                updated_skill = self.get_skill_data_dialog(skill_data)
+                if updated_skill:
+                    shared_skill = shared_edits.pop(id(skill_data), None)
+                    if shared_skill is None:
+                        # Общий навык по умолчанию копируется (меняется только в этой расе)
+                        users = [other for other in self.races.skill_users(skill_data) if other != race_id]
+                        if users:
+                            answer = messagebox.askyesnocancel(
+                                "Общий навык",
+                                f"Навык '{skill_data.get('Название', '')}' есть ещё у рас: {len(users)}. "
+                                f"Изменить его во всех расах?\n\nДа - во всех, Нет - только в этой расе.")
+                            if answer is None:
+                                return
+                            if answer:
+                                shared_skill = skill_data
+                    if shared_skill is not None:
+                        shared_edits[id(updated_skill)] = shared_skill
+                    skills_listbox.delete(index)
+                    skills_listbox.insert(index, updated_skill['Название'])
+                    skills_listbox.skills[index] = updated_skill
+
+        def delete_skill():
+            selected_index = skills_listbox.curselection()
+            if selected_index:
+                index = selected_index[0]
+                del skills_listbox.skills[index]
+                skills_listbox.delete(index)
+
+        skills_listbox.skills = []
+
+        if original:
+            name_entry.insert(0, original.get('Имя', ''))
+            speed_entry.insert(0, original.get('Скорость', ''))
+            size_entry.insert(0, original.get('Размер', ''))
+            dark_vision_entry.insert(0, original.get('Темное зрение', ''))
+            skills_listbox.skills = list(original.get('Навыки', []))
+            for skill in skills_listbox.skills:
+                skills_listbox.insert(tk.END, skill.get('Название', ''))
+
+        add_skill_button = ttk.Button(skill_buttons_frame, text="Добавить навык", command=add_skill)
+        add_skill_button.pack(side=tk.LEFT, padx=5)
+
+        edit_skill_button = ttk.Button(skill_buttons_frame, text="Редактировать навык", command=edit_skill)
+        edit_skill_button.pack(side=tk.LEFT, padx=5)
+
+        delete_skill_button = ttk.Button(skill_buttons_frame, text="Удалить навык", command=delete_skill)
+        delete_skill_button.pack(side=tk.LEFT, padx=5)
+
+        def save_race():
+            name = name_entry.get().strip()
+            speed = speed_entry.get().strip()
+            size = size_entry.get().strip()
+            dark_vision = dark_vision_entry.get().strip()
+
+            error = validate_race({"Имя": name, "Скорость": speed})
+            if error:
+                messagebox.showerror("Ошибка", error)
+                return
+            if any(other != race_id for other in self.races.find(name)):
+                if not messagebox.askyesno("Повтор имени", f"Раса с именем '{name}' уже есть. Сохранить ещё одну?"):
+                    return
+            if self.loading:
+                messagebox.showwarning("Предупреждение", "Дождитесь окончания загрузки.")
+                return
+
+            # Сохраняем прочие ключи исходной записи при редактировании
+            race = dict(original) if original else {}
+            race.update({
+                "Имя": name,
+                "Скорость": speed,
+                "Размер": size,
+                "Темное зрение": dark_vision,
+                "Навыки": skills_listbox.skills
+            })
+            race = Race.from_dict(race)
+
+            if original is None:
+                race = self.insert_race(race)
+                message = "Раса добавлена."
+            else:
+                race = self.replace_race(race)
+                message = "Раса изменена."
+            changed = 0
+            for skill in skills_listbox.skills:
+                if id(skill) in shared_edits:
+                    changed += self.replace_skill_everywhere(shared_edits[id(skill)], skill, race['Ид'])
+            if original is not None:
+                self.show_race_details(race, race['Ид'])
+            if changed:
+                message += f" Навык изменён также в других расах: {changed}."
+            messagebox.showinfo("Успех", message)
+            add_race_window.destroy()
+
+        save_button = ttk.Button(add_race_window, text="Сохранить расу", command=save_race)
+        save_button.pack(pady=10)
+
+    def insert_race(self, race):
+        race = self.races.add(race)
+        race_id = race['Ид']
+        self.write_through('put_race', race)
+        self.search_index.add(race_id, race)
+        self.fuzzy_index.add(race_id, race)
+        self.sort_index.add(race_id, race)
+        if self.search_var.get().strip() or self.sort_column is not None:
+            self._shown_query = None
+            self.update_race_list()
+        else:
+            # Без запроса и сортировки новая раса просто встаёт в конец списка
+            self.race_list.append(race_id)
+            self._shown_set.add(race_id)
+        return race
+
+    def replace_race(self, race, update_list=True):
+        race = self.races.replace(race)
+        race_id = race['Ид']
+        self.write_through('put_race', race)
+        self.invalidate_race_details(race_id)
+        self.search_index.update(race_id, race)
+        self.fuzzy_index.update(race_id, race)
+        self.sort_index.update(race_id, race)
+        # Строка в списке остаётся на месте, меняется только её текст
+        self.race_list.refresh(race_id)
+        if update_list and (self.search_var.get().strip() or self.sort_column is not None):
+            self._shown_query = None
+            self.update_race_list()
+        return race
+
+    def replace_skill_everywhere(self, old, new, skip_id=None):
+        # Правка общего навыка: каждая раса с ним записывается со ссылкой на новый навык.
+        # Возвращает число изменённых рас.
+        race_ids = [race_id for race_id in self.races.skill_users(old) if race_id != skip_id]
+        for race_id in race_ids:
+            self.replace_race(self.races.library.replace_skill(self.races.get(race_id), old, new),
+                              update_list=False)
+        if race_ids and (self.search_var.get().strip() or self.sort_column is not None):
+            self._shown_query = None
+            self.update_race_list()
+        return len(race_ids)
+
+    def remove_race(self, race_id):
+        self.races.remove(race_id)
+        self.write_through('delete_race', race_id)
+        self.invalidate_race_details(race_id)
+        self.search_index.remove(race_id)
+        self.fuzzy_index.remove(race_id)
+        self.sort_index.remove(race_id)
+        self.race_list.remove(race_id)
+        self._shown_set.discard(race_id)
+
+    def get_skill_data_dialog(self, skill=None):
+        skill_window = tk.Toplevel(self)
+        skill_window.title("Добавить навык" if skill is None else "Редактировать навык")
+        skill_window.geometry("400x400")
+
+        ttk.Label(skill_window, text="Название навыка:").pack(pady=5)
+        name_entry = ttk.Entry(skill_window)
+        name_entry.pack(pady=5)
+
+        ttk.Label(skill_window, text="Описание:").pack(pady=5)
+        description_text = tk.Text(skill_window, height=5)
+        description_text.pack(pady=5)
+
+        is_important_var = tk.BooleanVar()
+        is_important_check = ttk.Checkbutton(skill_window, text="Важный навык", variable=is_important_var)
+        is_important_check.pack(pady=5)
+
+        # Секция для опций навыка
+        ttk.Label(skill_window, text="Опции:").pack(pady=5)
+        options_frame = ttk.Frame(skill_window)
+        options_frame.pack(pady=5, fill=tk.BOTH, expand=True)
+
+        options_listbox = tk.Listbox(options_frame)
+        options_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        options_scrollbar = ttk.Scrollbar(options_frame, orient="vertical", command=options_listbox.yview)
+        options_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        options_listbox.config(yscrollcommand=options_scrollbar.set)
+
+        options_listbox.options = []
+
+        # Кнопки управления опциями
+        options_buttons_frame = ttk.Frame(skill_window)
+        options_buttons_frame.pack(pady=5)
+
+        def add_option():
+            option_data = self.get_option_data_dialog()
+            if option_data:
+                options_listbox.insert(tk.END, option_data['Название'])
+                options_listbox.options.append(option_data)
+
+        def edit_option():
+            selected_index = options_listbox.curselection()
+            if selected_index:
+                index = selected_index[0]
+                option_data = options_listbox.options[index]
+                updated_option = self.get_option_data_dialog(option_data)
+                if updated_option:
+                    options_listbox.delete(index)
+                    options_listbox.insert(index, updated_option['Название'])
+                    options_listbox.options[index] = updated_option
+
+        def delete_option():
+            selected_index = options_listbox.curselection()
+            if selected_index:
+                index = selected_index[0]
+                del options_listbox.options[index]
+                options_listbox.delete(index)
+
+        add_option_button = ttk.Button(options_buttons_frame, text="Добавить опцию", command=add_option)
+        add_option_button.pack(side=tk.LEFT, padx=5)
+
+        edit_option_button = ttk.Button(options_buttons_frame, text="Редактировать опцию", command=edit_option)
+        edit_option_button.pack(side=tk.LEFT, padx=5)
+
+        delete_option_button = ttk.Button(options_buttons_frame, text="Удалить опцию", command=delete_option)
+        delete_option_button.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(skill_window, text="Дополнительная информация:").pack(pady=5)
+        additional_text = tk.Text(skill_window, height=3)
+        additional_text.pack(pady=5)
+
+        if skill:
+            name_entry.insert(0, skill.get('Название', ''))
+            description_text.insert(tk.END, skill.get('Описание', ''))
+            is_important_var.set(skill.get('Важный', 'Нет') == 'Да')
+            additional_text.insert(tk.END, skill.get('Дополнительно', ''))
+            options_listbox.options = list(skill.get('Опции', []))
+            for option in options_listbox.options:
+                options_listbox.insert(tk.END, option['Название'])
+
+        def save_skill():
+            name = name_entry.get().strip()
+            description = description_text.get(1.0, tk.END).strip()
+            is_important = 'Да' if is_important_var.get() else 'Нет'
+            additional = additional_text.get(1.0, tk.END).strip()
+
+            error = validate_skill({"Название": name})
+            if error:
+                messagebox.showerror("Ошибка", error)
+                return
+
+            skill_data = {
+                "Название": name,
+                "Описание": description,
+                "Важный": is_important,
+                "Опции": options_listbox.options,
+                "Дополнительно": additional
+            }
+
+            skill_window.skill_data = skill_data
+            skill_window.destroy()
+
+        save_button = ttk.Button(skill_window, text="Сохранить навык", command=save_skill)
+        save_button.pack(pady=10)
+
+        skill_window.skill_data = None
+        self.wait_window(skill_window)
+        return skill_window.skill_data
+
+    def get_option_data_dialog(self, option=None):
+        option_window = tk.Toplevel(self)
+        option_window.title("Добавить опцию" if option is None else "Редактировать опцию")
+        option_window.geometry("300x200")
+
+        ttk.Label(option_window, text="Название опции:").pack(pady=5)
+        name_entry = ttk.Entry(option_window)
+        name_entry.pack(pady=5)
+
+        ttk.Label(option_window, text="Описание опции:").pack(pady=5)
+        description_text = tk.Text(option_window, height=5)
+        description_text.pack(pady=5)
+
+        if option:
+            name_entry.insert(0, option.get('Название', ''))
+            description_text.insert(tk.END, option.get('Описание', ''))
+
+        def save_option():
+            name = name_entry.get().strip()
+            description = description_text.get(1.0, tk.END).strip()
+
+            error = validate_option({"Название": name})
+            if error:
+                messagebox.showerror("Ошибка", error)
+                return
+
+            option_data = {
+                "Название": name,
+                "Описание": description
+            }
+
+            option_window.option_data = option_data
+            option_window.destroy()
+
+        save_button = ttk.Button(option_window, text="Сохранить опцию", command=save_option)
+        save_button.pack(pady=10)
+
+        option_window.option_data = None
+        self.wait_window(option_window)
+        return option_window.option_data
+
+    def delete_race(self):
+        race_id = self.selected_race_id()
+        if race_id is not None:
+            race_name = self.races.name(race_id)
+            confirm = messagebox.askyesno("Удалить расу", f"Вы уверены, что хотите удалить расу '{race_name}'?")
+            if confirm:
+                self.remove_race(race_id)
+                self.clear_race_details()
+                messagebox.showinfo("Успех", "Раса удалена.")
+        else:
+            messagebox.showwarning("Предупреждение", "Сначала выберите расу для удаления.")
+
+    def display_half_race(self):
+        if len(self.races) < 2:
+            messagebox.showwarning("Предупреждение", "Недостаточно рас для создания полурасы.")
+            return
+        selection_window = tk.Toplevel(self)
+        selection_window.title("Выбор рас для полурасы")
+        selection_window.geometry("300x200")
+
+        ttk.Label(selection_window, text="Выберите первую расу:").pack(pady=5)
+        race1_var = tk.StringVar()
+        race1_combobox = ttk.Combobox(selection_window, textvariable=race1_var)
+        race1_combobox.pack()
+        self.bind_race_suggestions(race1_combobox)
+
+        ttk.Label(selection_window, text="Выберите вторую расу:").pack(pady=5)
+        race2_var = tk.StringVar()
+        race2_combobox = ttk.Combobox(selection_window, textvariable=race2_var)
+        race2_combobox.pack()
+        self.bind_race_suggestions(race2_combobox)
+
+        def create_half_race():
+            race_ids = []
+            for text in (race1_var.get(), race2_var.get()):
+                matches = self.races.resolve(text)
+                if not matches:
+                    messagebox.showerror("Ошибка", "Ошибка выбора рас.")
+                    return
+                if len(matches) > 1:
+                    messagebox.showerror("Ошибка", f"Рас с именем '{text}' несколько. Выберите вариант с номером.")
+                    return
+                race_ids.append(matches[0])
+            if race_ids[0] == race_ids[1]:
+                messagebox.showerror("Ошибка", "Выберите две разные расы.")
+                return
+            race1, race2 = (self.races.get(race_id) for race_id in race_ids)
+            half_race = generate_half_race(race1, race2)
+            self.show_race_details(half_race)
+            selection_window.destroy()
+
+        ttk.Button(selection_window, text="Создать полурасу", command=create_half_race).pack(pady=10)
+
+    def suggest_race_names(self, text, limit=FUZZY_LIMIT):
+        # Сначала совпадения по началу слов в имени, затем похожие имена (с опечатками)
+        keys = self.search_index.search(f"имя:{text}")[:limit] if text.strip() else []
+        for key in self.fuzzy_index.search_keys(text, limit, field='имя'):
+            if len(keys) == limit:
+                break
+            if key not in keys:
+                keys.append(key)
+        return [self.races.display_name(key) for key in keys]
+
+    def race_picker_values(self, text):
+        # Без текста - первая страница имён, с текстом - подсказки; все имена
+        # каталога в выпадающий список не загружаются
+        if text.strip():
+            return self.suggest_race_names(text)
+        return [self.races.display_name(race_id) for race_id in itertools.islice(self.races, RACE_PICKER_PAGE)]
+
+    def bind_race_suggestions(self, combobox):
+        def update_values(event=None):
+            combobox['values'] = self.race_picker_values(combobox.get())
+
+        combobox.configure(postcommand=update_values)
+        combobox.bind('<KeyRelease>', update_values)
+
+    def write_through(self, operation, *args):
+        # Каждая правка сразу записывается: в SQLite - своей транзакцией,
+        # в режиме JSON - одной строкой в журнал рядом с файлом
+        self.edit_count += 1
+        try:
+            getattr(self.storage or self.journal, operation)(*args)
+        except (sqlite3.Error, OSError) as e:
+            messagebox.showerror("Ошибка", f"Ошибка при записи изменений: {e}")
+            return
+        if self.journal:
+            self.dirty = True
+            if self.journal.needs_compaction():
+                self.save_races(quiet=True)
+
+    def sync_journal(self):
+        # fsync журнала выполняется в фоне; повторные запросы сливаются в один
+        self.io.submit('sync', self.journal.sync, callback=self.on_journal_synced)
+        self.after(JOURNAL_SYNC_MS, self.sync_journal)
+
+    def on_journal_synced(self, result, error):
+        if error is not None:
+            if not isinstance(error, OSError):
+                raise error
+            messagebox.showerror("Ошибка", f"Ошибка при записи журнала: {error}")
+
+    def poll_io(self):
+        # Результаты фоновых операций обрабатываются только в потоке Tk
+        for kind, callback, result, error in self.io.poll():
+            if callback is not None:
+                callback(result, error)
+        self.after(IO_POLL_MS, self.poll_io)
+
+    def autosave(self):
+        # Автосохранение пишет снимок, только если после прошлого были правки
+        if self.autosave_var.get() and self.dirty and not self.loading:
+            self.save_races(quiet=True)
+        self.after(self.autosave_ms, self.autosave)
+
+    def close(self):
+        # Перед выходом прерываем импорт, дожидаемся фоновой записи и сбрасываем журнал на диск
+        if self.import_cancelled is not None:
+            self.import_cancelled.set()
+        self.io.wait_idle()
+        if self.journal:
+            self.journal.close()
+        self.destroy()
+
+    def import_json(self):
+        filename = filedialog.askopenfilename(filetypes=[("JSON", "*.json")])
+        if not filename:
+            return
+
+        def run_import():
+            storage = SqliteRaceStorage(self.filename)
+            try:
+                return storage.import_json(filename)
+            finally:
+                storage.close()
+
+        self.set_busy('import', "Импорт...")
+        self.io.submit('import', run_import, callback=self.on_json_imported)
+
+    def on_json_imported(self, count, error):
+        self.clear_busy('import')
+        if error is not None:
+            if not isinstance(error, (OSError, json.JSONDecodeError, sqlite3.Error)):
+                raise error
+            messagebox.showerror("Ошибка", f"Ошибка импорта: {error}")
+            return
+        messagebox.showinfo("Успех", f"Импортировано рас: {count}.")
+        self.load_races()
+
+    def export_json(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if not filename:
+            return
+
+        def run_export():
+            storage = SqliteRaceStorage(self.filename)
+            try:
+                storage.export_json(filename)
+            finally:
+                storage.close()
+
+        self.set_busy('export', "Экспорт...")
+        self.io.submit('export', run_export, callback=self.on_json_exported)
+
+    def on_json_exported(self, result, error):
+        self.clear_busy('export')
+        if error is not None:
+            if not isinstance(error, (OSError, sqlite3.Error)):
+                raise error
+            messagebox.showerror("Ошибка", f"Ошибка экспорта: {error}")
+            return
+        messagebox.showinfo("Успех", "Данные экспортированы.")
+
+    def import_records(self):
+        # Разбор и проверка записей идут в фоне (в пуле процессов), а проверенные
+        # расы передаются в поток Tk пакетами по мере проверки и добавляются в каталог
+        # между событиями окна
+        if self.loading:
+            messagebox.showwarning("Предупреждение", "Дождитесь окончания загрузки.")
+            return
+        filename = filedialog.askopenfilename(filetypes=[("NDJSON", "*.ndjson *.jsonl"), ("CSV", "*.csv")])
+        if not filename:
+            return
+        report_filename = filename + ".errors.ndjson"
+        # Очередь ограничена: проверка ждёт, пока окно разберёт прежние пакеты, поэтому
+        # в памяти одновременно лишь несколько пакетов, а не весь файл
+        batches = queue.Queue(IMPORT_PENDING_BATCHES)
+        cancelled = threading.Event()
+
+        def send(batch):
+            while not cancelled.is_set():
+                try:
+                    batches.put(batch, timeout=IO_POLL_MS / 1000)
+                    return
+                except queue.Full:
+                    pass
+
+        def run_validation():
+            batch = []
+            failed = 0
+            with open(filename, "r", encoding="utf-8", newline="") as f, \
+                    open(report_filename, "w", encoding="utf-8") as report:
+                for number, record, digests, error in validate_records(f, record_format(filename)):
+                    if cancelled.is_set():
+                        break
+                    if error is None:
+                        batch.append((record, digests))
+                        if len(batch) >= IMPORT_BATCH_SIZE:
+                            send(batch)
+                            batch = []
+                    else:
+                        failed += 1
+                        report.write(json.dumps({'Строка': number, 'Ошибка': error}, ensure_ascii=False) + "\n")
+            if batch:
+                send(batch)
+            if not failed:
+                os.remove(report_filename)
+            return failed, report_filename
+
+        self.loading = True
+        self.import_batches = batches
+        self.import_cancelled = cancelled
+        self.import_result = None
+        for button in self.action_buttons:
+            button.state(['disabled'])
+        self.set_busy('import', "Импорт...")
+        self.io.submit('import-records', run_validation,
+                       callback=lambda result, error: self.on_records_validated(result, error, batches))
+        self.after(IO_POLL_MS, self.merge_import_batch, batches, cancelled, 0)
+
+    def on_records_validated(self, result, error, batches):
+        # Результат приходит, когда все пакеты уже в очереди; результат прерванного
+        # импорта не нужен
+        if batches is self.import_batches:
+            self.import_result = (result, error)
+
+    def merge_import_batch(self, batches, cancelled, imported):
+        try:
+            batch = batches.get_nowait()
+        except queue.Empty:
+            batch = None
+        if batch is not None:
+            self.edit_count += 1
+            try:
+                imported += len(merge_races(self.races, self.storage or self.journal, batch))
+            except (sqlite3.Error, OSError) as e:
+                cancelled.set()
+                self.import_batches = self.import_cancelled = None
+                self.finish_import(imported)
+                messagebox.showerror("Ошибка", f"Ошибка при записи изменений: {e}")
+                return
+            self.after(0, self.merge_import_batch, batches, cancelled, imported)
+            return
+        if self.import_result is None:
+            # Проверка ещё идёт: ждём следующих пакетов
+            self.after(IO_POLL_MS, self.merge_import_batch, batches, cancelled, imported)
+            return
+        result, error = self.import_result
+        self.import_batches = self.import_cancelled = self.import_result = None
+        self.finish_import(imported)
+        if error is not None:
+            if not isinstance(error, (OSError, UnicodeDecodeError)):
+                raise error
+            messagebox.showerror("Ошибка", f"Ошибка импорта: {error}. Импортировано рас: {imported}.")
+            return
+        failed, report_filename = result
+        message = f"Импортировано рас: {imported}."
+        if failed:
+            message += f" Записей с ошибками: {failed}, отчёт: {report_filename}"
+        messagebox.showinfo("Импорт", message)
+
+    def finish_import(self, imported=0):
+        self.clear_busy('import')
+        if imported:
+            # После массового импорта индексы дешевле построить заново - в фоне по копии
+            # каталога; правки остаются запрещены, пока новые индексы не готовы
+            self.set_busy('index', "Индексация...")
+            self.io.submit('index', build_race_indexes, self.races.copy(), callback=self.on_import_indexed)
+            return
+        self.loading = False
+        for button in self.action_buttons:
+            button.state(['!disabled'])
+
+    def on_import_indexed(self, indexes, error):
+        self.loading = False
+        self.clear_busy('index')
+        for button in self.action_buttons:
+            button.state(['!disabled'])
+        if error is not None:
+            raise error
+        self.search_index, self.fuzzy_index, self.sort_index = indexes
+        self.sort_index.races = self.races
+        self.rebuild_race_list()
+        self._details_cache.clear()
+        if self.journal:
+            self.dirty = True
+            if self.journal.needs_compaction():
+                self.save_races(quiet=True)
+
+    def export_records(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".ndjson",
+                                                filetypes=[("NDJSON", "*.ndjson *.jsonl"), ("CSV", "*.csv")])
+        if not filename:
+            return
+        # Запись идёт в фоне по копии каталога, правки в окне её не затрагивают
+        snapshot = self.races.copy()
+
+        def run_export():
+            with open(filename, "w", encoding="utf-8", newline="") as f:
+                return export_races(snapshot.races(), f, record_format(filename))
+
+        self.set_busy('export', "Экспорт...")
+        self.io.submit('export-records', run_export, callback=self.on_records_exported)
+
+    def on_records_exported(self, count, error):
+        self.clear_busy('export')
+        if error is not None:
+            if not isinstance(error, OSError):
+                raise error
+            messagebox.showerror("Ошибка", f"Ошибка экспорта: {error}")
+            return
+        messagebox.showinfo("Успех", f"Экспортировано рас: {count}.")
+
+    def load_races(self):
+        # Чтение и разбор файла идут в фоне; до их окончания правки запрещены
+        if self.loading:
+            return
+        self.loading = True
+        for button in self.action_buttons:
+            button.state(['disabled'])
+        self.set_busy('load', "Загрузка...")
+        self._load_span = spans.start('load_races')
+        self.io.submit('load', load_races_task, self.filename, self.journal, callback=self.on_races_loaded)
+
+    def on_races_loaded(self, result, error):
+        self.loading = False
+        self.clear_busy('load')
+        for button in self.action_buttons:
+            button.state(['!disabled'])
+        if error is not None:
+            if not isinstance(error, OSError):
+                raise error
+            messagebox.showerror("Ошибка", f"Ошибка при загрузке данных: {error}")
+            return
+        self.races, messages, indexes, self.file_state = result
+        self.search_index, self.fuzzy_index, self.sort_index = indexes
+        # Правки из журнала ещё не попали в снимок
+        self.dirty = bool(self.journal and self.journal.records)
+        self.rebuild_race_list()
+        self._details_cache.clear()
+        self.clear_race_details()
+        spans.stop(self._load_span)
+        for kind, text in messages:
+            if kind == 'warning':
+                messagebox.showwarning("Предупреждение", text)
+            else:
+                messagebox.showerror("Ошибка", text)
+
+    def watch_file(self):
+        # Опрос времени изменения и размера: правки файла внешними скриптами подхватываются
+        # без перезапуска. Своё сохранение запоминает новое состояние и правкой не считается.
+        self.after(WATCH_INTERVAL_MS, self.watch_file)
+        self.check_file()
+
+    def check_file(self):
+        if self.loading or self.reloading or self.journal.is_compacting():
+            return
+        state = file_state(self.filename)
+        if state is None or state == self.file_state:
+            return
+        self.reloading = True
+        races, edit_count = self.races, self.edit_count
+        self.io.submit('reload', reload_races_task, self.filename, races.copy(),
+                       callback=lambda result, error: self.on_races_reloaded(result, error, races, edit_count))
+
+    def on_races_reloaded(self, result, error, old_races, edit_count):
+        self.reloading = False
+        if error is not None:
+            if not isinstance(error, OSError):
+                raise error
+            # Файл мог быть удалён или подменён - проверим при следующем опросе
+            return
+        if self.races is not old_races or self.edit_count != edit_count or self.loading:
+            # Каталог заменён или правлен после чтения - файл будет перечитан при следующем опросе
+            return
+        races, self.file_state, diff = result
+        if races is None:
+            # Файл ещё дописывается или неверной структуры; его следующая правка вызовет новое чтение
+            return
+        self.apply_reloaded_races(races, diff)
+
+    def apply_reloaded_races(self, races, diff):
+        # Применяются только отличия: строки списка, индексы и кэш карточек остальных рас
+        # не перестраиваются, выделение и прокрутка списка сохраняются
+        added, changed, removed = diff
+        shown_id = self._details_race_id
+        self.races = races
+        self.sort_index.races = races
+        # Следующее сохранение пишется поверх перечитанного снимка
+        self.journal.snapshot_state = races.source
+        for race_id in removed:
+            self.invalidate_race_details(race_id)
+            self.search_index.remove(race_id)
+            self.fuzzy_index.remove(race_id)
+            self.sort_index.remove(race_id)
+            self.race_list.remove(race_id)
+            self._shown_set.discard(race_id)
+        for race_id in changed:
+            race = races.summary(race_id)
+            self.invalidate_race_details(race_id)
+            self.search_index.update(race_id, race)
+            self.fuzzy_index.update(race_id, race)
+            self.sort_index.update(race_id, race)
+            self.race_list.refresh(race_id)
+        filtered = self.search_var.get().strip() or self.sort_column is not None
+        for race_id in added:
+            race = races.summary(race_id)
+            self.search_index.add(race_id, race)
+            self.fuzzy_index.add(race_id, race)
+            self.sort_index.add(race_id, race)
+            if not filtered:
+                self.race_list.append(race_id)
+                self._shown_set.add(race_id)
+        if filtered and (added or changed or removed):
+            self._shown_query = None
+            self.update_race_list()
+        if shown_id is not None and shown_id not in races:
+            self.clear_race_details()
+        elif shown_id is not None and shown_id in changed:
+            # Открытая карточка перерисовывается на прежнем месте прокрутки
+            position = self.details_text.yview()[0]
+            self._details_race_id = None
+            self.show_race_details(races.get(shown_id), shown_id)
+            self.details_text.yview_moveto(position)
+        if races.assigned_ids:
+            # Другая программа записала расы без Ид: их номера сразу сохраняются в файл (см. write_race_ids)
+            self.save_races(quiet=True)
+
+    def save_races(self, quiet=False):
+        if self.storage:
+            # Правки уже записаны в базу по одной транзакции на каждую
+            if not quiet:
+                messagebox.showinfo("Успех", "Данные успешно сохранены.")
+            return
+        if self.loading:
+            if not quiet:
+                messagebox.showwarning("Предупреждение", "Дождитесь окончания загрузки.")
+            return
+        if self.journal.is_compacting():
+            # Сохранение уже идёт: все запросы за это время сливаются в одно следующее
+            self.save_requested = quiet if self.save_requested is None else self.save_requested and quiet
+            return
+        # Правки уже в журнале; снимок каталога берётся сразу, а файл пишется в фоне,
+        # так что редактирование можно продолжать
+        try:
+            snapshot = self.journal.begin_compaction(self.races)
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Ошибка при сохранении данных: {e}")
+            return
+        self.dirty = False
+        self.set_busy('save', "Сохранение...")
+        self._save_span = spans.start('save_races')
+        self.io.submit('save', self.journal.compact, snapshot,
+                       callback=lambda result, error: self.on_races_saved(result, error, quiet))
+
+    def on_races_saved(self, stat, error, quiet):
+        self.clear_busy('save')
+        spans.stop(self._save_span)
+        if stat is not None:
+            # Файл только что записан самим окном - это не внешняя правка
+            self.file_state = (stat.st_mtime_ns, stat.st_size)
+        if isinstance(error, SnapshotChangedError):
+            # Правки остались в журнале; сначала перечитываем файл, затем их можно сохранить снова
+            self.dirty = True
+            self.save_requested = None
+            self.check_file()
+            if not quiet:
+                messagebox.showwarning("Предупреждение", "Файл изменён другой программой и будет перечитан. "
+                                       "Сохранение отменено, правки окна не потеряны - сохраните ещё раз.")
+            return
+        if error is not None:
+            if not isinstance(error, OSError):
+                raise error
+            self.dirty = True
+            messagebox.showerror("Ошибка", f"Ошибка при сохранении данных: {error}")
+        elif not quiet:
+            messagebox.showinfo("Успех", "Данные успешно сохранены.")
+        if self.save_requested is not None:
+            # Если правок после снимка не было, только что записанный снимок уже актуален
+            quiet, self.save_requested = self.save_requested, None
+            if self.dirty:
+                self.save_races(quiet)
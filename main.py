@@ -1,510 +1,275 @@
+import argparse
 import json
+import os
 import random
-import tkinter as tk
-from tkinter import messagebox, simpledialog
-from tkinter import ttk
-
-class RaceApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        self.title("Менеджер Рас")
-        self.geometry("900x600")
-        self.filename = "races.json"
-        self.races = self.load_races()
-
-        # Устанавливаем тему
-        self.style = ttk.Style(self)
-        self.style.theme_use('clam')  # Вы можете выбрать 'default', 'clam', 'alt', 'classic'
-
-        self.configure_styles()
-        self.create_widgets()
-
-    def configure_styles(self):
-        self.style.configure('TButton', font=('Helvetica', 10))
-        self.style.configure('TLabel', font=('Helvetica', 10))
-        self.style.configure('Treeview', font=('Helvetica', 10))
-        self.style.configure('Treeview.Heading', font=('Helvetica', 11, 'bold'))
-        self.style.configure('TEntry', font=('Helvetica', 10))
-        self.style.configure('TNotebook', font=('Helvetica', 10))
-        self.style.configure('TNotebook.Tab', font=('Helvetica', 10))
-
-    def create_widgets(self):
-        self.create_menu()
-
-        main_frame = ttk.Frame(self)
-        main_frame.pack(fill=tk.BOTH, expand=True)
-
-        self.create_race_list(main_frame)
-        self.create_details_area(main_frame)
-
-    def create_menu(self):
-        menubar = tk.Menu(self)
-        file_menu = tk.Menu(menubar, tearoff=0)
-        file_menu.add_command(label="Загрузить", command=self.load_races)
-        file_menu.add_command(label="Сохранить", command=self.save_races)
-        file_menu.add_separator()
-        file_menu.add_command(label="Выход", command=self.quit)
-        menubar.add_cascade(label="Файл", menu=file_menu)
-        self.config(menu=menubar)
-
-    def create_race_list(self, parent):
-        left_frame = ttk.Frame(parent)
-        left_frame.pack(side=tk.LEFT, fill=tk.Y)
-
-        # Добавляем поиск
-        search_frame = ttk.Frame(left_frame)
-        search_frame.pack(fill=tk.X, padx=5, pady=5)
-
-        ttk.Label(search_frame, text="Поиск:").pack(side=tk.LEFT)
-        self.search_var = tk.StringVar()
-        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
-        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
-        self.search_var.trace_add('write', self.update_race_list)
-
-        # Используем Treeview для списка рас
-        columns = ('Имя',)
-        self.race_tree = ttk.Treeview(left_frame, columns=columns, show='headings')
-        self.race_tree.heading('Имя', text='Имя')
-        self.race_tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5)
-
-        self.update_race_list()
-
-        self.race_tree.bind('<<TreeviewSelect>>', self.on_race_select)
-
-        self.create_buttons(left_frame)
-
-    def update_race_list(self, *args):
-        search_text = self.search_var.get().lower()
-        for item in self.race_tree.get_children():
-            self.race_tree.delete(item)
-        for idx, race in enumerate(self.races):
-            race_name = race.get('Имя', 'Безымянная раса')
-            if search_text in race_name.lower():
-                self.race_tree.insert('', 'end', iid=idx, values=(race_name,))
-
-    def on_race_select(self, event):
-        selected_item = self.race_tree.focus()
-        if selected_item:
-            index = int(selected_item)
-            race = self.races[index]
-            self.show_race_details(race)
-
-    def show_race_details(self, race):
-        self.details_text.configure(state='normal')
-        self.details_text.delete(1.0, tk.END)
-        details = f"Имя: {race.get('Имя', '')}\n"
-        details += f"Скорость: {race.get('Скорость', '')}\n"
-        details += f"Размер: {race.get('Размер', '')}\n"
-        details += f"Темное зрение: {race.get('Темное зрение', '')}\n"
-        details += "\nНавыки:\n"
-        for skill in race.get("Навыки", []):
-            details += f"- {skill.get('Название', '')}\n"
-            details += f"  Важный: {skill.get('Важный', 'Нет')}\n"
-            details += f"  Описание: {skill.get('Описание', '')}\n"
-            if "Опции" in skill:
-                details += "  Опции:\n"
-                for option in skill["Опции"]:
-                    details += f"    • {option.get('Название', '')}: {option.get('Описание', '')}\n"
-            if "Дополнительно" in skill:
-                details += f"  Дополнительно: {skill.get('Дополнительно', '')}\n"
-            details += "\n"
-        self.details_text.insert(tk.END, details)
-        self.details_text.configure(state='disabled')
-
-    def create_buttons(self, parent):
-        button_frame = ttk.Frame(parent)
-        button_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
-
-        add_button = ttk.Button(button_frame, text="Добавить расу", command=self.add_race)
-        add_button.pack(side=tk.LEFT, padx=5)
-
-        delete_button = ttk.Button(button_frame, text="Удалить расу", command=self.delete_race)
-        delete_button.pack(side=tk.LEFT, padx=5)
-
-        half_race_button = ttk.Button(button_frame, text="Отобразить полурасу", command=self.display_half_race)
-        half_race_button.pack(side=tk.LEFT, padx=5)
-
-    def create_details_area(self, parent):
-        right_frame = ttk.Frame(parent)
-        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
-
-        notebook = ttk.Notebook(right_frame)
-        notebook.pack(fill=tk.BOTH, expand=True)
-
-        # Вкладка с деталями расы
-        details_frame = ttk.Frame(notebook)
-        notebook.add(details_frame, text='Детали')
-
-        self.details_text = tk.Text(details_frame, wrap=tk.WORD, state='disabled')
-        self.details_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-    def add_race(self):
-        # Создаем новое окно для добавления расы
-        add_race_window = tk.Toplevel(self)
-        add_race_window.title("Добавить расу")
-        add_race_window.geometry("400x500")
-
-        # Поля для ввода основных характеристик
-        ttk.Label(add_race_window, text="Имя расы:").pack(pady=5)
-        name_entry = ttk.Entry(add_race_window)
-        name_entry.pack(pady=5)
-
-        ttk.Label(add_race_window, text="Скорость:").pack(pady=5)
-        speed_entry = ttk.Entry(add_race_window)
-        speed_entry.pack(pady=5)
-
-        ttk.Label(add_race_window, text="Размер:").pack(pady=5)
-        size_entry = ttk.Entry(add_race_window)
-        size_entry.pack(pady=5)
-
-        ttk.Label(add_race_window, text="Темное зрение:").pack(pady=5)
-        dark_vision_entry = ttk.Entry(add_race_window)
-        dark_vision_entry.pack(pady=5)
-
-        # Секция для навыков
-        ttk.Label(add_race_window, text="Навыки:").pack(pady=5)
-        skills_frame = ttk.Frame(add_race_window)
-        skills_frame.pack(pady=5, fill=tk.BOTH, expand=True)
-
-        skills_listbox = tk.Listbox(skills_frame)
-        skills_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        skills_scrollbar = ttk.Scrollbar(skills_frame, orient="vertical", command=skills_listbox.yview)
-        skills_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        skills_listbox.config(yscrollcommand=skills_scrollbar.set)
-
-        # Кнопки управления навыками
-        skill_buttons_frame = ttk.Frame(add_race_window)
-        skill_buttons_frame.pack(pady=5)
-
-        def add_skill():
-            skill_data = self.get_skill_data_dialog()
-            if skill_data:
-                skills_listbox.insert(tk.END, skill_data['Название'])
-                skills_listbox.skills.append(skill_data)
-
-        def edit_skill():
-            selected_index = skills_listbox.curselection()
-            if selected_index:
-                index = selected_index[0]
-                skill_data = skills_listbox.skills[index]
-                updated_skill = self.get_skill_data_dialog(skill_data)
-                if updated_skill:
-                    skills_listbox.delete(index)
-                    skills_listbox.insert(index, updated_skill['Название'])
-                    skills_listbox.skills[index] = updated_skill
-
-        def delete_skill():
-            selected_index = skills_listbox.curselection()
-            if selected_index:
-                index = selected_index[0]
-                del skills_listbox.skills[index]
-                skills_listbox.delete(index)
-
-        skills_listbox.skills = []
-
-        add_skill_button = ttk.Button(skill_buttons_frame, text="Добавить навык", command=add_skill)
-        add_skill_button.pack(side=tk.LEFT, padx=5)
-
-        edit_skill_button = ttk.Button(skill_buttons_frame, text="Редактировать навык", command=edit_skill)
-        edit_skill_button.pack(side=tk.LEFT, padx=5)
-
-        delete_skill_button = ttk.Button(skill_buttons_frame, text="Удалить навык", command=delete_skill)
-        delete_skill_button.pack(side=tk.LEFT, padx=5)
-
-        def save_race():
-            name = name_entry.get().strip()
-            speed = speed_entry.get().strip()
-            size = size_entry.get().strip()
-            dark_vision = dark_vision_entry.get().strip()
-
-            if not name:
-                messagebox.showerror("Ошибка", "Введите имя расы.")
-                return
-            if not speed.isdigit():
-                messagebox.showerror("Ошибка", "Скорость должна быть числом.")
-                return
-
-            race = {
-                "Имя": name,
-                "Скорость": speed,
-                "Размер": size,
-                "Темное зрение": dark_vision,
-                "Навыки": skills_listbox.skills
-            }
-
-            self.races.append(race)
-            self.update_race_list()
-            messagebox.showinfo("Успех", "Раса добавлена.")
-            add_race_window.destroy()
-
-        save_button = ttk.Button(add_race_window, text="Сохранить расу", command=save_race)
-        save_button.pack(pady=10)
-
-    def get_skill_data_dialog(self, skill=None):
-        skill_window = tk.Toplevel(self)
-        skill_window.title("Добавить навык" if skill is None else "Редактировать навык")
-        skill_window.geometry("400x400")
-
-        ttk.Label(skill_window, text="Название навыка:").pack(pady=5)
-        name_entry = ttk.Entry(skill_window)
-        name_entry.pack(pady=5)
-
-        ttk.Label(skill_window, text="Описание:").pack(pady=5)
-        description_text = tk.Text(skill_window, height=5)
-        description_text.pack(pady=5)
-
-        is_important_var = tk.BooleanVar()
-        is_important_check = ttk.Checkbutton(skill_window, text="Важный навык", variable=is_important_var)
-        is_important_check.pack(pady=5)
-
-        # Секция для опций навыка
-        ttk.Label(skill_window, text="Опции:").pack(pady=5)
-        options_frame = ttk.Frame(skill_window)
-        options_frame.pack(pady=5, fill=tk.BOTH, expand=True)
-
-        options_listbox = tk.Listbox(options_frame)
-        options_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        options_scrollbar = ttk.Scrollbar(options_frame, orient="vertical", command=options_listbox.yview)
-        options_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        options_listbox.config(yscrollcommand=options_scrollbar.set)
-
-        options_listbox.options = []
-
-        # Кнопки управления опциями
-        options_buttons_frame = ttk.Frame(skill_window)
-        options_buttons_frame.pack(pady=5)
-
-        def add_option():
-            option_data = self.get_option_data_dialog()
-            if option_data:
-                options_listbox.insert(tk.END, option_data['Название'])
-                options_listbox.options.append(option_data)
-
-        def edit_option():
-            selected_index = options_listbox.curselection()
-            if selected_index:
-                index = selected_index[0]
-                option_data = options_listbox.options[index]
-                updated_option = self.get_option_data_dialog(option_data)
-                if updated_option:
-                    options_listbox.delete(index)
-                    options_listbox.insert(index, updated_option['Название'])
-                    options_listbox.options[index] = updated_option
-
-        def delete_option():
-            selected_index = options_listbox.curselection()
-            if selected_index:
-                index = selected_index[0]
-                del options_listbox.options[index]
-                options_listbox.delete(index)
-
-        add_option_button = ttk.Button(options_buttons_frame, text="Добавить опцию", command=add_option)
-        add_option_button.pack(side=tk.LEFT, padx=5)
-
-        edit_option_button = ttk.Button(options_buttons_frame, text="Редактировать опцию", command=edit_option)
-        edit_option_button.pack(side=tk.LEFT, padx=5)
-
-        delete_option_button = ttk.Button(options_buttons_frame, text="Удалить опцию", command=delete_option)
-        delete_option_button.pack(side=tk.LEFT, padx=5)
-
-        ttk.Label(skill_window, text="Дополнительная информация:").pack(pady=5)
-        additional_text = tk.Text(skill_window, height=3)
-        additional_text.pack(pady=5)
-
-        if skill:
-            name_entry.insert(0, skill.get('Название', ''))
-            description_text.insert(tk.END, skill.get('Описание', ''))
-            is_important_var.set(skill.get('Важный', 'Нет') == 'Да')
-            additional_text.insert(tk.END, skill.get('Дополнительно', ''))
-            options_listbox.options = skill.get('Опции', [])
-            for option in options_listbox.options:
-                options_listbox.insert(tk.END, option['Название'])
-
-        def save_skill():
-            name = name_entry.get().strip()
-            description = description_text.get(1.0, tk.END).strip()
-            is_important = 'Да' if is_important_var.get() else 'Нет'
-            additional = additional_text.get(1.0, tk.END).strip()
-
-            if not name:
-                messagebox.showerror("Ошибка", "Введите название навыка.")
-                return
-
-            skill_data = {
-                "Название": name,
-                "Описание": description,
-                "Важный": is_important,
-                "Опции": options_listbox.options,
-                "Дополнительно": additional
-            }
-
-            skill_window.skill_data = skill_data
-            skill_window.destroy()
-
-        save_button = ttk.Button(skill_window, text="Сохранить навык", command=save_skill)
-        save_button.pack(pady=10)
-
-        skill_window.skill_data = None
-        self.wait_window(skill_window)
-        return skill_window.skill_data
-
-    def get_option_data_dialog(self, option=None):
-        option_window = tk.Toplevel(self)
-        option_window.title("Добавить опцию" if option is None else "Редактировать опцию")
-        option_window.geometry("300x200")
-
-        ttk.Label(option_window, text="Название опции:").pack(pady=5)
-        name_entry = ttk.Entry(option_window)
-        name_entry.pack(pady=5)
-
-        ttk.Label(option_window, text="Описание опции:").pack(pady=5)
-        description_text = tk.Text(option_window, height=5)
-        description_text.pack(pady=5)
-
-        if option:
-            name_entry.insert(0, option.get('Название', ''))
-            description_text.insert(tk.END, option.get('Описание', ''))
-
-        def save_option():
-            name = name_entry.get().strip()
-            description = description_text.get(1.0, tk.END).strip()
-
-            if not name:
-                messagebox.showerror("Ошибка", "Введите название опции.")
-                return
-
-            option_data = {
-                "Название": name,
-                "Описание": description
-            }
-
-            option_window.option_data = option_data
-            option_window.destroy()
-
-        save_button = ttk.Button(option_window, text="Сохранить опцию", command=save_option)
-        save_button.pack(pady=10)
-
-        option_window.option_data = None
-        self.wait_window(option_window)
-        return option_window.option_data
-
-    def delete_race(self):
-        selected_item = self.race_tree.focus()
-        if selected_item:
-            index = int(selected_item)
-            race_name = self.races[index].get('Имя', 'Безымянная раса')
-            confirm = messagebox.askyesno("Удалить расу", f"Вы уверены, что хотите удалить расу '{race_name}'?")
-            if confirm:
-                del self.races[index]
-                self.update_race_list()
-                self.details_text.configure(state='normal')
-                self.details_text.delete(1.0, tk.END)
-                self.details_text.configure(state='disabled')
-                messagebox.showinfo("Успех", "Раса удалена.")
+import sys
+
+from core import (RECORD_FORMATS, RaceJournal, RaceSearchIndex, SqliteRaceStorage, TrigramIndex, all_race_pairs,
+                  export_races, generate_half_race, generate_half_races, half_race_rng, import_races, is_sqlite_file,
+                  json_default, read_races, record_format, validate_race, write_race_ids)
+
+DEFAULT_FILENAME = "races.json"
+COMMANDS = ('list', 'search', 'show', 'add', 'delete', 'half-race', 'half-races', 'import', 'export')
+
+
+def open_races(filename):
+    # Правки записываются так же, как в окне: в журнал рядом с JSON или в базу SQLite
+    if is_sqlite_file(filename):
+        races, messages = read_races(filename)
+        writer = SqliteRaceStorage(filename)
+    else:
+        writer = RaceJournal(filename)
+        races, messages = read_races(filename, writer)
+        if not any(kind == 'error' for kind, text in messages):
+            try:
+                write_race_ids(races, writer)
+            except OSError as e:
+                messages.append(('warning', f"Не удалось записать Ид рас в файл: {e}"))
+    for kind, text in messages:
+        if kind == 'error':
+            sys.exit(text)
+        print(text, file=sys.stderr)
+    return races, writer
+
+
+def resolve_race(races, text):
+    # Раса задаётся Ид, именем или именем с номером из списка: "Гном [#12]"
+    if text.isdigit() and int(text) in races:
+        return int(text)
+    matches = races.resolve(text)
+    if not matches:
+        sys.exit(f"Раса не найдена: {text}")
+    if len(matches) > 1:
+        variants = ", ".join(races.display_name(race_id) for race_id in matches)
+        sys.exit(f"Рас с именем '{text}' несколько: {variants}. Укажите Ид.")
+    return matches[0]
+
+
+def print_json(data):
+    print(json.dumps(data, ensure_ascii=False, indent=4, default=json_default))
+
+
+def command_list(races, writer, args):
+    for race_id in races:
+        print(f"{race_id}\t{races.name(race_id)}")
+
+
+def command_search(races, writer, args):
+    index = TrigramIndex() if args.fuzzy else RaceSearchIndex()
+    for race_id in races:
+        index.add(race_id, races.summary(race_id))
+    if args.fuzzy:
+        race_ids = index.search_keys(args.query, args.limit)
+    else:
+        race_ids = index.search(args.query)[:args.limit]
+    for race_id in race_ids:
+        print(f"{race_id}\t{races.name(race_id)}")
+
+
+def command_show(races, writer, args):
+    print_json(races.get(resolve_race(races, args.race)))
+
+
+def command_add(races, writer, args):
+    if args.input == '-':
+        data = json.load(sys.stdin)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    if not isinstance(data, dict):
+        sys.exit("Ожидалась одна раса (объект JSON).")
+    error = validate_race(data)
+    if error:
+        sys.exit(error)
+    if races.find(data['Имя']):
+        print(f"Раса с именем '{data['Имя']}' уже есть, добавлена ещё одна.", file=sys.stderr)
+    race = races.add(data)
+    writer.put_race(race)
+    print(race['Ид'])
+
+
+def command_delete(races, writer, args):
+    race_id = resolve_race(races, args.race)
+    races.remove(race_id)
+    writer.delete_race(race_id)
+
+
+def command_half_race(races, writer, args):
+    race1_id = resolve_race(races, args.race1)
+    race2_id = resolve_race(races, args.race2)
+    if race1_id == race2_id:
+        sys.exit("Выберите две разные расы.")
+    # С зерном результат совпадает с образцом 0 этой пары в выводе half-races
+    rng = random.Random() if args.seed is None else half_race_rng(args.seed, race1_id, race2_id)
+    print_json(generate_half_race(races.get(race1_id), races.get(race2_id), rng))
+
+
+def command_half_races(races, writer, args):
+    if args.pair:
+        pairs = [(resolve_race(races, race1), resolve_race(races, race2)) for race1, race2 in args.pair]
+    elif args.races:
+        pairs = list(all_race_pairs([resolve_race(races, race) for race in args.races]))
+    else:
+        pairs = None
+    seed = args.seed
+    if seed is None:
+        # Случайное зерно сообщается, чтобы запуск можно было повторить
+        seed = random.randrange(1 << 32)
+        print(f"Зерно: {seed}", file=sys.stderr)
+    chunks = generate_half_races(races, pairs, args.samples, seed, args.processes)
+    if args.output == '-':
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+
+def command_import(races, writer, args):
+    # Массовый импорт NDJSON или CSV; ошибочные записи пропускаются и попадают в отчёт
+    format = args.format or record_format(args.input)
+    report_filename = args.report or (None if args.input == '-' else args.input + ".errors.ndjson")
+    report = open(report_filename, "w", encoding="utf-8") if report_filename else sys.stderr
+    try:
+        if args.input == '-':
+            imported, failed = import_races(races, writer, sys.stdin, format, report, args.processes)
         else:
-            messagebox.showwarning("Предупреждение", "Сначала выберите расу для удаления.")
-
-    def display_half_race(self):
-        if len(self.races) < 2:
-            messagebox.showwarning("Предупреждение", "Недостаточно рас для создания полурасы.")
-            return
-        selection_window = tk.Toplevel(self)
-        selection_window.title("Выбор рас для полурасы")
-        selection_window.geometry("300x200")
-
-        ttk.Label(selection_window, text="Выберите первую расу:").pack(pady=5)
-        race1_var = tk.StringVar()
-        race1_combobox = ttk.Combobox(selection_window, textvariable=race1_var)
-        race1_combobox['values'] = [race.get('Имя', 'Безымянная раса') for race in self.races]
-        race1_combobox.pack()
-
-        ttk.Label(selection_window, text="Выберите вторую расу:").pack(pady=5)
-        race2_var = tk.StringVar()
-        race2_combobox = ttk.Combobox(selection_window, textvariable=race2_var)
-        race2_combobox['values'] = [race.get('Имя', 'Безымянная раса') for race in self.races]
-        race2_combobox.pack()
-
-        def create_half_race():
-            race1_name = race1_var.get()
-            race2_name = race2_var.get()
-            if race1_name == race2_name or not race1_name or not race2_name:
-                messagebox.showerror("Ошибка", "Выберите две разные расы.")
-                return
-            race1 = next((race for race in self.races if race.get('Имя') == race1_name), None)
-            race2 = next((race for race in self.races if race.get('Имя') == race2_name), None)
-            if not race1 or not race2:
-                messagebox.showerror("Ошибка", "Ошибка выбора рас.")
-                return
-            half_race = self.generate_half_race(race1, race2)
-            self.show_race_details(half_race)
-            selection_window.destroy()
-
-        ttk.Button(selection_window, text="Создать полурасу", command=create_half_race).pack(pady=10)
-
-    def generate_half_race(self, race1, race2):
-        half_race = {}
-        half_race_name = f"Полураса: {race1['Имя']}/{race2['Имя']}"
-        half_race["Имя"] = half_race_name
-
-        # Случайный выбор скорости
-        speed1 = race1.get("Скорость", "0")
-        speed2 = race2.get("Скорость", "0")
-        half_race["Скорость"] = random.choice([speed1, speed2])
-
-        # Случайный выбор размера
-        size1 = race1.get("Размер", "")
-        size2 = race2.get("Размер", "")
-        half_race["Размер"] = random.choice([size1, size2])
-
-        # Случайный выбор темного зрения
-        dark_vision1 = race1.get("Темное зрение", "Нет")
-        dark_vision2 = race2.get("Темное зрение", "Нет")
-        half_race["Темное зрение"] = random.choice([dark_vision1, dark_vision2])
-
-        # Объединение навыков
-        skills1 = race1.get("Навыки", [])
-        skills2 = race2.get("Навыки", [])
-        all_skills = skills1 + skills2
-
-        # Определение максимального количества навыков
-        num_skills1 = len(skills1)
-        num_skills2 = len(skills2)
-        max_skills = int((num_skills1 + num_skills2) / 2)
-
-        # Случайный выбор навыков
-        if max_skills > 0:
-            unique_skills = {skill['Название']: skill for skill in all_skills}
-            skill_list = list(unique_skills.values())
-            selected_skills = random.sample(skill_list, min(max_skills, len(skill_list)))
+            with open(args.input, "r", encoding="utf-8", newline="") as f:
+                imported, failed = import_races(races, writer, f, format, report, args.processes)
+    finally:
+        if report is not sys.stderr:
+            report.close()
+    if isinstance(writer, RaceJournal) and writer.needs_compaction():
+        # Большой импорт сразу сворачивается в снимок, чтобы не разбирать журнал при каждом запуске
+        writer.compact(writer.begin_compaction(races))
+    if report_filename and not failed:
+        os.remove(report_filename)
+    print(f"Импортировано: {imported}, с ошибками: {failed}"
+          + (f" (отчёт: {report_filename})" if report_filename and failed else ""), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+def export_format(args):
+    if args.format:
+        return args.format
+    if args.output.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if args.output.lower().endswith('.csv'):
+        return 'csv'
+    return 'json'
+
+
+def command_export(races, writer, args):
+    # Выгрузка вместе с правками из журнала: races.json целиком или построчно NDJSON/CSV
+    format = export_format(args)
+    if format == 'json':
+        if args.output == '-':
+            races.dump(sys.stdout.buffer)
         else:
-            selected_skills = []
-
-        half_race["Навыки"] = selected_skills
-
-        return half_race
-
-    def load_races(self):
-        try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                races = json.load(f)
-            return races
-        except FileNotFoundError:
-            messagebox.showwarning("Предупреждение", "Файл не найден. Будет создан новый при сохранении.")
-            return []
-        except json.JSONDecodeError:
-            messagebox.showerror("Ошибка", "Ошибка чтения данных из файла. Начинаем с пустого списка.")
-            return []
-
-    def save_races(self):
-        try:
-            with open(self.filename, "w", encoding="utf-8") as f:
-                json.dump(self.races, f, ensure_ascii=False, indent=4)
-            messagebox.showinfo("Успех", "Данные успешно сохранены.")
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка при сохранении данных: {e}")
+            with open(args.output, "wb") as f:
+                races.dump(f)
+    elif args.output == '-':
+        export_races(races.races(), sys.stdout, format)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            export_races(races.races(), f, format)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m main", description="Менеджер рас без окна.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-f', '--file', default=DEFAULT_FILENAME, help="races.json или база SQLite")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('list', parents=[common], help="список рас: Ид и имя")
+    command.set_defaults(handler=command_list)
+
+    command = commands.add_parser('search', parents=[common], help="поиск рас")
+    command.add_argument('query')
+    command.add_argument('--fuzzy', action='store_true', help="нечёткий поиск по триграммам")
+    command.add_argument('--limit', type=int, default=20)
+    command.set_defaults(handler=command_search)
+
+    command = commands.add_parser('show', parents=[common], help="раса в формате JSON")
+    command.add_argument('race', help="Ид или имя")
+    command.set_defaults(handler=command_show)
+
+    command = commands.add_parser('add', parents=[common], help="добавить расу из JSON")
+    command.add_argument('input', nargs='?', default='-', help="файл с расой (по умолчанию stdin)")
+    command.set_defaults(handler=command_add)
+
+    command = commands.add_parser('delete', parents=[common], help="удалить расу")
+    command.add_argument('race', help="Ид или имя")
+    command.set_defaults(handler=command_delete)
+
+    command = commands.add_parser('half-race', parents=[common], help="создать полурасу")
+    command.add_argument('race1', help="Ид или имя")
+    command.add_argument('race2', help="Ид или имя")
+    command.add_argument('--seed', type=int, help="зерно генератора для воспроизводимого результата")
+    command.set_defaults(handler=command_half_race)
+
+    command = commands.add_parser('half-races', parents=[common], help="полурасы для всех или выбранных пар в NDJSON")
+    command.add_argument('races', nargs='*', help="Ид или имена: все пары среди них (по умолчанию все расы)")
+    command.add_argument('--pair', nargs=2, action='append', metavar=('РАСА1', 'РАСА2'), help="отдельная пара")
+    command.add_argument('--samples', type=int, default=1, help="число полурас на пару")
+    command.add_argument('--seed', type=int, help="зерно генератора")
+    command.add_argument('--processes', type=int, help="число процессов (1 - без пула)")
+    command.add_argument('-o', '--output', default='-', help="файл или '-' для stdout")
+    command.set_defaults(handler=command_half_races)
+
+    command = commands.add_parser('import', parents=[common], help="добавить расы из NDJSON или CSV")
+    command.add_argument('input', help="файл или '-' для stdin")
+    command.add_argument('--format', choices=RECORD_FORMATS, help="формат (по умолчанию по расширению)")
+    command.add_argument('--report', help="отчёт об ошибках (по умолчанию ФАЙЛ.errors.ndjson)")
+    command.add_argument('--processes', type=int, help="число процессов проверки (1 - без пула)")
+    command.set_defaults(handler=command_import)
+
+    command = commands.add_parser('export', parents=[common], help="выгрузить все расы в JSON, NDJSON или CSV")
+    command.add_argument('output', help="файл или '-' для stdout")
+    command.add_argument('--format', choices=('json',) + RECORD_FORMATS, help="формат (по умолчанию по расширению)")
+    command.set_defaults(handler=command_export)
+    return parser
+
+
+def run_cli(argv):
+    args = build_parser().parse_args(argv)
+    races, writer = open_races(args.file)
+    try:
+        args.handler(races, writer, args)
+    except BrokenPipeError:
+        # Вывод оборван (например, "| head") - это не ошибка
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        writer.close()
+
+
+def run_gui(argv):
+    parser = argparse.ArgumentParser(prog="python -m main", epilog=f"Команды без окна: {', '.join(COMMANDS)}.")
+    parser.add_argument('file', nargs='?', default=DEFAULT_FILENAME, help="races.json или база SQLite")
+    parser.add_argument('--autosave', type=float, metavar='МИНУТЫ', help="включить автосохранение с интервалом")
+    parser.add_argument('--debug', action='store_true', help="замеры времени операций с самого запуска")
+    args = parser.parse_args(argv)
+    # tkinter нужен только окну, поэтому импортируется здесь, а не при загрузке модуля
+    from gui import RaceApp
+    autosave_ms = int(args.autosave * 60 * 1000) if args.autosave else None
+    app = RaceApp(args.file, autosave_ms, args.debug)
+    app.mainloop()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        run_cli(argv)
+    else:
+        run_gui(argv)
+
 
 if __name__ == "__main__":
-    app = RaceApp()
-    app.mainloop()
+    if getattr(sys, 'frozen', False):
+        # Собранный exe (PyInstaller): процессы пула запускают тот же exe, и без
+        # freeze_support каждый из них выполнил бы main() и открыл ещё одно окно
+        import multiprocessing
+        multiprocessing.freeze_support()
+    main()
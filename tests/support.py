@@ -0,0 +1,43 @@
+# Общее для тестов: путь к модулям приложения, небольшой каталог рас и
+# временный races.json с журналом рядом.
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import RaceJournal, read_races
+
+SKILL = {'Название': 'Транс', 'Описание': 'Эльфы не спят, а медитируют.'}
+RACES = [
+    {'Ид': 1, 'Имя': 'Эльф', 'Скорость': '30', 'Навыки': [SKILL]},
+    {'Ид': 2, 'Имя': 'Гном', 'Скорость': '25', 'Навыки': [SKILL, {'Название': 'Хитрость', 'Описание': 'Магия.'}]},
+    {'Ид': 3, 'Имя': 'Орк', 'Скорость': '30'},
+]
+
+
+class TempDirTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.filename = os.path.join(directory.name, "races.json")
+
+    def write_races(self, races):
+        with open(self.filename, "w", encoding="utf-8") as f:
+            json.dump(races, f, ensure_ascii=False, indent=4)
+
+    def load(self):
+        journal = RaceJournal(self.filename)
+        self.addCleanup(journal.close)
+        races, messages = read_races(self.filename, journal)
+        self.assertFalse([text for kind, text in messages if kind == 'error'])
+        return races, journal
+
+    def names(self, races):
+        return {race_id: races.name(race_id) for race_id in races}
+
+    def compact(self, races, journal):
+        return journal.compact(journal.begin_compaction(races))
@@ -0,0 +1,49 @@
+# Массовая генерация полурас: результат задаётся зерном и парой и не зависит
+# от числа процессов и размера кусков.
+import json
+import unittest
+
+from support import RACES
+
+from core import RaceCatalog, generate_half_race, generate_half_races, half_race_rng, json_default
+
+
+def records(chunks):
+    return [json.loads(line) for line in "".join(chunks).splitlines()]
+
+
+class HalfRacesTest(unittest.TestCase):
+    def setUp(self):
+        self.races = RaceCatalog.from_document(RACES)
+
+    def test_all_pairs_in_order(self):
+        result = records(generate_half_races(self.races, samples=2, processes=1))
+
+        self.assertEqual([(record['Родители'], record['Образец']) for record in result],
+                         [([a, b], sample) for a in (1, 2, 3) for b in (1, 2, 3) if a != b for sample in (0, 1)])
+        self.assertEqual(result[0]['Имя'], 'Полураса: Эльф/Гном')
+
+    def test_seed_gives_same_result(self):
+        first = "".join(generate_half_races(self.races, seed=7, processes=1))
+
+        self.assertEqual("".join(generate_half_races(self.races, seed=7, processes=1, chunk_size=1)), first)
+        self.assertNotEqual("".join(generate_half_races(self.races, seed=8, processes=1)), first)
+
+    def test_matches_single_half_race(self):
+        record, = records(generate_half_races(self.races, pairs=[(2, 1)], seed=3, processes=1))
+        expected = generate_half_race(self.races.get(2), self.races.get(1), half_race_rng(3, 2, 1))
+
+        del record['Родители'], record['Образец']
+        self.assertEqual(record, json.loads(json.dumps(expected, ensure_ascii=False, default=json_default)))
+
+    def test_pool_matches_single_process(self):
+        # Пул запускает процессы заново (spawn), поэтому тест заодно проверяет,
+        # что задачи и данные рас передаются в дочерние процессы
+        expected = "".join(generate_half_races(self.races, samples=3, seed=5, processes=1))
+
+        self.assertEqual("".join(generate_half_races(self.races, samples=3, seed=5, processes=2, chunk_size=2)),
+                         expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
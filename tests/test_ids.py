@@ -0,0 +1,57 @@
+# Файл старого формата без Ид: номера, выданные при загрузке, сразу
+# записываются в races.json, и журнал не зависит от порядка рас в файле.
+import json
+from unittest import mock
+
+from support import RACES, TempDirTest
+
+from core import DOCUMENT_RACES_KEY, write_race_ids
+
+LEGACY = [{key: value for key, value in race.items() if key != 'Ид'} for race in RACES]
+
+
+class WriteRaceIdsTest(TempDirTest):
+    def test_assigned_ids_are_written_on_load(self):
+        self.write_races(LEGACY)
+        races, journal = self.load()
+
+        self.assertTrue(races.assigned_ids)
+        self.assertIsNotNone(write_race_ids(races, journal))
+        self.assertFalse(races.assigned_ids)
+        with open(self.filename, encoding="utf-8") as f:
+            self.assertEqual([race['Ид'] for race in json.load(f)[DOCUMENT_RACES_KEY]], [1, 2, 3])
+
+    def test_nothing_written_when_file_has_ids(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+
+        self.assertFalse(races.assigned_ids)
+        self.assertIsNone(write_race_ids(races, journal))
+
+    def test_journal_survives_external_insert(self):
+        self.write_races(LEGACY)
+        races, journal = self.load()
+        write_race_ids(races, journal)
+        journal.put_race(races.put({'Ид': 2, 'Имя': 'Гном', 'Скорость': '35'}))
+        journal.close()
+
+        # Другая программа вставила расу в начало списка, сохранив Ид остальных
+        with open(self.filename, encoding="utf-8") as f:
+            document = json.load(f)
+        document[DOCUMENT_RACES_KEY].insert(0, {'Ид': 10, 'Имя': 'Человек', 'Скорость': '30'})
+        self.write_races(document)
+
+        reloaded, journal = self.load()
+        self.assertEqual(reloaded.get(2)['Скорость'], '35')
+        self.assertEqual(reloaded.get(1)['Имя'], 'Эльф')
+        self.assertEqual(self.names(reloaded)[10], 'Человек')
+
+    def test_lazy_catalog_writes_ids(self):
+        self.write_races(LEGACY)
+        with mock.patch('core.LAZY_LOAD_THRESHOLD', 0):
+            races, journal = self.load()
+            self.assertTrue(races.assigned_ids)
+            write_race_ids(races, journal)
+        with open(self.filename, encoding="utf-8") as f:
+            self.assertEqual([race['Ид'] for race in json.load(f)[DOCUMENT_RACES_KEY]], [1, 2, 3])
+        self.assertEqual(self.names(self.load()[0]), {1: 'Эльф', 2: 'Гном', 3: 'Орк'})
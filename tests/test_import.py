@@ -0,0 +1,94 @@
+# Потоковый импорт NDJSON и CSV: проверка записей (в том числе в пуле процессов),
+# отчёт об ошибках по номерам строк и пакетная запись в журнал.
+import io
+import json
+import unittest
+
+from support import RACES, SKILL
+
+from core import RaceCatalog, export_races, import_races, validate_race, validate_records
+
+
+class ImportTest(unittest.TestCase):
+    LINES = [
+        json.dumps({'Ид': 1, 'Имя': 'Эльф', 'Скорость': '30', 'Навыки': [SKILL]}, ensure_ascii=False),
+        '{"Имя": "Обрыв',
+        '',
+        '["не", "объект"]',
+        json.dumps({'Ид': [1], 'Имя': 'Плохой Ид', 'Скорость': 30}, ensure_ascii=False),
+        json.dumps({'Имя': '', 'Скорость': '30'}, ensure_ascii=False),
+        json.dumps({'Имя': 'Улитка', 'Скорость': 0}, ensure_ascii=False),
+        json.dumps({'Имя': 'Без навыков', 'Скорость': '30', 'Навыки': 'нет'}, ensure_ascii=False),
+    ]
+
+    class Writer:
+        def __init__(self):
+            self.batches = []
+
+        def put_races(self, races):
+            self.batches.append(list(races))
+
+    def test_validate_race(self):
+        self.assertIsNone(validate_race({'Имя': 'Эльф', 'Скорость': 0}))
+        self.assertIsNone(validate_race({'Ид': 5, 'Имя': 'Эльф', 'Скорость': '30'}))
+        for race in ({'Ид': [1], 'Имя': 'Эльф', 'Скорость': '30'}, {'Ид': True, 'Имя': 'Эльф', 'Скорость': '30'},
+                     {'Ид': '5', 'Имя': 'Эльф', 'Скорость': '30'}, {'Имя': 'Эльф'}, {'Имя': ' ', 'Скорость': '30'},
+                     ['Эльф']):
+            self.assertIsNotNone(validate_race(race), race)
+
+    def test_errors_are_reported_by_line(self):
+        races = RaceCatalog()
+        writer = self.Writer()
+        report = io.StringIO()
+        imported, failed = import_races(races, writer, io.StringIO("\n".join(self.LINES) + "\n"), 'ndjson',
+                                        report, processes=1, batch_size=1)
+
+        self.assertEqual((imported, failed), (2, 5))
+        self.assertEqual([line['Строка'] for line in map(json.loads, report.getvalue().splitlines())],
+                         [2, 4, 5, 6, 8])
+        self.assertEqual(sorted(races.name(race_id) for race_id in races), ['Улитка', 'Эльф'])
+        self.assertEqual(len(writer.batches), 2)
+
+    def test_existing_id_is_replaced(self):
+        races = RaceCatalog.from_document([{'Ид': 1, 'Имя': 'Эльф', 'Скорость': '30'}])
+        lines = io.StringIO(json.dumps({'Ид': 1, 'Имя': 'Эльф высший', 'Скорость': '35'}, ensure_ascii=False))
+        import_races(races, self.Writer(), lines, 'ndjson', processes=1)
+
+        self.assertEqual(list(races), [1])
+        self.assertEqual(races.get(1)['Скорость'], '35')
+
+    def test_pool_matches_single_process(self):
+        text = "\n".join(self.LINES * 3) + "\n"
+        single = list(validate_records(io.StringIO(text), 'ndjson', processes=1, chunk_size=4))
+        pooled = list(validate_records(io.StringIO(text), 'ndjson', processes=2, chunk_size=4))
+        self.assertEqual([(number, error) for number, _, _, error in pooled],
+                         [(number, error) for number, _, _, error in single])
+
+    def test_csv(self):
+        lines = io.StringIO("Ид,Имя,Скорость,Навыки\n"
+                            f"1,Эльф,30,\"{json.dumps([SKILL], ensure_ascii=False).replace(chr(34), chr(34) * 2)}\"\n"
+                            "x,Гном,25,\n")
+        races = RaceCatalog()
+        report = io.StringIO()
+        self.assertEqual(import_races(races, self.Writer(), lines, 'csv', report, processes=1), (1, 1))
+        self.assertEqual(races.get(1)['Навыки'][0]['Название'], 'Транс')
+        self.assertEqual(json.loads(report.getvalue())['Строка'], 3)
+
+    def test_export_round_trip(self):
+        races = RaceCatalog.from_document(RACES + [{'Ид': 4, 'Имя': 'Тифлинг', 'Скорость': '30', 'Источник': 'PHB'}])
+        for format in ('ndjson', 'csv'):
+            output = io.StringIO()
+            self.assertEqual(export_races(races.races(), output, format), 4)
+
+            imported = RaceCatalog()
+            self.assertEqual(import_races(imported, self.Writer(), io.StringIO(output.getvalue()), format,
+                                          processes=1), (4, 0))
+            if format == 'ndjson':
+                self.assertEqual([dict(race) for race in imported.races()], [dict(race) for race in races.races()])
+            # В CSV у каждой расы есть все столбцы, отсутствующие поля становятся пустыми
+            self.assertEqual([(race['Имя'], race.get('Навыки'), race.get('Источник')) for race in imported.races()],
+                             [(race['Имя'], race.get('Навыки'), race.get('Источник')) for race in races.races()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# Журнал правок рядом с races.json: воспроизведение поверх снимка, обрыв
+# последней строки и сжатие журнала в новый снимок, в том числе после сбоя.
+import json
+import os
+import unittest
+
+from support import RACES, TempDirTest
+
+from core import RaceJournal, file_sha256, read_races
+
+
+class JournalReplayTest(TempDirTest):
+    def test_edits_are_replayed_over_snapshot(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+        journal.put_race(races.put({'Ид': 2, 'Имя': 'Гном лесной', 'Скорость': '25'}))
+        journal.put_race(races.add({'Имя': 'Тифлинг', 'Скорость': '30'}))
+        races.remove(3)
+        journal.delete_race(3)
+        journal.close()
+
+        reloaded, _ = self.load()
+        self.assertEqual(self.names(reloaded), {1: 'Эльф', 2: 'Гном лесной', 4: 'Тифлинг'})
+        self.assertEqual(reloaded.get(4)['Скорость'], '30')
+
+    def test_missing_snapshot_uses_journal(self):
+        races, journal = self.load()
+        journal.put_race(races.add({'Имя': 'Эльф', 'Скорость': '30'}))
+        journal.close()
+
+        reloaded, messages = read_races(self.filename, RaceJournal(self.filename))
+        self.assertEqual(messages, [])
+        self.assertEqual(self.names(reloaded), {1: 'Эльф'})
+
+    def test_truncated_last_line_is_ignored(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+        journal.delete_race(1)
+        journal.close()
+        with open(journal.filename, "a", encoding="utf-8") as f:
+            f.write('{"op": "delete", "id"')
+
+        reloaded, _ = self.load()
+        self.assertEqual(sorted(reloaded), [2, 3])
+
+
+class CompactionTest(TempDirTest):
+    def test_compaction_writes_snapshot_and_removes_journal(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+        journal.put_race(races.put({'Ид': 3, 'Имя': 'Полуорк', 'Скорость': '30'}))
+        stat = self.compact(races, journal)
+
+        self.assertFalse(os.path.exists(journal.filename))
+        self.assertFalse(os.path.exists(journal.compacting_filename))
+        self.assertEqual(journal.snapshot_state, (stat.st_mtime_ns, stat.st_size, file_sha256(self.filename)))
+        reloaded, _ = self.load()
+        self.assertEqual(self.names(reloaded), {1: 'Эльф', 2: 'Гном', 3: 'Полуорк'})
+        self.assertEqual(reloaded.get(2)['Навыки'][0]['Название'], 'Транс')
+
+    def test_unfinished_compaction_is_replayed(self):
+        # Сбой во время записи снимка: отложенный журнал применяется перед текущим
+        self.write_races(RACES)
+        races, journal = self.load()
+        journal.put_race(races.put({'Ид': 1, 'Имя': 'Эльф высший', 'Скорость': '30'}))
+        journal.begin_compaction(races)
+        journal.put_race(races.put({'Ид': 1, 'Имя': 'Эльф лесной', 'Скорость': '35'}))
+        journal.close()
+        self.assertTrue(os.path.exists(journal.compacting_filename))
+
+        reloaded, journal = self.load()
+        self.assertEqual(reloaded.name(1), 'Эльф лесной')
+        self.assertEqual(journal.records, 2)
+        # Следующее сжатие дописывает новый журнал к отложенному и сворачивает оба
+        self.compact(reloaded, journal)
+        reloaded, _ = self.load()
+        self.assertEqual(reloaded.get(1)['Скорость'], '35')
+
+    def test_completed_compaction_is_not_replayed_twice(self):
+        # Сбой после замены races.json: отметка с хешем нового снимка говорит,
+        # что записи отложенного журнала уже в нём
+        self.write_races(RACES)
+        races, journal = self.load()
+        self.compact(races, journal)
+        journal.close()
+        with open(journal.compacting_filename, "w", encoding="utf-8") as f:
+            f.write(json.dumps({'op': 'put', 'race': {'Ид': 9, 'Имя': 'Лишняя', 'Скорость': '30'}}) + "\n")
+            f.write(json.dumps({'op': 'compacted', 'sha256': file_sha256(self.filename)}) + "\n")
+
+        reloaded, _ = self.load()
+        self.assertNotIn(9, reloaded)
+
+    def test_marker_for_other_snapshot_is_replayed(self):
+        # Сбой между отметкой и заменой: races.json ещё старый, записи нужно применить
+        self.write_races(RACES)
+        races, journal = self.load()
+        journal.close()
+        with open(journal.compacting_filename, "w", encoding="utf-8") as f:
+            f.write(json.dumps({'op': 'put', 'race': {'Ид': 9, 'Имя': 'Новая', 'Скорость': '30'}}) + "\n")
+            f.write(json.dumps({'op': 'compacted', 'sha256': '0' * 64}) + "\n")
+
+        reloaded, _ = self.load()
+        self.assertEqual(reloaded.name(9), 'Новая')
+
+
+if __name__ == "__main__":
+    unittest.main()
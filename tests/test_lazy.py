@@ -0,0 +1,128 @@
+# Ленивая загрузка большого races.json: смещения записей, поля для индексов
+# в заглушках и кэш смещений рядом с файлом.
+import json
+from unittest import mock
+
+from support import RACES, TempDirTest
+
+import core
+from core import RaceCatalog, RaceSearchIndex, RaceSortIndex, scan_race_offsets
+
+RACES_WITH_OPTIONS = RACES + [
+    {'Ид': 4, 'Имя': 'Драконорождённый', 'Скорость': '30', 'Размер': 'Средний', 'Темное зрение': 'Нет',
+     'Навыки': [{'Название': 'Наследие драконов', 'Описание': 'Выберите предка.',
+                 'Опции': [{'Название': 'Латунный', 'Описание': 'Огонь.'}]}]},
+]
+
+
+class LazyTest(TempDirTest):
+    def load_lazy(self):
+        with mock.patch.object(core, 'LAZY_LOAD_THRESHOLD', 0):
+            races, journal = self.load()
+        self.assertIsNotNone(races.filename)
+        return races, journal
+
+
+class ScanRaceOffsetsTest(LazyTest):
+    def test_list_of_races(self):
+        self.write_races(RACES)
+        stubs, table = scan_race_offsets(self.filename)
+
+        self.assertIsNone(table)
+        self.assertEqual([(stub.id, stub.name) for stub in stubs], [(1, 'Эльф'), (2, 'Гном'), (3, 'Орк')])
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        for stub, race in zip(stubs, RACES):
+            self.assertEqual(json.loads(data[stub.start:stub.end]), race)
+            self.assertEqual(stub.digest, core.record_digest(data[stub.start:stub.end]))
+
+    def test_missing_and_non_ascii_fields(self):
+        # Смещения в байтах, а не в символах: кириллица занимает по два байта
+        races = [{'Имя': 'Ёж «колючий»', 'Скорость': '20'}, {'Ид': 7, 'Имя': 'Ящер', 'Скорость': '30'}]
+        self.write_races(races)
+        stubs, _ = scan_race_offsets(self.filename)
+
+        self.assertEqual([(stub.id, stub.name) for stub in stubs], [(None, 'Ёж «колючий»'), (7, 'Ящер')])
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        self.assertEqual([json.loads(data[stub.start:stub.end]) for stub in stubs], races)
+
+    def test_document_with_skill_library(self):
+        # Снимок после сжатия: навыки вынесены в общую таблицу, в расах - ссылки на неё
+        self.write_races(RACES)
+        races, journal = self.load()
+        self.compact(races, journal)
+        stubs, table = scan_race_offsets(self.filename)
+
+        self.assertEqual(len(table), 2)
+        self.assertEqual([stub.name for stub in stubs], ['Эльф', 'Гном', 'Орк'])
+        self.assertEqual(table[stubs[1].skills[1]]['Название'], 'Хитрость')
+        self.assertEqual(stubs[0].skills[0], stubs[1].skills[0])
+        self.assertIs(stubs[1].skill_digests, stubs[1].skills)
+
+    def test_inline_skills_are_interned(self):
+        self.write_races(RACES)
+        library = core.SkillLibrary()
+        stubs, _ = scan_race_offsets(self.filename, library=library)
+
+        self.assertEqual(len(library), 2)
+        self.assertEqual(stubs[0].skill_digests[0], stubs[1].skill_digests[0])
+        self.assertEqual(stubs[1].fields, ('25', '', ''))
+
+
+class LazySummaryTest(LazyTest):
+    def setUp(self):
+        super().setUp()
+        self.write_races(RACES_WITH_OPTIONS)
+
+    def check_summaries(self, races):
+        with mock.patch.object(RaceCatalog, '_materialize', side_effect=AssertionError):
+            summary = races.summary(4)
+            self.assertEqual((summary['Скорость'], summary['Размер'], summary['Темное зрение']),
+                             ('30', 'Средний', 'Нет'))
+            self.assertEqual(summary['Навыки'][0]['Опции'][0]['Название'], 'Латунный')
+            self.assertIs(races.summary(1)['Навыки'][0], races.summary(2)['Навыки'][0])
+
+            index = RaceSearchIndex()
+            for race_id in races:
+                index.add(race_id, races.summary(race_id))
+            self.assertEqual(index.search('хитрость'), [2])
+            self.assertEqual(index.search('латунный'), [4])
+            self.assertEqual(index.search('скорость:<30'), [2])
+            sort_index = RaceSortIndex(races)
+            self.assertEqual(sort_index.sorted_ids('Скорость'), [2, 1, 3, 4])
+            self.assertEqual(sort_index.sorted_ids('Навыки', reverse=True)[:1], [2])
+
+    def test_summary_does_not_read_records(self):
+        races, _ = self.load_lazy()
+
+        self.check_summaries(races)
+
+    def test_offsets_cache_keeps_summaries(self):
+        self.load_lazy()
+        with mock.patch.object(core, 'scan_race_offsets', side_effect=AssertionError):
+            races, _ = self.load_lazy()
+
+        self.check_summaries(races)
+
+    def test_summaries_after_compaction(self):
+        # Сжатие переписывает файл таблицей навыков; кэш смещений по нему хранит и поля
+        races, journal = self.load_lazy()
+        journal.put_race(races.put({'Ид': 3, 'Имя': 'Орк', 'Скорость': '30', 'Размер': 'Средний'}))
+        self.compact(races, journal)
+        with mock.patch.object(core, 'scan_race_offsets', side_effect=AssertionError):
+            reloaded, _ = self.load_lazy()
+
+        self.assertEqual(reloaded.summary(3)['Размер'], 'Средний')
+        self.check_summaries(reloaded)
+
+    def test_lazy_catalog_reads_new_offsets_after_compaction(self):
+        races, journal = self.load_lazy()
+        races.remove(1)
+        journal.delete_race(1)
+        self.compact(races, journal)
+        self.assertEqual(races.get(2)['Навыки'][1]['Название'], 'Хитрость')
+        self.assertEqual(races.get(3)['Имя'], 'Орк')
+
+        reloaded, _ = self.load_lazy()
+        self.assertEqual(self.names(reloaded), {2: 'Гном', 3: 'Орк', 4: 'Драконорождённый'})
@@ -0,0 +1,67 @@
+# Типизированные записи Race/Skill/Option: ведут себя как словари с ключами
+# JSON, не теряют данные при обратном преобразовании и не имеют __dict__.
+import json
+import unittest
+
+import support  # noqa: F401
+
+from core import Option, Race, Skill, json_default
+
+RACE = {'Ид': 1, 'Имя': 'Эльф', 'Скорость': '30', 'Размер': 'Средний', 'Темное зрение': '60 фт',
+        'Навыки': [{'Название': 'Транс', 'Описание': 'Медитация.', 'Важный': 'Да',
+                    'Опции': [{'Название': 'Высший', 'Описание': 'Заговор.'}], 'Дополнительно': 'Нет'}],
+        'Источник': 'PHB'}
+
+
+class RaceModelTest(unittest.TestCase):
+    def test_round_trip_keeps_keys_and_order(self):
+        race = Race.from_dict(RACE)
+
+        self.assertEqual(race.to_dict(), RACE)
+        self.assertEqual(list(race), list(RACE))
+        self.assertEqual(json.dumps(race, ensure_ascii=False, default=json_default),
+                         json.dumps(RACE, ensure_ascii=False))
+
+    def test_nested_models_and_slots(self):
+        race = Race.from_dict(RACE)
+
+        self.assertIsInstance(race['Навыки'][0], Skill)
+        self.assertIsInstance(race['Навыки'][0]['Опции'][0], Option)
+        for record in (race, race['Навыки'][0], race['Навыки'][0]['Опции'][0]):
+            self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_speed_is_stored_as_number(self):
+        self.assertEqual(Race.from_dict({'Имя': 'Гном', 'Скорость': '25'}).speed, 25)
+        # Значение, которое не восстанавливается из числа, сохраняется как было
+        race = Race.from_dict({'Имя': 'Гном', 'Скорость': '25 фт'})
+        self.assertEqual((race.speed, race['Скорость']), (25, '25 фт'))
+        self.assertEqual(Race.from_dict({'Имя': 'Гном', 'Скорость': '025'})['Скорость'], '025')
+        self.assertEqual(Race.from_dict({'Имя': 'Гном', 'Скорость': 0})['Скорость'], 0)
+
+    def test_missing_keys_behave_like_dict(self):
+        race = Race.from_dict({'Имя': 'Орк'})
+
+        self.assertNotIn('Скорость', race)
+        self.assertIsNone(race.get('Навыки'))
+        with self.assertRaises(KeyError):
+            race['Размер']
+        self.assertEqual(len(race), 1)
+
+    def test_repeated_values_are_interned(self):
+        first = Race.from_dict({'Имя': 'Эльф', 'Размер': ''.join(['Сред', 'ний'])})
+        second = Race.from_dict({'Имя': 'Гном', 'Размер': ''.join(['Сред', 'ний'])})
+
+        self.assertIs(first['Размер'], second['Размер'])
+
+    def test_equality_and_with_id(self):
+        race = Race.from_dict(RACE)
+
+        self.assertEqual(race, Race.from_dict(RACE))
+        self.assertEqual(race, RACE)
+        self.assertNotEqual(race, race.with_id(2))
+        self.assertEqual(race.with_id(2)['Ид'], 2)
+        self.assertEqual(race['Ид'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# Обычный список рас: обновление приводит строки Treeview к новому порядку
+# минимальным числом вызовов Tk.
+import bisect
+import random
+import unittest
+
+import support  # noqa: F401
+
+import gui
+
+
+class FakeTree:
+    # Дети корня Treeview: move, как в Tk, сначала убирает строку, затем вставляет по индексу
+    def __init__(self):
+        self.children = []
+        self.calls = 0
+
+    def place(self, item, index):
+        if item in self.children:
+            self.children.remove(item)
+        self.children.insert(len(self.children) if index == 'end' else index, item)
+
+    def detach(self, *items):
+        self.calls += 1
+        for item in items:
+            self.children.remove(item)
+
+    def move(self, item, parent, index):
+        self.calls += 1
+        self.place(item, index)
+
+    def insert(self, parent, index, iid=None, values=()):
+        self.calls += 1
+        assert iid not in self.children
+        self.place(iid, index)
+
+
+def fake_race_list():
+    race_list = gui.TreeRaceList.__new__(gui.TreeRaceList)
+    race_list.tree = FakeTree()
+    race_list.values = lambda race_id: ()
+    race_list.created = set()
+    race_list.ids = []
+    race_list.last_tk_calls = 0
+    return race_list
+
+
+def lis_length(sequence):
+    tails = []
+    for value in sequence:
+        k = bisect.bisect_left(tails, value)
+        tails[k:k + 1] = [value]
+    return len(tails)
+
+
+class TreeRaceListTest(unittest.TestCase):
+    def show(self, race_list, ids):
+        race_list.tree.calls = 0
+        race_list.show(ids)
+        self.assertEqual(race_list.tree.children, ids)
+        self.assertEqual(race_list.last_tk_calls, race_list.tree.calls)
+        return race_list.last_tk_calls
+
+    def test_rotation_is_one_move(self):
+        race_list = fake_race_list()
+        self.show(race_list, [1, 2, 3, 4])
+
+        self.assertEqual(self.show(race_list, [2, 3, 4, 1]), 1)
+        self.assertEqual(self.show(race_list, [1, 2, 3, 4]), 1)
+        self.assertEqual(self.show(race_list, [1, 2, 3, 4]), 0)
+
+    def test_filter_is_one_detach(self):
+        race_list = fake_race_list()
+        self.show(race_list, list(range(100)))
+
+        self.assertEqual(self.show(race_list, list(range(0, 100, 3))), 1)
+        # Отсоединённые строки возвращаются move, а не создаются заново
+        self.assertEqual(self.show(race_list, list(range(100))), 100 - 34)
+
+    def test_random_updates_are_minimal(self):
+        rng = random.Random(1)
+        race_list = fake_race_list()
+        self.show(race_list, [])
+        for _ in range(200):
+            ids = rng.sample(range(60), rng.randrange(60))
+            old = race_list.ids
+            kept = [race_id for race_id in ids if race_id in old]
+            old_index = {race_id: index for index, race_id in enumerate(old)}
+            minimum = (len(ids) - lis_length([old_index[race_id] for race_id in kept])
+                       + (len(kept) < len(old)))
+
+            self.assertEqual(self.show(race_list, ids), minimum)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# Внешняя правка races.json: сжатие журнала не пишет поверх чужого снимка,
+# а перечитанный каталог сравнивается со старым по Ид и хешам записей.
+import os
+import unittest
+from unittest import mock
+
+from support import RACES, TempDirTest
+
+import core
+import gui
+from core import SnapshotChangedError, diff_races
+
+
+class ExternalChangeTest(TempDirTest):
+    def test_compaction_refuses_externally_changed_snapshot(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+        journal.put_race(races.add({'Имя': 'Тифлинг', 'Скорость': '30'}))
+        external = RACES + [{'Ид': 10, 'Имя': 'Внешняя', 'Скорость': '30'}]
+        self.write_races(external)
+        with open(self.filename, "rb") as f:
+            data = f.read()
+
+        with self.assertRaises(SnapshotChangedError):
+            self.compact(races, journal)
+        with open(self.filename, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertFalse(os.path.exists(self.filename + ".tmp"))
+        # Несохранённая правка осталась в отложенном журнале и ложится поверх чужой
+        journal.close()
+        reloaded, _ = self.load()
+        self.assertEqual(self.names(reloaded), {1: 'Эльф', 2: 'Гном', 3: 'Орк', 10: 'Внешняя', 4: 'Тифлинг'})
+
+    def test_touched_snapshot_is_compacted(self):
+        # Смена только времени изменения - не правка: содержимое сверяется по хешу
+        self.write_races(RACES)
+        races, journal = self.load()
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        journal.put_race(races.add({'Имя': 'Тифлинг', 'Скорость': '30'}))
+        self.compact(races, journal)
+
+        reloaded, _ = self.load()
+        self.assertEqual(reloaded.name(4), 'Тифлинг')
+
+
+class DiffRacesTest(TempDirTest):
+    def edit_file(self, races):
+        races = [dict(race) for race in races]
+        self.write_races(races)
+        return races
+
+    def test_added_changed_removed(self):
+        self.write_races(RACES)
+        old, _ = self.load()
+        races = self.edit_file(RACES)
+        races[0]['Имя'] = 'Эльф высший'
+        del races[2]
+        races.append({'Ид': 5, 'Имя': 'Тифлинг', 'Скорость': '30'})
+        self.write_races(races)
+
+        new, _ = self.load()
+        self.assertEqual(diff_races(old, new), ([5], [1], [3]))
+        self.assertEqual(diff_races(new, new.copy()), ([], [], []))
+
+    def test_lazy_stub_content_change(self):
+        # Правка без смены имени видна по хешу байтов записи
+        self.write_races(RACES)
+        with mock.patch.object(core, 'LAZY_LOAD_THRESHOLD', 0):
+            old, _ = self.load()
+            races = self.edit_file(RACES)
+            races[1]['Скорость'] = '20'
+            self.write_races(races)
+            new, _ = self.load()
+        self.assertEqual(diff_races(old.copy(), new), ([], [2], []))
+
+    def test_lazy_stub_unchanged_after_compaction(self):
+        # Сжатие переписывает файл, но хеши заглушек остаются согласованы с ним
+        self.write_races(RACES)
+        with mock.patch.object(core, 'LAZY_LOAD_THRESHOLD', 0):
+            races, journal = self.load()
+            self.compact(races, journal)
+            new, _ = self.load()
+        self.assertEqual(diff_races(races, new), ([], [], []))
+
+
+class ReloadTaskTest(TempDirTest):
+    def test_reload_applies_journal_over_new_file(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+        journal.put_race(races.add({'Имя': 'Тифлинг', 'Скорость': '30'}))
+        journal.close()
+        self.write_races(RACES[1:])
+
+        reloaded, state, diff = gui.reload_races_task(self.filename, races.copy())
+        self.assertEqual(self.names(reloaded), {2: 'Гном', 3: 'Орк', 4: 'Тифлинг'})
+        self.assertEqual(diff, ([], [], [1]))
+        self.assertEqual(state, gui.file_state(self.filename))
+
+    def test_unreadable_file_is_skipped(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write('[{"Ид": 1, "Имя": "Эльф"')
+
+        reloaded, state, diff = gui.reload_races_task(self.filename, races.copy())
+        self.assertIsNone(reloaded)
+        self.assertIsNone(diff)
+        self.assertIsNotNone(state)
+
+
+if __name__ == "__main__":
+    unittest.main()
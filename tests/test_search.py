@@ -0,0 +1,69 @@
+# Полнотекстовый поиск по расам: основы слов, префиксы, поля и числовые
+# фильтры, ранжирование по весам полей и сужение прежнего результата.
+import unittest
+
+import support  # noqa: F401
+
+from core import RaceSearchIndex
+
+RACES = {
+    1: {'Имя': 'Эльф лесной', 'Скорость': '35 фт', 'Размер': 'Средний', 'Темное зрение': '60 фт',
+        'Навыки': [{'Название': 'Маскировка в дикой местности', 'Описание': 'Прячется в листве.'}]},
+    2: {'Имя': 'Гном', 'Скорость': '25', 'Размер': 'Маленький', 'Темное зрение': '60 фт',
+        'Навыки': [{'Название': 'Гномья хитрость', 'Описание': 'Преимущество против магии.',
+                    'Опции': [{'Название': 'Лесной гном', 'Описание': 'Общение с животными.'}]}]},
+    3: {'Имя': 'Человек', 'Скорость': '30', 'Размер': 'Средний', 'Темное зрение': 'Нет',
+        'Навыки': [{'Название': 'Универсальность', 'Дополнительно': 'Эльфийский язык на выбор.'}]},
+}
+
+
+class RaceSearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = RaceSearchIndex()
+        for key, race in RACES.items():
+            self.index.add(key, race)
+
+    def test_empty_query_keeps_insertion_order(self):
+        self.assertEqual(self.index.search(''), [1, 2, 3])
+        self.assertEqual(self.index.search('', within={3, 1}), [1, 3])
+
+    def test_name_outranks_option_and_extra(self):
+        # "лесной" в имени весит больше, чем в опции навыка
+        self.assertEqual(self.index.search('лесные'), [1, 2])
+        self.assertEqual(self.index.search('эльф'), [1, 3])
+
+    def test_prefix_and_all_terms(self):
+        self.assertEqual(self.index.search('гн'), [2])
+        self.assertEqual(self.index.search('лесн гном'), [2])
+        self.assertEqual(self.index.search('лесн человек'), [])
+
+    def test_field_prefix(self):
+        self.assertEqual(self.index.search('опция:лесной'), [2])
+        self.assertEqual(self.index.search('доп:эльфийский'), [3])
+        self.assertEqual(self.index.search('имя:эльфийский'), [])
+
+    def test_numeric_filters(self):
+        self.assertEqual(self.index.search('скорость:>=30'), [1, 3])
+        self.assertEqual(self.index.search('зрение:60 скорость:<30'), [2])
+        # Без числа в поле раса не проходит ни один фильтр по нему
+        self.assertEqual(self.index.search('зрение:>0'), [1, 2])
+
+    def test_update_and_remove(self):
+        self.index.update(2, {'Имя': 'Гном скальный', 'Скорость': '25'})
+        self.index.remove(1)
+
+        self.assertEqual(self.index.search('лесной'), [])
+        self.assertEqual(self.index.search('скальн'), [2])
+        self.assertEqual(self.index.search(''), [2, 3])
+        self.assertEqual(len(self.index), 2)
+
+    def test_refinement(self):
+        self.assertTrue(self.index.is_refinement('гн', 'гном'))
+        self.assertTrue(self.index.is_refinement('гном', 'гном лесной'))
+        self.assertFalse(self.index.is_refinement('гном', 'эльф'))
+        self.assertFalse(self.index.is_refinement('гном скорость:>20', 'гном скорость:>30'))
+        self.assertEqual(self.index.search('гном', within=set(self.index.search('гн'))), [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
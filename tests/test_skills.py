@@ -0,0 +1,61 @@
+# Общая библиотека навыков: одинаковые навыки рас - один объект, снимок хранит
+# их таблицей, а кэш снимка восстанавливает каталог без повторного хеширования.
+import unittest
+from unittest import mock
+
+from support import RACES, SKILL, TempDirTest
+
+from core import RaceCatalog, Skill, SkillLibrary, skill_digest
+
+
+class SkillLibraryTest(unittest.TestCase):
+    def test_equal_skills_are_shared(self):
+        races = RaceCatalog.from_document(RACES)
+
+        self.assertIs(races.get(1)['Навыки'][0], races.get(2)['Навыки'][0])
+        self.assertEqual(len(races.library), 2)
+
+    def test_digest_of_unknown_skill_is_computed(self):
+        library = SkillLibrary()
+        shared = library.intern(dict(SKILL))
+        other = Skill.from_dict(dict(SKILL, Описание='Другое.'))
+
+        self.assertEqual(library.digest(shared), skill_digest(SKILL))
+        self.assertEqual(library.digest(other), skill_digest(other))
+        self.assertIs(library.intern(Skill.from_dict(SKILL)), shared)
+
+    def test_replaced_table_entry_keeps_old_digest(self):
+        # Объект, вытесненный из таблицы, остаётся в кэше хешей вместе с хешем,
+        # поэтому его id не может достаться другому навыку
+        library = SkillLibrary()
+        old = Skill.from_dict(SKILL)
+        library.load({'a': old})
+        library.load({'a': Skill.from_dict(SKILL)})
+
+        self.assertEqual(library.digest(old), 'a')
+
+
+class SnapshotCacheTest(TempDirTest):
+    def test_cache_restores_catalog_without_interning(self):
+        self.write_races(RACES)
+        races, journal = self.load()
+        self.compact(races, journal)
+        with open(self.filename, "rb") as f:
+            data = f.read()
+
+        with mock.patch.object(RaceCatalog, '_fill', side_effect=AssertionError), \
+                mock.patch.object(SkillLibrary, 'intern', side_effect=AssertionError):
+            cached, journal = self.load()
+        self.assertEqual(self.names(cached), {1: 'Эльф', 2: 'Гном', 3: 'Орк'})
+        self.assertIs(cached.get(1)['Навыки'][0], cached.get(2)['Навыки'][0])
+        self.assertEqual(cached.find('Гном'), [2])
+        self.assertEqual(cached.next_id, 4)
+        # Снимок из восстановленного каталога совпадает с исходным байт в байт
+        cached.put({'Ид': 3, 'Имя': 'Орк', 'Скорость': '30'})
+        self.compact(cached, journal)
+        with open(self.filename, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# Двоичный кэш снимка рядом с races.json: используется, только пока файл тот же
+# по времени изменения, размеру и хешу; испорченный или чужой кэш пропускается.
+import os
+import pickle
+import unittest
+from unittest import mock
+
+from support import RACES, TempDirTest
+
+import core
+from core import CACHE_SUFFIX, RaceCatalog
+
+
+class SnapshotCacheTest(TempDirTest):
+    def setUp(self):
+        super().setUp()
+        self.write_races(RACES)
+        self.load()
+        self.assertTrue(os.path.exists(self.filename + CACHE_SUFFIX))
+
+    def load_from_cache(self):
+        with mock.patch.object(RaceCatalog, 'from_document', side_effect=AssertionError):
+            return self.load()
+
+    def test_unchanged_file_is_read_from_cache(self):
+        races, journal = self.load_from_cache()
+
+        self.assertEqual(self.names(races), {1: 'Эльф', 2: 'Гном', 3: 'Орк'})
+        stat = os.stat(self.filename)
+        self.assertEqual(races.source, (stat.st_mtime_ns, stat.st_size, core.file_sha256(self.filename)))
+
+    def test_journal_is_replayed_over_cache(self):
+        races, journal = self.load()
+        journal.put_race(races.put({'Ид': 3, 'Имя': 'Полуорк', 'Скорость': '30'}))
+        journal.close()
+
+        races, _ = self.load_from_cache()
+        self.assertEqual(races.name(3), 'Полуорк')
+
+    def test_same_size_and_time_but_other_content(self):
+        # Правка той же длины с восстановленным временем изменения видна по хешу
+        stat = os.stat(self.filename)
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        with open(self.filename, "wb") as f:
+            f.write(data.replace('Орк'.encode("utf-8"), 'Ирк'.encode("utf-8")))
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        races, _ = self.load()
+        self.assertEqual(races.name(3), 'Ирк')
+
+    def test_broken_cache_is_ignored(self):
+        with open(self.filename + CACHE_SUFFIX, "r+b") as f:
+            f.seek(-20, os.SEEK_END)
+            f.write(b"\0" * 20)
+
+        races, _ = self.load()
+        self.assertEqual(self.names(races), {1: 'Эльф', 2: 'Гном', 3: 'Орк'})
+        # Кэш записан заново и снова годится
+        self.load_from_cache()
+
+    def test_other_format_is_ignored(self):
+        with open(self.filename + CACHE_SUFFIX, "rb") as f:
+            header = pickle.load(f)
+            body = f.read()
+        with open(self.filename + CACHE_SUFFIX, "wb") as f:
+            pickle.dump((core.CACHE_FORMAT - 1, *header[1:]), f, protocol=5)
+            f.write(body)
+
+        self.assertIsNone(core.read_snapshot_cache(self.filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# Индекс сортировки списка рас: типизированные ключи столбцов, отбор по
+# отфильтрованным Ид и правка перестановок без пересортировки.
+import unittest
+from unittest import mock
+
+import support  # noqa: F401
+
+import core
+from core import RaceCatalog, RaceSortIndex
+
+RACES = [
+    {'Ид': 1, 'Имя': 'эльф', 'Скорость': '35 фт', 'Размер': 'Средний', 'Темное зрение': '60 фт'},
+    {'Ид': 2, 'Имя': 'Гном', 'Скорость': '25', 'Размер': 'Маленький', 'Темное зрение': '120 фт',
+     'Навыки': [{'Название': 'Хитрость', 'Описание': 'Преимущество.'}]},
+    {'Ид': 3, 'Имя': 'Великан', 'Скорость': '40', 'Размер': 'Большой / средний', 'Темное зрение': 'Нет'},
+    {'Ид': 4, 'Имя': 'Фея', 'Скорость': 'летает', 'Размер': 'Крошечный', 'Темное зрение': '30'},
+]
+
+
+class RaceSortIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.races = RaceCatalog.from_document(RACES)
+        self.index = RaceSortIndex(self.races)
+
+    def test_columns(self):
+        self.assertEqual(self.index.sorted_ids('Имя'), [3, 2, 4, 1])
+        # Скорость без числа - в конце
+        self.assertEqual(self.index.sorted_ids('Скорость'), [2, 1, 3, 4])
+        # Размер - по рангу, а не по алфавиту
+        self.assertEqual(self.index.sorted_ids('Размер'), [4, 2, 1, 3])
+        # "Нет" - нулевая дальность, числа сравниваются как числа
+        self.assertEqual(self.index.sorted_ids('Темное зрение'), [3, 4, 1, 2])
+        self.assertEqual(self.index.sorted_ids('Навыки', reverse=True)[:1], [2])
+
+    def test_reverse(self):
+        self.assertEqual(self.index.sorted_ids('Скорость', reverse=True), [4, 3, 1, 2])
+
+    def test_subset(self):
+        self.assertEqual(self.index.sorted_ids('Темное зрение', ids={2, 4}), [4, 2])
+        # Малая доля каталога сортируется по ключам напрямую - порядок тот же
+        with mock.patch.object(core, 'SORT_SUBSET_RATIO', 100):
+            self.assertEqual(self.index.sorted_ids('Темное зрение', ids=[2, 4]), [4, 2])
+            self.assertEqual(self.index.sorted_ids('Имя', ids=[1, 3], reverse=True), [1, 3])
+
+    def test_add_remove_update(self):
+        self.index.build()
+        race = self.races.add({'Имя': 'Человек', 'Скорость': '30', 'Размер': 'Средний'})
+        self.index.add(race['Ид'], race)
+        self.index.update(2, self.races.put({'Ид': 2, 'Имя': 'Ящер', 'Скорость': '50'}))
+        self.races.remove(3)
+        self.index.remove(3)
+
+        self.assertEqual(self.index.sorted_ids('Скорость'), [race['Ид'], 1, 2, 4])
+        self.assertEqual(self.index.sorted_ids('Имя'), [4, race['Ид'], 1, 2])
+        # Правки дают тот же порядок, что и индекс, построенный заново
+        fresh = RaceSortIndex(self.races)
+        for column in core.SORT_COLUMNS:
+            self.assertEqual(self.index.sorted_ids(column), fresh.sorted_ids(column))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# База SQLite вместо races.json: транзакция на правку, обмен с JSON и
+# каталог, который держит в памяти только заглушки рас.
+import json
+import os
+from unittest import mock
+
+from support import RACES, TempDirTest
+
+import core
+from core import RaceSearchIndex, SqliteRaceStorage, read_races
+
+OPTIONS_RACE = {'Ид': 4, 'Имя': 'Драконорождённый', 'Скорость': '30', 'Размер': 'Средний',
+                'Навыки': [{'Название': 'Наследие драконов', 'Описание': 'Выберите предка.',
+                            'Опции': [{'Название': 'Латунный', 'Описание': 'Огонь.'}],
+                            'Дополнительно': 'Дыхание.', 'Редкость': 'обычная'}],
+                'Источник': 'PHB'}
+
+
+class SqliteTest(TempDirTest):
+    def setUp(self):
+        super().setUp()
+        self.write_races(RACES + [OPTIONS_RACE])
+        self.database = os.path.join(self.directory, "races.db")
+        storage = SqliteRaceStorage(self.database)
+        self.addCleanup(storage.close)
+        self.assertEqual(storage.import_json(self.filename), 4)
+        self.storage = storage
+
+    def open(self):
+        races, messages = read_races(self.database)
+        self.assertEqual(messages, [])
+        self.addCleanup(races.storage.close)
+        return races
+
+    def test_json_round_trip(self):
+        exported = os.path.join(self.directory, "exported.json")
+        self.storage.export_json(exported)
+
+        with open(exported, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), RACES + [OPTIONS_RACE])
+
+    def test_catalog_keeps_stubs(self):
+        races = self.open()
+
+        self.assertTrue(all(isinstance(item, core.RaceStub) for item in races.slots.values()))
+        with mock.patch.object(SqliteRaceStorage, 'get_races', side_effect=AssertionError):
+            index = RaceSearchIndex()
+            for race_id in races:
+                index.add(race_id, races.summary(race_id))
+            self.assertEqual(index.search('латунный'), [4])
+            self.assertEqual(races.summary(4)['Размер'], 'Средний')
+            self.assertEqual(races.skill_users(races.summary(1)['Навыки'][0]), [1, 2])
+        self.assertEqual(races.get(4), OPTIONS_RACE)
+        self.assertIs(races.get(1)['Навыки'][0], races.get(2)['Навыки'][0])
+
+    def test_races_are_read_by_pages(self):
+        races = self.open()
+        races.put({'Ид': 3, 'Имя': 'Полуорк', 'Скорость': '30'})
+
+        with mock.patch.object(core, 'SQLITE_PAGE_SIZE', 2), \
+                mock.patch.object(SqliteRaceStorage, 'get_races', autospec=True,
+                                  side_effect=SqliteRaceStorage.get_races) as get_races:
+            names = [race['Имя'] for race in races.races()]
+        self.assertEqual(names, ['Эльф', 'Гном', 'Полуорк', 'Драконорождённый'])
+        self.assertEqual([call.args[1] for call in get_races.call_args_list], [[1, 2], [4]])
+
+    def test_edits_are_stored(self):
+        races = self.open()
+        self.storage.put_race(races.put({'Ид': 2, 'Имя': 'Гном лесной', 'Скорость': '25'}))
+        self.storage.put_race(races.add({'Имя': 'Тифлинг', 'Скорость': '30'}))
+        self.storage.delete_race(1)
+
+        reloaded = self.open()
+        self.assertEqual(self.names(reloaded), {2: 'Гном лесной', 3: 'Орк', 4: 'Драконорождённый', 5: 'Тифлинг'})
+        self.assertEqual(list(reloaded.races())[-1]['Скорость'], '30')
+
+    def test_copy_reads_same_database(self):
+        races = self.open()
+
+        self.assertEqual(races.copy().get(4)['Навыки'][0]['Опции'][0]['Название'], 'Латунный')
@@ -0,0 +1,68 @@
+# Поиск с опечатками: лучшие совпадения по сходству триграмм и их отсечение
+# по частым триграммам в большом каталоге.
+import random
+import unittest
+from unittest import mock
+
+import support  # noqa: F401
+
+from core import FUZZY_MIN_SCORE, TrigramIndex, trigrams
+
+
+def similarity(query, text):
+    query_grams, text_grams = trigrams(query), trigrams(text)
+    return 2.0 * len(query_grams & text_grams) / (len(query_grams) + len(text_grams))
+
+
+class TrigramIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex()
+        self.index.add(1, {'Имя': 'Аасимар', 'Навыки': [{'Название': 'Небесное сопротивление'}]})
+        self.index.add(2, {'Имя': 'Гном'})
+        self.index.add(3, {'Имя': 'Гоблин', 'Навыки': [{'Название': 'Небесное сопротивление'}]})
+
+    def test_typo_finds_name(self):
+        self.assertEqual(self.index.search_keys('Асимар'), [1])
+        self.assertEqual(self.index.search('Гоблн')[0][1:], (3, 'имя', 'Гоблин'))
+
+    def test_shared_skill_finds_every_race(self):
+        self.assertEqual(self.index.search_keys('небесное сапротивление', field='навык'), [1, 3])
+        self.assertEqual(self.index.search_keys('небесное сапротивление', field='имя'), [])
+
+    def test_removed_race_is_not_found(self):
+        self.index.remove(1)
+        self.index.update(3, {'Имя': 'Гоблин'})
+
+        self.assertEqual(self.index.search_keys('небесное сопротивление'), [])
+
+    def test_matches_full_scan(self):
+        rng = random.Random(3)
+        syllables = ['ар', 'бол', 'гар', 'дин', 'эль', 'мор', 'тан', 'рил', 'шан', 'фен']
+        names = {key: ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for key in range(300)}
+        index = TrigramIndex()
+        for key, name in names.items():
+            index.add(key, {'Имя': name})
+        for _ in range(50):
+            name = rng.choice(list(names.values()))
+            position = rng.randrange(len(name))
+            query = name[:position] + name[position + 1:]
+            expected = sorted((score for score in map(lambda text: similarity(query, text), names.values())
+                               if score >= FUZZY_MIN_SCORE), reverse=True)[:10]
+
+            self.assertEqual([score for score, *_ in index.search(query, 10)], expected)
+
+    def test_common_trigrams_are_skipped_after_limit(self):
+        index = TrigramIndex()
+        for key in range(50):
+            index.add(key, {'Имя': f'Эльф лесной {key}'})
+        index.add(50, {'Имя': 'Эльф'})
+        with mock.patch('core.FUZZY_POSTINGS_CAP', 10):
+            # Сначала перебираются редкие триграммы: limit рас из них набирается, частые
+            # списки пропускаются, но выдача остаётся полной
+            found = index.search_keys('Эльф лесной 7', 5)
+        self.assertEqual(len(found), 5)
+        self.assertEqual(found[0], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()